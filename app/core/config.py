@@ -1,13 +1,25 @@
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     # AI Provider Settings
-    provider: str = "OpenAI"  # OpenAI or HF
+    # Routing policy over the OpenAI-compatible endpoints:
+    # OpenAI/failover (configured order) or latency (EWMA); "local" classifies
+    # offline with the bundled naive Bayes model (HF is an alias for it)
+    provider: str = "OpenAI"
     openai_api_key: Optional[str] = None
     openai_model: str = "gpt-4o-mini"
+    # Any OpenAI-compatible server (e.g. the local fake used by benchmarks)
+    openai_base_url: str = "https://api.openai.com/v1"
+    # Several endpoints (primary, other region, self-hosted), as a JSON list of
+    # {"name", "base_url", "api_key", "model", "max_concurrency"}; empty means
+    # the single endpoint above
+    openai_endpoints: List[Dict[str, Any]] = []
+    endpoint_ewma_alpha: float = 0.3
+    # Seconds a failed endpoint is routed after healthy ones
+    endpoint_failure_cooldown: float = 30.0
     hf_token: Optional[str] = None
     model_name: str = "gpt-4o-mini"
 
@@ -19,6 +31,46 @@ class Settings(BaseSettings):
     log_level: str = "INFO"
     max_input_chars: int = 5000
     max_file_size: int = 2 * 1024 * 1024  # 2MB
+    # Keep only the newest message of reply chains (quoted thread, mobile
+    # signatures and legal footers are dropped before preprocessing)
+    thread_stripping_enabled: bool = True
+    # Emails above max_input_chars (up to max_compressible_chars) are
+    # compressed to their most relevant sentences instead of rejected;
+    # compression_max_tokens optionally caps their estimated tokens too
+    compression_enabled: bool = True
+    max_compressible_chars: int = 100_000
+    compression_max_tokens: int = 0
+    # Per-call token budgets (offline estimates): prompts are fitted to the
+    # input budget by picking a smaller template or trimming the email
+    classify_input_token_budget: int = 1200
+    classify_max_output_tokens: int = 150
+    reply_input_token_budget: int = 1500
+    reply_max_output_tokens: int = 300
+    combined_input_token_budget: int = 1800
+    combined_max_output_tokens: int = 450
+    # Dynamic few-shot: the k most similar labeled examples from the bank
+    # (default: app/data/examples.jsonl) within a token budget
+    few_shot_bank_enabled: bool = True
+    few_shot_bank_path: Optional[str] = None
+    few_shot_k: int = 4
+    few_shot_token_budget: int = 300
+    few_shot_min_similarity: float = 0.05
+    # Local classifier written by scripts/train_local_model.py (.npy + .json,
+    # default app/data/local_model); without it, trained on the bundled corpus
+    local_model_path: Optional[str] = None
+    # Cascade tier between heuristics and the LLM: the local model answers
+    # when confident, once trained on enough documents (corpus + feedback)
+    local_model_cascade_enabled: bool = False
+    local_model_confidence_threshold: float = 0.95
+    local_model_min_documents: int = 200
+    # /api/feedback: corrections are logged (default app/data/feedback.jsonl)
+    # and train the local model online; a snapshot is saved every N of them
+    feedback_enabled: bool = True
+    feedback_log_path: Optional[str] = None
+    feedback_snapshot_every: int = 10
+    # Trend of the share of classifications served without the LLM
+    local_share_bucket_seconds: int = 3600
+    local_share_buckets: int = 24
 
     # JWT Security Settings
     jwt_secret_key: str = "your-secret-key-change-in-production"
@@ -35,6 +87,9 @@ class Settings(BaseSettings):
 
     # AI Configuration
     use_heuristic_fallback: bool = True
+    # Cascade: answer with the local heuristic when its confidence reaches
+    # confidence_threshold and only call the LLM for the remaining emails
+    cascade_enabled: bool = False
     confidence_threshold: float = 0.7
     heuristic_keywords_urgent: str = "urgente,emergencia,asap,critico,imediato"
     heuristic_keywords_thanks: str = "obrigado,agradeco,thanks,grateful,appreciate"
@@ -46,6 +101,80 @@ class Settings(BaseSettings):
 
     # Timeouts
     ai_timeout: int = 30
+    request_deadline_seconds: float = 55.0  # end-to-end budget per request
+    request_timeout_header: str = "X-Request-Timeout"  # client may shorten it
+    expected_upstream_seconds: float = 1.0  # until real latencies are observed
+
+    # Upstream HTTP connection pool
+    http_max_connections: int = 20
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry: float = 30.0
+    http2_enabled: bool = False
+
+    # Classification result cache
+    classification_cache_enabled: bool = True
+    classification_cache_max_entries: int = 2048
+    classification_cache_max_bytes: int = 4 * 1024 * 1024  # 4MB
+    classification_cache_ttl: int = 3600  # 1 hour
+    # Near-duplicate reuse for templated mail (numbers, names, dates differ):
+    # MinHash LSH over recent cached results, estimated Jaccard threshold
+    near_duplicate_enabled: bool = True
+    near_duplicate_min_similarity: float = 0.8
+    near_duplicate_min_terms: int = 8  # shorter texts are too unreliable
+    near_duplicate_max_entries: int = 5000
+    near_duplicate_ttl: int = 3600
+
+    # Reply pipeline: "separate" (classify, then reply) or "combined" (one call)
+    classify_reply_mode: str = "separate"
+
+    # Retries of transient upstream failures (429/5xx/transport errors)
+    retry_max_attempts: int = 3
+    retry_base_delay: float = 0.25
+    retry_max_delay: float = 4.0
+    retry_budget_seconds: float = 45.0  # total time across all attempts
+
+    # Upstream admission: adaptive (AIMD) concurrency and RPM/TPM pacing
+    upstream_concurrency_initial: int = 8
+    upstream_concurrency_min: int = 1
+    upstream_concurrency_max: int = 64
+    upstream_rpm_limit: int = 0  # requests per minute, 0 disables pacing
+    upstream_tpm_limit: int = 0  # estimated tokens per minute, 0 disables
+    upstream_queue_max: int = 100
+    upstream_queue_timeout: float = 5.0  # max seconds queued for a slot
+
+    # Upstream scheduling: interactive first, weighted fair share per user
+    scheduler_default_weight: float = 1.0
+    scheduler_user_weights: Dict[str, float] = {}  # e.g. {"user:batch": 0.5}
+
+    # Overload control: full -> classify_only -> heuristic -> shed (503).
+    # Each list holds the thresholds entering those three degraded modes
+    overload_control_enabled: bool = True
+    overload_loop_lag_ms: List[float] = [100.0, 250.0, 500.0]
+    overload_in_flight: List[float] = [64, 128, 256]
+    overload_queue_ms: List[float] = [1000.0, 2500.0, 4000.0]
+    overload_recover_ratio: float = 0.7  # leave a mode below 70% of its threshold
+    overload_cooldown_seconds: float = 10.0
+    overload_retry_after_seconds: int = 5
+
+    # Hedged requests (opt-in): duplicate slow calls after a latency percentile
+    hedging_enabled: bool = False
+    hedging_percentile: float = 0.9
+    hedging_min_samples: int = 20
+    hedging_min_delay: float = 0.05  # seconds
+    hedging_max_ratio: float = 0.1  # hedges as a share of recent requests
+
+    # Circuit breaker per upstream endpoint
+    circuit_breaker_enabled: bool = True
+    circuit_breaker_window: float = 30.0  # rolling window (seconds)
+    circuit_breaker_min_requests: int = 10
+    circuit_breaker_error_rate: float = 0.5
+    circuit_breaker_slow_call_seconds: float = 10.0
+    circuit_breaker_slow_call_rate: float = 0.5
+    circuit_breaker_open_seconds: float = 30.0
+    circuit_breaker_half_open_probes: int = 3
+
+    # Coalesce identical concurrent upstream calls
+    singleflight_enabled: bool = True
 
     model_config = {"protected_namespaces": (), "env_file": ".env"}
 
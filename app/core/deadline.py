@@ -0,0 +1,58 @@
+"""
+Per-request deadline propagated through contextvars
+The route sets the deadline once; extraction, preprocessing and every
+upstream AI call read the remaining budget instead of a flat timeout
+"""
+
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the remaining budget cannot cover the next stage"""
+
+
+def start_deadline(seconds: float) -> float:
+    """Set the current request's deadline `seconds` from now (monotonic)"""
+    deadline = time.monotonic() + seconds
+    _deadline.set(deadline)
+    return deadline
+
+
+def clear_deadline() -> None:
+    _deadline.set(None)
+
+
+def get_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None when no deadline is set"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0.0
+
+
+def parse_timeout_header(value: Optional[str], maximum: float) -> float:
+    """
+    Budget requested by the client, in seconds. Clients may only shorten
+    the server's deadline; invalid or non-positive values are ignored.
+    """
+    if value:
+        try:
+            requested = float(value.strip())
+        except ValueError:
+            return maximum
+        if requested > 0:
+            return min(requested, maximum)
+    return maximum
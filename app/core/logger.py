@@ -18,6 +18,11 @@ class StructuredLogger:
     def __init__(self, name: str):
         self.logger = logging.getLogger(name)
 
+    def debug(self, message: str, **kwargs):
+        # Hot paths log at debug: skip building the entry when disabled
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self._log("DEBUG", message, **kwargs)
+
     def info(self, message: str, **kwargs):
         self._log("INFO", message, **kwargs)
 
@@ -0,0 +1,27 @@
+"""
+Traffic class and fairness flow of the current request (contextvars)
+Routes tag each request once; the upstream scheduler reads the tag to give
+interactive traffic priority and share capacity fairly between users
+"""
+
+from contextvars import ContextVar
+from typing import Tuple
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+TRAFFIC_CLASSES = (INTERACTIVE, BULK)
+
+_traffic: ContextVar[Tuple[str, str]] = ContextVar(
+    "request_traffic", default=(INTERACTIVE, "anonymous")
+)
+
+
+def set_traffic(traffic_class: str, flow: str) -> None:
+    """Tag the current request with its class and fairness flow (user)"""
+    if traffic_class not in TRAFFIC_CLASSES:
+        raise ValueError(f"Unknown traffic class: {traffic_class}")
+    _traffic.set((traffic_class, flow))
+
+
+def get_traffic() -> Tuple[str, str]:
+    return _traffic.get()
@@ -0,0 +1,246 @@
+"""
+Upstream admission control for OpenAI calls
+An AIMD adaptive concurrency limit plus token buckets pacing requests and
+estimated tokens per minute, with a bounded queue and a queue-time budget
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.core.traffic import INTERACTIVE
+from app.services.scheduler import FairQueue
+
+# Outcomes fed back into the adaptive limit
+SUCCESS = "success"
+OVERLOAD = "overload"
+IGNORE = "ignore"
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call cannot be admitted within its queue budget"""
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at rate_per_minute, holding at most `burst`.
+    reserve() may drive the balance negative: the caller then waits until
+    its share has been refilled, which paces callers in arrival order.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        burst: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate_per_minute / 60.0
+        # Ten seconds of quota by default: smooth bursts, keep the minute's total
+        self.capacity = burst if burst is not None else max(1.0, self.rate * 10)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take `amount` and return the seconds to wait before using it"""
+        self._refill()
+        self._tokens -= amount
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self, amount: float) -> None:
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+
+class AIMDLimit:
+    """
+    Additive-increase / multiplicative-decrease concurrency limit: grows by
+    about one slot per round of successful calls while the limit is in use,
+    shrinks by `backoff` on 429/503/timeouts
+    """
+
+    def __init__(
+        self,
+        initial: float = 8,
+        minimum: float = 1,
+        maximum: float = 64,
+        backoff: float = 0.7,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.value = float(min(maximum, max(minimum, initial)))
+
+    @property
+    def current(self) -> int:
+        return int(self.value)
+
+    def on_outcome(self, outcome: str, in_flight: int) -> None:
+        if outcome == OVERLOAD:
+            self.value = max(self.minimum, self.value * self.backoff)
+        elif outcome == SUCCESS and in_flight + 1 >= self.current:
+            self.value = min(self.maximum, self.value + 1.0 / self.value)
+
+
+class AdmissionController:
+    """Bounds in-flight upstream calls and paces them against RPM/TPM quotas"""
+
+    def __init__(
+        self,
+        limit: AIMDLimit,
+        rpm: Optional[TokenBucket] = None,
+        tpm: Optional[TokenBucket] = None,
+        max_queue: int = 100,
+        queue_timeout: float = 5.0,
+        queue: Optional[FairQueue] = None,
+    ):
+        self.limit = limit
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        # Who gets the next free slot: interactive first, fair across users
+        self._waiters = queue if queue is not None else FairQueue()
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.paced = 0
+        self.paced_seconds = 0.0
+        self.queue_seconds = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def queue_delay(self) -> float:
+        """Current queueing delay: age of the oldest waiter, in seconds"""
+        return self._waiters.oldest_wait()
+
+    async def acquire(
+        self,
+        tokens: float = 0.0,
+        budget: Optional[float] = None,
+        traffic_class: str = INTERACTIVE,
+        flow: str = "anonymous",
+    ) -> float:
+        """
+        Wait for a concurrency slot and for the quota to cover one request
+        and `tokens`, at most min(queue_timeout, budget) seconds. Queued
+        callers are served by traffic class and fair share of their flow.
+        Returns
+        the time spent waiting; raises AdmissionRejected instead of waiting
+        longer. Every successful acquire must be paired with release().
+        """
+        started = time.monotonic()
+        limit = (
+            self.queue_timeout if budget is None else min(self.queue_timeout, budget)
+        )
+
+        if self._in_flight < self.limit.current and not self._waiters:
+            self._in_flight += 1
+        else:
+            await self._enqueue(limit, traffic_class, flow)
+
+        try:
+            await self._pace(tokens, limit - (time.monotonic() - started))
+        except BaseException:
+            self._release_slot()
+            raise
+
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.queue_seconds += waited
+        self._waiters.record_wait(traffic_class, waited)
+        return waited
+
+    def release(self, outcome: str = IGNORE) -> None:
+        """Return the slot and feed the call's outcome to the adaptive limit"""
+        self.limit.on_outcome(outcome, self._in_flight - 1)
+        self._release_slot()
+
+    async def _enqueue(self, budget: float, traffic_class: str, flow: str) -> None:
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected("upstream queue full")
+
+        self.queued_total += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.push(waiter, traffic_class, flow)
+        try:
+            await asyncio.wait_for(waiter, timeout=max(0.0, budget))
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up: pass it on
+                self._release_slot()
+            else:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected_timeout += 1
+            raise AdmissionRejected("upstream queue time budget exceeded") from None
+
+    async def _pace(self, tokens: float, budget: float) -> None:
+        delay = 0.0
+        reserved = []
+        for bucket, amount in ((self.rpm, 1.0), (self.tpm, tokens)):
+            if bucket is not None and amount > 0:
+                delay = max(delay, bucket.reserve(amount))
+                reserved.append((bucket, amount))
+        if delay <= 0:
+            return
+        if delay > budget:
+            for bucket, amount in reserved:
+                bucket.refund(amount)
+            self.rejected_timeout += 1
+            raise AdmissionRejected("rate limit pacing exceeds queue budget")
+        self.paced += 1
+        self.paced_seconds += delay
+        await asyncio.sleep(delay)
+
+    def _release_slot(self) -> None:
+        self._in_flight -= 1
+        while self._waiters and self._in_flight < self.limit.current:
+            waiter = self._waiters.pop()
+            if waiter is None:
+                break
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "limit": self.limit.current,
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "paced": self.paced,
+            "paced_seconds": round(self.paced_seconds, 3),
+            "queue_seconds": round(self.queue_seconds, 3),
+            "queues": self._waiters.stats(),
+        }
+        if self.rpm is not None:
+            stats["rpm_available"] = round(self.rpm.available, 1)
+        if self.tpm is not None:
+            stats["tpm_available"] = round(self.tpm.available, 1)
+        return stats
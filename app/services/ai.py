@@ -1,16 +1,80 @@
+import asyncio
+import copy
+import importlib.util
 import json
 import re
-from typing import Any, Dict
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
 
 import httpx
 
+from app.core import deadline as request_deadline
+from app.core import traffic
 from app.core.config import settings
+from app.core.deadline import DeadlineExceeded
 from app.core.logger import get_logger
+from app.services.admission import (
+    IGNORE,
+    OVERLOAD,
+    SUCCESS,
+    AdmissionController,
+    AdmissionRejected,
+    AIMDLimit,
+    TokenBucket,
+)
+from app.services.cache import ClassificationCache, make_cache_key
+from app.services.circuit_breaker import OPEN, CircuitBreaker, CircuitOpenError
+from app.services.document import analyze, current_document
+from app.services.endpoints import (
+    PRIORITY,
+    ROUTING_POLICIES,
+    Endpoint,
+    EndpointRegistry,
+    EndpointSaturated,
+)
+from app.services.feedback import FeedbackLearner, LocalShareTracker
+from app.services.hedging import HedgePolicy
 from app.services.heuristics import classify_heuristic
+from app.services.keywords import CLEAR_IMPRODUTIVE, CLEAR_PRODUCTIVE
+from app.services.local_model import (
+    DATA_DIR,
+    DEFAULT_MODEL_PATH,
+    MODEL_NAME,
+    NaiveBayesModel,
+    load_local_model,
+)
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services.overload import CLASSIFY_ONLY, HEURISTIC, overload_controller
 from app.services.prompt_templates import prompt_optimizer
+from app.services.retry import RETRYABLE_STATUS_CODES, RetryPolicy, RetryStats
+from app.services.scheduler import FairQueue
+from app.services.singleflight import SingleFlight
+from app.services.tokens import estimate_tokens
 
 logger = get_logger(__name__)
 
+PARSE_ERROR_RATIONALE = "Erro na resposta da IA"
+VALID_CATEGORIES = ("Produtivo", "Improdutivo")
+
+
+def configured_endpoints() -> List[Dict[str, Any]]:
+    """Endpoint specs to route across (the single base URL when none are set)"""
+    if settings.openai_endpoints:
+        return settings.openai_endpoints
+    return [{"name": "default", "base_url": settings.openai_base_url}]
+
+
+def _routes_upstream() -> bool:
+    """True when settings.provider is a routing policy over the endpoints"""
+    return settings.provider in ROUTING_POLICIES
+
+
+def _credentials_configured() -> bool:
+    return bool(settings.openai_api_key) or any(
+        spec.get("api_key") for spec in settings.openai_endpoints
+    )
+
 
 def _safe_json_loads(content: str) -> dict:
     """
@@ -25,7 +89,7 @@ def _safe_json_loads(content: str) -> dict:
         logger.warning(
             "Invalid JSON returned by OpenAI", extra={"raw_content": content}
         )
-        return {"category": "Produtivo", "rationale": "Erro na resposta da IA"}
+        return {"category": "Produtivo", "rationale": PARSE_ERROR_RATIONALE}
 
 
 def _validate_openai_response(data: dict) -> str:
@@ -44,26 +108,1012 @@ def _validate_openai_response(data: dict) -> str:
     return content.strip()
 
 
+def _parse_combined_response(content: str) -> Dict[str, str]:
+    """
+    Strictly parse a combined classification + reply response
+    Raises ValueError when any field is missing or invalid
+    """
+    content = re.sub(r"^```(?:json)?|```$", "", content.strip(), flags=re.MULTILINE)
+    try:
+        parsed = json.loads(content)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON in combined response: {e}") from e
+
+    if not isinstance(parsed, dict):
+        raise ValueError("Combined response is not a JSON object")
+    if parsed.get("category") not in VALID_CATEGORIES:
+        raise ValueError(f"Invalid category: {parsed.get('category')!r}")
+    for field in ("rationale", "reply"):
+        value = parsed.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"Missing {field} in combined response")
+
+    return {
+        "category": parsed["category"],
+        "rationale": parsed["rationale"].strip(),
+        "reply": parsed["reply"].strip(),
+    }
+
+
+def _admission_outcome(status_code: int) -> str:
+    """How an upstream status should move the adaptive concurrency limit"""
+    if status_code == 200:
+        return SUCCESS
+    if status_code in (429, 503):
+        return OVERLOAD
+    return IGNORE
+
+
+def _estimate_request_tokens(payload: Dict[str, Any]) -> int:
+    """Estimated token cost of a chat request plus its output cap"""
+    prompt_tokens = sum(
+        estimate_tokens(m.get("content", "")) for m in payload.get("messages", [])
+    )
+    return prompt_tokens + int(payload.get("max_tokens", 0))
+
+
+def _token_budget(kind: str) -> Tuple[int, int]:
+    """(input, output) token budget for one kind of upstream call"""
+    return (
+        getattr(settings, f"{kind}_input_token_budget"),
+        getattr(settings, f"{kind}_max_output_tokens"),
+    )
+
+
+def _token_counts(data: Dict[str, Any], prompt: str, content: str) -> Dict[str, Any]:
+    """Token counts reported by the upstream, or offline estimates"""
+    usage = data.get("usage") or {}
+    if usage:
+        return {
+            "input": usage.get("prompt_tokens", 0),
+            "output": usage.get("completion_tokens", 0),
+            "estimated": False,
+        }
+    return {
+        "input": estimate_tokens(prompt),
+        "output": estimate_tokens(content),
+        "estimated": True,
+    }
+
+
+def _with_mode(result: Dict[str, Any], text: str) -> Dict[str, Any]:
+    """
+    Stamp the service mode that produced this result, and how much
+    preprocessing cut from the request's email, into its meta
+    """
+    meta = result.setdefault("meta", {})
+    meta["service_mode"] = overload_controller.mode
+    document = current_document(text)
+    if document is not None and document.preprocessing is not None:
+        meta["preprocessing"] = document.preprocessing
+    else:
+        # Results are cached and shared: drop another request's numbers
+        meta.pop("preprocessing", None)
+    return result
+
+
+def _is_upstream_failure(status_code: int) -> bool:
+    """Statuses that indicate an unhealthy upstream (not a bad request)"""
+    return status_code == 429 or status_code >= 500
+
+
 class AIProvider:
-    def __init__(self):
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
         self.timeout = settings.ai_timeout
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Closes of clients replaced after an event loop change
+        self._closing: Set[Any] = set()
+        self._requests_total = 0
+        self._requests_in_flight = 0
+        self.cache = ClassificationCache(
+            max_entries=settings.classification_cache_max_entries,
+            max_bytes=settings.classification_cache_max_bytes,
+            ttl_seconds=settings.classification_cache_ttl,
+        )
+        self.near_duplicates = NearDuplicateIndex(
+            min_similarity=settings.near_duplicate_min_similarity,
+            max_entries=settings.near_duplicate_max_entries,
+            ttl_seconds=settings.near_duplicate_ttl,
+            min_terms=settings.near_duplicate_min_terms,
+        )
+        self.singleflight = SingleFlight()
+        self.tier_counts = {
+            "cache": 0,
+            "heuristic": 0,
+            "near_duplicate": 0,
+            "local": 0,
+            "llm": 0,
+            "fallback": 0,
+        }
+        self.local_share = LocalShareTracker(
+            bucket_seconds=settings.local_share_bucket_seconds,
+            buckets=settings.local_share_buckets,
+        )
+        # Published local model: replaced by reference, never mutated
+        self.local_model: Optional[NaiveBayesModel] = None
+        self.feedback: Optional[FeedbackLearner] = None
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.endpoints = EndpointRegistry(
+            alpha=settings.endpoint_ewma_alpha,
+            failure_cooldown=settings.endpoint_failure_cooldown,
+        )
+        self.retry_policy = RetryPolicy(
+            max_attempts=settings.retry_max_attempts,
+            base_delay=settings.retry_base_delay,
+            max_delay=settings.retry_max_delay,
+        )
+        self.retry_stats = RetryStats()
+        self.hedging = HedgePolicy(
+            percentile=settings.hedging_percentile,
+            min_samples=settings.hedging_min_samples,
+            min_delay=settings.hedging_min_delay,
+            max_ratio=settings.hedging_max_ratio,
+        )
+        self.deadline_degraded = 0
+        self.admission = AdmissionController(
+            AIMDLimit(
+                initial=settings.upstream_concurrency_initial,
+                minimum=settings.upstream_concurrency_min,
+                maximum=settings.upstream_concurrency_max,
+            ),
+            rpm=(
+                TokenBucket(settings.upstream_rpm_limit)
+                if settings.upstream_rpm_limit > 0
+                else None
+            ),
+            tpm=(
+                TokenBucket(settings.upstream_tpm_limit)
+                if settings.upstream_tpm_limit > 0
+                else None
+            ),
+            max_queue=settings.upstream_queue_max,
+            queue_timeout=settings.upstream_queue_timeout,
+            queue=FairQueue(
+                weights=settings.scheduler_user_weights,
+                default_weight=settings.scheduler_default_weight,
+            ),
+        )
+
+    async def startup(self) -> None:
+        """Create the pooled upstream client (called from the app lifespan)"""
+        self._get_client()
+        if settings.provider == "local":
+            self._get_local_model()
+
+    async def aclose(self) -> None:
+        """Close the pooled upstream client and release its connections"""
+        client, self._client, self._client_loop = self._client, None, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Return the shared pooled client, creating it on first use.
+        The pool is bound to the running event loop, so a loop change
+        (e.g. per-request loops in the test client) gets a fresh one.
+        """
+        loop = asyncio.get_running_loop()
+        if (
+            self._client is None
+            or self._client.is_closed
+            or self._client_loop is not loop
+        ):
+            stale, stale_loop = self._client, self._client_loop
+            self._client = self._build_client()
+            self._client_loop = loop
+            if stale is not None and not stale.is_closed:
+                self._close_stale_client(stale, stale_loop)
+        return self._client
+
+    def _close_stale_client(
+        self, client: httpx.AsyncClient, loop: Optional[asyncio.AbstractEventLoop]
+    ) -> None:
+        """
+        Close a client replaced after a loop change so its pool is released:
+        on its own loop while that loop still runs, here otherwise
+        """
+        if loop is not None and loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+        else:
+            future = asyncio.ensure_future(self._aclose_quietly(client))
+        self._closing.add(future)
+        future.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _aclose_quietly(client: httpx.AsyncClient) -> None:
+        try:
+            await client.aclose()
+        except Exception as e:
+            # Connections of a closed loop cannot be shut down cleanly
+            logger.debug("Stale upstream client closed with errors", error=str(e))
+
+    def _build_client(self) -> httpx.AsyncClient:
+        http2 = settings.http2_enabled
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("HTTP/2 requested but 'h2' is not installed, using HTTP/1.1")
+            http2 = False
+
+        limits = httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        )
+        logger.info(
+            "Creating pooled upstream HTTP client",
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            http2=http2,
+        )
+        return httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=limits,
+            http2=http2,
+            transport=self._transport,
+        )
+
+    def metrics(self) -> Dict[str, Any]:
+        """Aggregated runtime metrics of the upstream layer"""
+        return {
+            "pool": self.pool_stats(),
+            "cache": self.cache.stats(),
+            "near_duplicates": self.near_duplicates.stats(),
+            "singleflight": self.singleflight.stats(),
+            "tiers": dict(self.tier_counts),
+            "local_share": self.local_share.stats(),
+            "feedback": self.feedback.stats() if self.feedback else None,
+            "retries": self.retry_stats.stats(),
+            "admission": self.admission.stats(),
+            "hedging": self.hedging.stats(),
+            "endpoints": {
+                "policy": ROUTING_POLICIES.get(settings.provider),
+                **self.endpoints.stats(),
+            },
+            "deadline": {
+                "degraded": self.deadline_degraded,
+                "expected_upstream_ms": round(
+                    self.expected_upstream_seconds() * 1000, 1
+                ),
+            },
+            "circuit_breakers": {
+                name: breaker.stats() for name, breaker in self._breakers.items()
+            },
+        }
+
+    def upstream_queue_ms(self) -> float:
+        """Current upstream queueing delay (oldest waiter), in milliseconds"""
+        return self.admission.queue_delay() * 1000
+
+    def breaker_states(self) -> Dict[str, str]:
+        """Current circuit breaker state per upstream endpoint"""
+        return {name: breaker.state for name, breaker in self._breakers.items()}
+
+    def _breaker(self, endpoint: str) -> Optional[CircuitBreaker]:
+        """Circuit breaker guarding one upstream endpoint (None if disabled)"""
+        if not settings.circuit_breaker_enabled:
+            return None
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                endpoint,
+                window_seconds=settings.circuit_breaker_window,
+                min_requests=settings.circuit_breaker_min_requests,
+                error_rate_threshold=settings.circuit_breaker_error_rate,
+                slow_call_seconds=settings.circuit_breaker_slow_call_seconds,
+                slow_call_rate_threshold=settings.circuit_breaker_slow_call_rate,
+                open_seconds=settings.circuit_breaker_open_seconds,
+                half_open_probes=settings.circuit_breaker_half_open_probes,
+            )
+            self._breakers[endpoint] = breaker
+        return breaker
+
+    def _admit(self, endpoint: str) -> Optional[CircuitBreaker]:
+        """Fail fast with CircuitOpenError while the endpoint's circuit is open"""
+        breaker = self._breaker(endpoint)
+        if breaker is not None and not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open for {endpoint}")
+        return breaker
+
+    def _endpoint_open(self, endpoint: Endpoint) -> bool:
+        breaker = self._breakers.get(endpoint.url)
+        return breaker is not None and breaker.state == OPEN
+
+    async def _route(self, tried: Sequence[Endpoint], deadline: float) -> Endpoint:
+        """
+        Best usable endpoint not tried yet in this attempt. While every
+        one left is at its concurrency cap the call queues for a free slot
+        until deadline, then is rejected like a full admission queue
+        """
+        self.endpoints.configure(configured_endpoints())
+        policy = ROUTING_POLICIES.get(settings.provider, PRIORITY)
+        while True:
+            try:
+                return self.endpoints.choose(policy, self._endpoint_open, tried)
+            except EndpointSaturated:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not await self.endpoints.wait_for_capacity(
+                    remaining
+                ):
+                    raise AdmissionRejected(
+                        "every upstream endpoint at its concurrency cap"
+                    ) from None
+
+    def _fail_over(self, tried: List[Endpoint], reason: str, deadline: float) -> bool:
+        """Move on to the next usable endpoint at once, if there is one"""
+        if deadline <= time.monotonic():
+            return False
+        policy = ROUTING_POLICIES.get(settings.provider, PRIORITY)
+        if not self.endpoints.candidates(policy, self._endpoint_open, tried):
+            return False
+        self.endpoints.failovers += 1
+        logger.warning(
+            "Upstream endpoint failed, failing over",
+            endpoint=tried[-1].name,
+            reason=reason,
+        )
+        return True
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """Report usage of the upstream connection pool"""
+        stats: Dict[str, Any] = {
+            "active": self._client is not None and not self._client.is_closed,
+            "max_connections": settings.http_max_connections,
+            "max_keepalive_connections": settings.http_max_keepalive_connections,
+            "requests_total": self._requests_total,
+            "requests_in_flight": self._requests_in_flight,
+            "connections_open": 0,
+            "connections_idle": 0,
+        }
+        # httpcore does not expose pool state publicly; best effort only
+        pool = getattr(getattr(self._client, "_transport", None), "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is not None:
+            stats["connections_open"] = len(connections)
+            stats["connections_idle"] = sum(1 for c in connections if c.is_idle())
+        return stats
+
+    def _chat_request(
+        self, prompt: str, temperature: float, max_tokens: int, stream: bool = False
+    ) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """Headers and JSON payload for a chat completion"""
+        headers = {
+            "Authorization": f"Bearer {settings.openai_api_key}",
+            "Content-Type": "application/json",
+        }
+        payload: Dict[str, Any] = {
+            "model": settings.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        }
+        if stream:
+            payload["stream"] = True
+        return headers, payload
+
+    def expected_upstream_seconds(self) -> float:
+        """Median observed upstream latency, or the configured prior"""
+        if len(self.hedging.tracker) >= self.hedging.min_samples:
+            return self.hedging.tracker.percentile(0.5)
+        return settings.expected_upstream_seconds
+
+    def _upstream_deadline(self) -> float:
+        """Retry budget for one logical call, capped by the request deadline"""
+        deadline = time.monotonic() + settings.retry_budget_seconds
+        request_left = request_deadline.remaining()
+        if request_left is not None:
+            deadline = min(deadline, time.monotonic() + request_left)
+        return deadline
+
+    def _attempt_timeout(self, deadline: float) -> float:
+        """
+        Timeout for the next attempt: what is left of the budget, capped by
+        ai_timeout. Raises DeadlineExceeded when that cannot even cover the
+        expected upstream latency, so callers degrade to heuristics/templates
+        """
+        left = deadline - time.monotonic()
+        if left < self.expected_upstream_seconds():
+            self.deadline_degraded += 1
+            raise DeadlineExceeded(f"{left:.3f}s left before the upstream call")
+        return min(self.timeout, left)
+
+    async def _wait_for_retry(
+        self, attempt: int, delay: float, deadline: float, reason: str
+    ) -> bool:
+        """Sleep before the next attempt if policy and deadline allow it"""
+        remaining = deadline - time.monotonic()
+        if not self.retry_policy.can_retry(attempt, delay, remaining):
+            self.retry_stats.record_exhausted()
+            return False
+
+        self.retry_stats.record_retry(reason, delay)
+        logger.warning(
+            "Retrying upstream call",
+            attempt=attempt,
+            reason=reason,
+            delay_ms=round(delay * 1000),
+        )
+        await asyncio.sleep(delay)
+        return True
+
+    async def _post_once(
+        self, headers: Dict[str, str], payload: Dict[str, Any], timeout: float
+    ) -> httpx.Response:
+        """
+        One attempt: upstream admission, then the routed endpoint, failing
+        over to the next usable endpoint on transport errors, open circuits
+        and 429/5xx (no backoff between endpoints)
+        """
+        waited = await self._acquire_upstream(payload, timeout)
+        deadline = time.monotonic() + timeout - waited
+        outcome = IGNORE
+        tried: List[Endpoint] = []
+        try:
+            while True:
+                endpoint = await self._route(tried, deadline)
+                tried.append(endpoint)
+                try:
+                    response = await self._post_endpoint(
+                        endpoint,
+                        headers,
+                        payload,
+                        max(0.001, deadline - time.monotonic()),
+                    )
+                except httpx.TimeoutException as e:
+                    outcome = OVERLOAD
+                    if self._fail_over(tried, type(e).__name__, deadline):
+                        continue
+                    raise
+                except (httpx.TransportError, CircuitOpenError) as e:
+                    if self._fail_over(tried, type(e).__name__, deadline):
+                        continue
+                    raise
+                outcome = _admission_outcome(response.status_code)
+                if _is_upstream_failure(response.status_code) and self._fail_over(
+                    tried, str(response.status_code), deadline
+                ):
+                    continue
+                return response
+        finally:
+            self.admission.release(outcome)
+
+    async def _post_endpoint(
+        self,
+        endpoint: Endpoint,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+        timeout: float,
+    ) -> httpx.Response:
+        """Circuit breaker admission, pooled POST and outcome record"""
+        breaker = self._admit(endpoint.url)
+        headers, payload = endpoint.prepare(headers, payload)
+        client = self._get_client()
+        self._requests_total += 1
+        self._requests_in_flight += 1
+        endpoint.start()
+        self.retry_stats.record_attempt()
+        started = time.monotonic()
+        succeeded: Optional[bool] = None
+        try:
+            response = await client.post(
+                endpoint.url, headers=headers, json=payload, timeout=timeout
+            )
+            succeeded = not _is_upstream_failure(response.status_code)
+            if response.status_code == 200:
+                self.hedging.tracker.record(time.monotonic() - started)
+            return response
+        except Exception:
+            succeeded = False
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            self._requests_in_flight -= 1
+            endpoint.finish(succeeded, elapsed)
+            if breaker is not None:
+                breaker.record(succeeded, elapsed)
+
+    async def _acquire_upstream(self, payload: Dict[str, Any], budget: float) -> float:
+        """
+        Wait for an upstream slot (scheduled by the request's traffic class
+        and user) and RPM/TPM quota; returns the time waited
+        """
+        tokens = _estimate_request_tokens(payload) if self.admission.tpm else 0
+        traffic_class, flow = traffic.get_traffic()
+        return await self.admission.acquire(tokens, budget, traffic_class, flow)
+
+    async def _post_attempt(
+        self, headers: Dict[str, str], payload: Dict[str, Any], timeout: float
+    ) -> httpx.Response:
+        """
+        One logical attempt, hedged when enabled: if the primary request is
+        slower than the tracked latency percentile, an identical second
+        request is sent and the first good answer wins (the loser is
+        cancelled)
+        """
+        if not settings.hedging_enabled:
+            return await self._post_once(headers, payload, timeout)
+
+        self.hedging.record_primary()
+        delay = self.hedging.hedge_delay()
+        if delay is None or delay >= timeout:
+            return await self._post_once(headers, payload, timeout)
+
+        primary = asyncio.ensure_future(self._post_once(headers, payload, timeout))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done or not self.hedging.try_acquire():
+                return await primary
+
+            hedge = asyncio.ensure_future(
+                self._post_once(headers, payload, max(0.001, timeout - delay))
+            )
+            tasks.append(hedge)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    # Prefer a good answer; surface a failure only if both fail
+                    if task.exception() is None and task.result().status_code == 200:
+                        self.hedging.record_winner(task is hedge)
+                        return task.result()
+            return await (primary if primary.exception() is None else hedge)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _post_chat_completion(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        error_message: str = "OpenAI API error",
+    ) -> Dict[str, Any]:
+        """
+        Send a chat completion request through the pooled client, retrying
+        transient failures (429/5xx/transport errors) within the budget
+        Raises exception on non-200 responses
+        """
+        headers, payload = self._chat_request(prompt, temperature, max_tokens)
+        deadline = self._upstream_deadline()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            timeout = self._attempt_timeout(deadline)
+            try:
+                response = await self._post_attempt(headers, payload, timeout)
+            except httpx.TransportError as e:
+                delay = self.retry_policy.backoff(attempt)
+                if await self._wait_for_retry(
+                    attempt, delay, deadline, type(e).__name__
+                ):
+                    continue
+                raise
+
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                delay = self.retry_policy.delay_for_response(
+                    attempt, response.status_code, response.headers
+                )
+                if await self._wait_for_retry(
+                    attempt, delay, deadline, str(response.status_code)
+                ):
+                    continue
+            break
+
+        if response.status_code != 200:
+            error_data = response.json() if response.content else {}
+            error_msg = error_data.get("error", {}).get("message", "Unknown error")
+            logger.error(
+                error_message,
+                extra={
+                    "status_code": response.status_code,
+                    "error": error_msg,
+                    "response": error_data,
+                },
+            )
+            raise Exception(f"OpenAI API error ({response.status_code}): {error_msg}")
+
+        return response.json()
+
+    async def _stream_chat_completion(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        error_message: str = "OpenAI API error",
+    ) -> AsyncIterator[str]:
+        """
+        Stream a chat completion through the pooled client (SSE)
+        Yields content deltas as they arrive; only the attempt to open the
+        stream is retried, never a stream that already produced tokens
+        """
+        headers, payload = self._chat_request(
+            prompt, temperature, max_tokens, stream=True
+        )
+        deadline = self._upstream_deadline()
+
+        attempt = 1
+        tried: List[Endpoint] = []
+        emitted = False
+        while True:
+            retry_delay: Optional[float] = None
+            retry_reason = ""
+            error: Optional[Exception] = None
+            timeout = self._attempt_timeout(deadline)
+            timeout = max(
+                0.001, timeout - await self._acquire_upstream(payload, timeout)
+            )
+            outcome = IGNORE
+
+            try:
+                endpoint = await self._route(tried, time.monotonic() + timeout)
+                breaker = self._admit(endpoint.url)
+            except (CircuitOpenError, AdmissionRejected):
+                self.admission.release()
+                raise
+            tried.append(endpoint)
+            endpoint_headers, endpoint_payload = endpoint.prepare(headers, payload)
+            client = self._get_client()
+            self._requests_total += 1
+            self._requests_in_flight += 1
+            endpoint.start()
+            self.retry_stats.record_attempt()
+            started = time.monotonic()
+            # Judge the endpoint on time-to-headers, not stream duration
+            elapsed: Optional[float] = None
+            succeeded: Optional[bool] = None
+            try:
+                async with client.stream(
+                    "POST",
+                    endpoint.url,
+                    headers=endpoint_headers,
+                    json=endpoint_payload,
+                    timeout=timeout,
+                ) as response:
+                    elapsed = time.monotonic() - started
+                    succeeded = not _is_upstream_failure(response.status_code)
+                    outcome = _admission_outcome(response.status_code)
+                    if breaker is not None:
+                        breaker.record(succeeded, elapsed)
+
+                    if response.status_code in RETRYABLE_STATUS_CODES:
+                        retry_reason = str(response.status_code)
+                        retry_delay = self.retry_policy.delay_for_response(
+                            attempt, response.status_code, response.headers
+                        )
+                    elif response.status_code != 200:
+                        body = await response.aread()
+                        logger.error(
+                            error_message,
+                            extra={"status_code": response.status_code, "body": body},
+                        )
+                        raise Exception(f"OpenAI API error ({response.status_code})")
+                    else:
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:") :].strip()
+                            if data == "[DONE]":
+                                break
+                            choices = json.loads(data).get("choices") or [{}]
+                            delta = choices[0].get("delta", {}).get("content")
+                            if delta:
+                                emitted = True
+                                yield delta
+                        return
+            except httpx.TransportError as e:
+                succeeded = False
+                if isinstance(e, httpx.TimeoutException):
+                    outcome = OVERLOAD
+                if emitted:
+                    # Retrying would replay the deltas already sent
+                    raise
+                retry_reason = type(e).__name__
+                retry_delay = self.retry_policy.backoff(attempt)
+                error = e
+            except Exception:
+                # A client error raised after the headers keeps its status
+                # classification, as in _post_endpoint
+                if succeeded is None:
+                    succeeded = False
+                raise
+            finally:
+                self._requests_in_flight -= 1
+                self.admission.release(outcome)
+                if elapsed is None:
+                    elapsed = time.monotonic() - started
+                    if breaker is not None:
+                        breaker.record(succeeded, elapsed)
+                endpoint.finish(succeeded, elapsed)
+
+            if self._fail_over(tried, retry_reason, deadline):
+                continue
+            if not await self._wait_for_retry(
+                attempt, retry_delay, deadline, retry_reason
+            ):
+                if error is not None:
+                    raise error
+                logger.error(error_message, extra={"status_code": retry_reason})
+                raise Exception(f"OpenAI API error ({retry_reason})")
+            attempt += 1
+            tried = []
+
+    def _request_version(self) -> str:
+        """
+        Provider, model and prompt templates that shape upstream answers,
+        plus the local model snapshot when it can answer: feedback
+        retraining publishes a new version, which retires cached and
+        near-duplicate answers the local model may have produced
+        """
+        version = (
+            f"{settings.provider}:{settings.model_name}:{prompt_optimizer.version}"
+        )
+        local_answers = settings.provider in ("local", "HF") or (
+            settings.cascade_enabled and settings.local_model_cascade_enabled
+        )
+        if local_answers and self.local_model is not None:
+            version = f"{version}:{self.local_model.version}"
+        return version
+
+    async def _coalesce(self, kind: str, key_text: str, fn):
+        """Share one upstream call among concurrent identical requests"""
+        if not settings.singleflight_enabled:
+            return await fn()
+        key = (kind, make_cache_key(key_text, self._request_version()))
+        return await self.singleflight.do(key, fn)
 
     async def classify(self, text: str) -> Dict[str, Any]:
+        """
+        Classify email, serving repeated texts from the result cache and
+        coalescing identical in-flight requests
+        """
+        result, _ = await self._classify_tiered(text)
+        return _with_mode(result, text)
+
+    async def _classify_tiered(
+        self, text: str, combined_tone: Optional[str] = None
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        Cache, near-duplicate and local tiers, then the LLM. With a
+        combined_tone the LLM call also writes the reply in that tone,
+        returned alongside; otherwise the reply is None
+        """
+        cache_key, cached = self._cache_lookup(text)
+        if cached is not None:
+            self._count_tier("cache")
+            return cached, None
+
+        near = self._near_duplicate_lookup(text)
+        if near is not None:
+            self._count_tier("near_duplicate")
+            return near, None
+
+        local = self._classify_local(text)
+        if local is not None:
+            self._count_tier(local["meta"]["tier"])
+            return local, None
+
+        if overload_controller.at_least(HEURISTIC):
+            self._count_tier("fallback")
+            return self._heuristic_fallback(text), None
+
+        reply: Optional[str] = None
+        result: Optional[Dict[str, Any]] = None
+        if combined_tone is not None:
+            try:
+                result, reply = await self._coalesce(
+                    f"combined:{combined_tone}",
+                    text,
+                    lambda: self._classify_and_reply_combined(
+                        text, combined_tone, cache_key
+                    ),
+                )
+            except Exception as e:
+                logger.warning(
+                    "Combined classify+reply failed, using two-call path",
+                    error=str(e),
+                )
+        if result is None:
+            result = await self._coalesce(
+                "classify", text, lambda: self._classify_and_store(text, cache_key)
+            )
+        meta = result.get("meta", {})
+        tier = meta.get("tier") or ("fallback" if meta.get("fallback") else "llm")
+        self._count_tier(tier)
+        # Callers mutate the result (user, timestamp), so each gets its own copy
+        return copy.deepcopy(result), reply
+
+    def _count_tier(self, tier: str) -> None:
+        self.tier_counts[tier] += 1
+        self.local_share.record(tier)
+
+    def _classify_local(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Cascade first tiers: answer locally when the heuristic scorer (or
+        else the local model) is confident enough, otherwise return None
+        and let the LLM decide
+        """
+        if not settings.cascade_enabled:
+            return None
+
+        category, confidence, rationale = classify_heuristic(text)
+        if confidence < settings.confidence_threshold:
+            return self._cascade_local_model(text)
+
+        return {
+            "category": category,
+            "confidence": confidence,
+            "rationale": rationale,
+            "meta": {
+                "model": "heuristic",
+                "cost": 0.0,
+                "fallback": False,
+                "tier": "heuristic",
+            },
+        }
+
+    def _cascade_local_model(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Local model tier, once it has learned from enough documents
+        (bundled corpus plus feedback) and is confident about this email
+        """
+        if not settings.local_model_cascade_enabled or settings.provider == "local":
+            return None
+        try:
+            model = self._get_local_model()
+        except ValueError:
+            return None
+        if model.documents < settings.local_model_min_documents:
+            return None
+        result = self._classify_local_model(text)
+        if result["confidence"] < settings.local_model_confidence_threshold:
+            return None
+        return result
+
+    def _cache_lookup(
+        self, text: str
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """Return (cache_key, cached result) for text; both None if disabled"""
+        if not settings.classification_cache_enabled:
+            return None, None
+        cache_key = make_cache_key(text, self._request_version())
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            cached.setdefault("meta", {})["cached"] = True
+        return cache_key, cached
+
+    def _near_duplicate_lookup(self, text: str) -> Optional[Dict[str, Any]]:
+        """Reuse the result of a recently classified near-identical email"""
+        if not (
+            settings.classification_cache_enabled and settings.near_duplicate_enabled
+        ):
+            return None
+        hit = self.near_duplicates.lookup(text, self._request_version())
+        if hit is None:
+            return None
+        result, provenance = hit
+        meta = result.setdefault("meta", {})
+        meta["tier"] = "near_duplicate"
+        meta["near_duplicate"] = provenance
+        return result
+
+    def _cache_store(
+        self, cache_key: Optional[str], result: Dict[str, Any], text: str
+    ) -> None:
+        """Store successful upstream classifications only"""
+        meta = result.get("meta", {})
+        if (
+            cache_key is not None
+            and not meta.get("fallback", False)
+            and result.get("rationale") != PARSE_ERROR_RATIONALE
+        ):
+            self.cache.set(cache_key, result)
+            if settings.near_duplicate_enabled:
+                self.near_duplicates.add(
+                    cache_key, text, result, self._request_version()
+                )
+
+    async def _classify_and_store(
+        self, text: str, cache_key: Optional[str]
+    ) -> Dict[str, Any]:
+        result = await self._classify_uncached(text)
+        self._cache_store(cache_key, result, text)
+        return result
+
+    async def classify_and_reply(
+        self, text: str, tone: str
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Classify email and generate its reply.
+
+        In "combined" mode a single structured prompt returns category,
+        rationale and reply in one round trip; any failure falls back to
+        the two-call path (classify, then generate_reply). Under overload
+        only the classification may reach the LLM; the reply is a template.
+        """
+        if overload_controller.at_least(CLASSIFY_ONLY):
+            classification = await self.classify(text)
+            reply = self._generate_reply_fallback(classification["category"], tone)
+            return classification, reply
+
+        reply: Optional[str] = None
+        if settings.classify_reply_mode == "combined" and _routes_upstream():
+            classification, reply = await self._classify_tiered(text, tone)
+            classification = _with_mode(classification, text)
+        else:
+            classification = await self.classify(text)
+        if reply is None:
+            reply = await self.generate_reply(text, classification["category"], tone)
+        return classification, reply
+
+    async def _classify_and_reply_combined(
+        self, text: str, tone: str, cache_key: Optional[str]
+    ) -> Tuple[Dict[str, Any], str]:
+        """One upstream call returning classification and reply together"""
+        if not _credentials_configured():
+            raise ValueError("OpenAI API key not configured")
+
+        prompt = prompt_optimizer.build_combined_prompt(
+            text, tone, *_token_budget("combined")
+        )
+        data = await self._post_chat_completion(
+            prompt.text,
+            temperature=0.2,
+            max_tokens=prompt.max_tokens,
+            error_message="OpenAI API error during combined classify+reply",
+        )
+        content = _validate_openai_response(data)
+        parsed = _parse_combined_response(content)
+
+        classification: Dict[str, Any] = {
+            "category": parsed["category"],
+            "rationale": parsed["rationale"],
+            "meta": {
+                "model": settings.model_name,
+                "cost": self._estimate_cost(
+                    data.get("usage", {}), prompt.text, content
+                ),
+                "fallback": False,
+                "mode": "combined",
+                "tier": "llm",
+                "tokens": {
+                    **_token_counts(data, prompt.text, content),
+                    **prompt.token_meta(),
+                },
+            },
+        }
+        classification["confidence"] = self._calculate_confidence(text, classification)
+        self._cache_store(cache_key, classification, text)
+        return classification, parsed["reply"]
+
+    async def _classify_uncached(self, text: str) -> Dict[str, Any]:
         """
         Classify email using optimized prompts and confidence analysis
         """
         try:
-            if settings.provider == "OpenAI":
-                # Use optimized prompts
-                prompt = prompt_optimizer.get_optimized_classification_prompt(text)
-                result = await self._classify_openai_with_prompt(prompt)
+            if _routes_upstream():
+                # Use optimized prompts, fitted to the token budget
+                prompt = prompt_optimizer.build_classification_prompt(
+                    text, *_token_budget("classify")
+                )
+                result = await self._classify_openai_with_prompt(
+                    prompt.text, max_tokens=prompt.max_tokens
+                )
+                result["meta"].setdefault("tokens", {}).update(prompt.token_meta())
 
                 # Add quality analysis
                 if result.get("category"):
                     result["confidence"] = self._calculate_confidence(text, result)
 
+                result.setdefault("meta", {})["tier"] = "llm"
                 return result
 
+            elif settings.provider == "local":
+                return self._classify_local_model(text)
             elif settings.provider == "HF":
                 return await self._classify_huggingface(text)
             else:
@@ -75,29 +1125,48 @@ class AIProvider:
                 provider=settings.provider,
             )
             # Fallback to heuristics
-            category, confidence, rationale = classify_heuristic(text)
-            return {
-                "category": category,
-                "confidence": confidence,
-                "rationale": rationale,
-                "meta": {
-                    "model": "heuristic_fallback",
-                    "cost": 0.0,
-                    "fallback": True,
-                },
-            }
+            return self._heuristic_fallback(text)
+
+    def _heuristic_fallback(self, text: str) -> Dict[str, Any]:
+        """Heuristic classification used when the LLM fails or is shed"""
+        category, confidence, rationale = classify_heuristic(text)
+        return {
+            "category": category,
+            "confidence": confidence,
+            "rationale": rationale,
+            "meta": {
+                "model": "heuristic_fallback",
+                "cost": 0.0,
+                "fallback": True,
+                "tier": "fallback",
+            },
+        }
 
     async def generate_reply(self, text: str, category: str, tone: str) -> str:
+        """Generate automated reply, coalescing identical in-flight requests"""
+        if overload_controller.at_least(CLASSIFY_ONLY):
+            return self._generate_reply_fallback(category, tone)
+        return await self._coalesce(
+            f"reply:{category}:{tone}",
+            text,
+            lambda: self._generate_reply_uncached(text, category, tone),
+        )
+
+    async def _generate_reply_uncached(
+        self, text: str, category: str, tone: str
+    ) -> str:
         """
         Generate automated reply using optimized prompts
         """
         try:
-            if settings.provider == "OpenAI":
-                # Use enhanced prompt system
-                prompt = prompt_optimizer.get_optimized_reply_prompt(
-                    text, category, tone
+            if _routes_upstream():
+                # Use enhanced prompt system, fitted to the token budget
+                prompt = prompt_optimizer.build_reply_prompt(
+                    text, category, tone, *_token_budget("reply")
+                )
+                reply = await self._generate_reply_openai_with_prompt(
+                    prompt.text, max_tokens=prompt.max_tokens
                 )
-                reply = await self._generate_reply_openai_with_prompt(prompt)
 
                 # Analyze response quality
                 quality = prompt_optimizer.analyze_response_quality(
@@ -122,9 +1191,17 @@ class AIProvider:
             return self._generate_reply_fallback(category, tone)
 
     async def refine_reply(self, reply: str, tone: str) -> str:
+        """Refine existing reply, coalescing identical in-flight requests"""
+        if overload_controller.at_least(CLASSIFY_ONLY):
+            return reply
+        return await self._coalesce(
+            f"refine:{tone}", reply, lambda: self._refine_reply_uncached(reply, tone)
+        )
+
+    async def _refine_reply_uncached(self, reply: str, tone: str) -> str:
         """Refine existing reply with new tone"""
         try:
-            if settings.provider == "OpenAI":
+            if _routes_upstream():
                 return await self._refine_reply_openai(reply, tone)
             elif settings.provider == "HF":
                 return await self._refine_reply_huggingface(reply, tone)
@@ -136,7 +1213,7 @@ class AIProvider:
 
     async def _classify_openai(self, text: str) -> Dict[str, Any]:
         """OpenAI classification implementation"""
-        if not settings.openai_api_key:
+        if not _credentials_configured():
             raise ValueError("OpenAI API key not configured")
 
         prompt = f"""Tarefa: Classificar o e-mail como uma das categorias em ["Produtivo", "Improdutivo"].
@@ -154,71 +1231,43 @@ Responda APENAS em JSON válido:
 {{"category":"Produtivo|Improdutivo","rationale":"<motivo curto objetivo>"}} """
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.openai_api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
+            data = await self._post_chat_completion(
+                prompt,
+                temperature=0.1,
+                max_tokens=150,
+            )
+            content = _validate_openai_response(data)
+
+            # Parse JSON response
+            try:
+                parsed = _safe_json_loads(content)
+                confidence = 0.8  # Default confidence for AI responses
+
+                return {
+                    "category": parsed["category"],
+                    "confidence": confidence,
+                    "rationale": parsed["rationale"],
+                    "meta": {
                         "model": settings.model_name,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.1,
-                        "max_tokens": 150,
+                        "cost": self._estimate_cost(data.get("usage", {})),
+                        "fallback": False,
                     },
+                }
+            except Exception as json_error:
+                logger.warning(
+                    "Failed to parse OpenAI JSON response",
+                    extra={"raw_content": content, "error": str(json_error)},
                 )
-
-                if response.status_code != 200:
-                    error_data = response.json() if response.content else {}
-                    error_msg = error_data.get("error", {}).get(
-                        "message", "Unknown error"
-                    )
-                    logger.error(
-                        "OpenAI API error",
-                        extra={
-                            "status_code": response.status_code,
-                            "error": error_msg,
-                            "response": error_data,
-                        },
-                    )
-                    raise Exception(
-                        f"OpenAI API error ({response.status_code}): {error_msg}"
-                    )
-
-                data = response.json()
-                content = _validate_openai_response(data)
-
-                # Parse JSON response
-                try:
-                    parsed = _safe_json_loads(content)
-                    confidence = 0.8  # Default confidence for AI responses
-
-                    return {
-                        "category": parsed["category"],
-                        "confidence": confidence,
-                        "rationale": parsed["rationale"],
-                        "meta": {
-                            "model": settings.model_name,
-                            "cost": self._estimate_cost(data.get("usage", {})),
-                            "fallback": False,
-                        },
-                    }
-                except Exception as json_error:
-                    logger.warning(
-                        "Failed to parse OpenAI JSON response",
-                        extra={"raw_content": content, "error": str(json_error)},
-                    )
-                    return {
-                        "category": "Produtivo",
-                        "confidence": 0.5,
-                        "rationale": "Erro na resposta da IA",
-                        "meta": {
-                            "model": settings.model_name,
-                            "cost": 0.0,
-                            "fallback": True,
-                        },
-                    }
+                return {
+                    "category": "Produtivo",
+                    "confidence": 0.5,
+                    "rationale": PARSE_ERROR_RATIONALE,
+                    "meta": {
+                        "model": settings.model_name,
+                        "cost": 0.0,
+                        "fallback": True,
+                    },
+                }
 
         except Exception:
             logger.error("OpenAI classification error", exc_info=True)
@@ -227,7 +1276,7 @@ Responda APENAS em JSON válido:
     async def _generate_reply_openai(self, text: str, category: str, tone: str) -> str:
         """Generate reply using OpenAI"""
         # Validate API key is configured
-        if not settings.openai_api_key:
+        if not _credentials_configured():
             raise ValueError("OpenAI API key not configured")
 
         tone_map = {
@@ -251,41 +1300,14 @@ E-mail recebido:
 \"\"\"{text}\"\"\""""
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.openai_api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": settings.model_name,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.3,
-                        "max_tokens": 300,
-                    },
-                )
-
-                if response.status_code != 200:
-                    error_data = response.json() if response.content else {}
-                    error_msg = error_data.get("error", {}).get(
-                        "message", "Unknown error"
-                    )
-                    logger.error(
-                        "OpenAI API error during reply generation",
-                        extra={
-                            "status_code": response.status_code,
-                            "error": error_msg,
-                            "response": error_data,
-                        },
-                    )
-                    raise Exception(
-                        f"OpenAI API error ({response.status_code}): {error_msg}"
-                    )
-
-                data = response.json()
-                content = _validate_openai_response(data)
-                return content
+            data = await self._post_chat_completion(
+                prompt,
+                temperature=0.3,
+                max_tokens=300,
+                error_message="OpenAI API error during reply generation",
+            )
+            content = _validate_openai_response(data)
+            return content
 
         except Exception:
             logger.error("OpenAI reply generation error", exc_info=True)
@@ -294,7 +1316,7 @@ E-mail recebido:
     async def _refine_reply_openai(self, reply: str, tone: str) -> str:
         """Refine reply using OpenAI"""
         # Validate API key is configured
-        if not settings.openai_api_key:
+        if not _credentials_configured():
             raise ValueError("OpenAI API key not configured")
 
         prompt = f"""Tarefa: Reescrever mantendo o mesmo sentido, ajustando o tom para {tone} e deixando mais conciso.
@@ -303,62 +1325,78 @@ Texto atual:
 Responda apenas com o corpo revisado."""
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.openai_api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": settings.model_name,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.3,
-                        "max_tokens": 300,
-                    },
-                )
-
-                if response.status_code != 200:
-                    error_data = response.json() if response.content else {}
-                    error_msg = error_data.get("error", {}).get(
-                        "message", "Unknown error"
-                    )
-                    logger.error(
-                        "OpenAI API error during refinement",
-                        extra={
-                            "status_code": response.status_code,
-                            "error": error_msg,
-                            "response": error_data,
-                        },
-                    )
-                    raise Exception(
-                        f"OpenAI API error ({response.status_code}): {error_msg}"
-                    )
-
-                data = response.json()
-                content = _validate_openai_response(data)
-                return content
+            data = await self._post_chat_completion(
+                prompt,
+                temperature=0.3,
+                max_tokens=300,
+                error_message="OpenAI API error during refinement",
+            )
+            content = _validate_openai_response(data)
+            return content
 
         except Exception:
             logger.error("OpenAI reply refinement error", exc_info=True)
             raise
 
-    async def _classify_huggingface(self, text: str) -> Dict[str, Any]:
-        """HuggingFace classification - placeholder implementation"""
-        # This would implement HF API calls
-        # For now, fallback to heuristics
-        category, confidence, rationale = classify_heuristic(text)
+    def _get_local_model(self) -> NaiveBayesModel:
+        """The local classifier, memory-mapped from disk on first use"""
+        if self.local_model is None:
+            self.local_model = load_local_model(settings.local_model_path)
+            if self.local_model is None:
+                raise ValueError("Local model unavailable")
+        return self.local_model
+
+    def _classify_local_model(self, text: str) -> Dict[str, Any]:
+        """Offline classification with the local naive Bayes model"""
+        model = self._get_local_model()
+        result = model.classify(text)
+        result["meta"] = {
+            "model": MODEL_NAME,
+            "model_version": model.version,
+            "cost": 0.0,
+            "fallback": False,
+            "tier": "local",
+        }
+        return result
+
+    def _get_feedback_learner(self) -> FeedbackLearner:
+        if self.feedback is None:
+            self.feedback = FeedbackLearner(
+                self._get_local_model(),
+                model_path=Path(settings.local_model_path or DEFAULT_MODEL_PATH),
+                log_path=Path(
+                    settings.feedback_log_path or DATA_DIR / "feedback.jsonl"
+                ),
+                snapshot_every=settings.feedback_snapshot_every,
+            )
+        return self.feedback
+
+    async def record_feedback(
+        self,
+        text: str,
+        category: str,
+        predicted: Optional[str] = None,
+        user: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Store a user correction and train the local model on it; due
+        snapshots are published by swapping self.local_model, which
+        concurrent classifications read without locking
+        """
+        learner = self._get_feedback_learner()
+        if await learner.record(text, category, predicted, user):
+            self.local_model = await learner.publish()
         return {
-            "category": category,
-            "confidence": confidence,
-            "rationale": rationale,
-            "meta": {
-                "model": "heuristic_fallback",
-                "cost": 0.0,
-                "fallback": True,
-            },
+            "stored": True,
+            "model_version": self.local_model.version,
+            "corrections": learner.corrections,
+            "pending": learner.pending,
         }
 
+    async def _classify_huggingface(self, text: str) -> Dict[str, Any]:
+        """HuggingFace classification - served by the offline local model"""
+        return self._classify_local_model(text)
+
     async def _generate_reply_huggingface(
         self, text: str, category: str, tone: str
     ) -> str:
@@ -369,6 +1407,41 @@ Responda apenas com o corpo revisado."""
         """Refine reply using HuggingFace"""
         return reply
 
+    async def stream_reply(
+        self, text: str, category: str, tone: str
+    ) -> AsyncIterator[str]:
+        """
+        Stream the reply as it is generated, chunk by chunk.
+
+        Falls back to the template reply when the upstream fails before
+        the first token; a failure mid-stream ends the stream early.
+        """
+        if (
+            not _routes_upstream()
+            or not _credentials_configured()
+            or overload_controller.at_least(CLASSIFY_ONLY)
+        ):
+            yield self._generate_reply_fallback(category, tone)
+            return
+
+        prompt = prompt_optimizer.build_reply_prompt(
+            text, category, tone, *_token_budget("reply")
+        )
+        emitted = False
+        try:
+            async for chunk in self._stream_chat_completion(
+                prompt.text,
+                temperature=0.3,
+                max_tokens=prompt.max_tokens,
+                error_message="OpenAI API error during reply streaming",
+            ):
+                emitted = True
+                yield chunk
+        except Exception as e:
+            logger.error("Reply streaming failed", error=str(e), emitted=emitted)
+            if not emitted:
+                yield self._generate_reply_fallback(category, tone)
+
     def _generate_reply_fallback(self, category: str, tone: str) -> str:
         """Fallback reply generation"""
         if category == "Produtivo":
@@ -409,10 +1482,20 @@ Responda apenas com o corpo revisado."""
                     "e muito apreciada.\n\nSaudações,\nEquipe"
                 )
 
-    def _estimate_cost(self, usage: Dict) -> float:
-        """Estimate API call cost"""
+    def _estimate_cost(
+        self, usage: Dict, prompt: str = "", completion: str = ""
+    ) -> float:
+        """
+        Estimate API call cost; without upstream usage, from the offline
+        token estimates of prompt and completion
+        """
         if not usage:
-            return 0.0
+            if not prompt and not completion:
+                return 0.0
+            usage = {
+                "prompt_tokens": estimate_tokens(prompt),
+                "completion_tokens": estimate_tokens(completion),
+            }
 
         # Rough estimation for GPT-4o-mini (example rates)
         input_tokens = usage.get("prompt_tokens", 0)
@@ -439,30 +1522,13 @@ Responda apenas com o corpo revisado."""
         score = 0.0
 
         # Check for clear keywords
-        produtivo_keywords = [
-            "problema",
-            "erro",
-            "ajuda",
-            "suporte",
-            "acesso",
-            "protocolo",
-            "chamado",
-        ]
-        improdutivo_keywords = [
-            "obrigado",
-            "parabéns",
-            "feliz",
-            "agradecimento",
-        ]
-
-        text_lower = text.lower()
-        if any(kw in text_lower for kw in produtivo_keywords):
-            score += confidence_factors["clear_keywords"]
-        elif any(kw in text_lower for kw in improdutivo_keywords):
+        document = analyze(text)
+        hits = document.hits
+        if hits.any(CLEAR_PRODUCTIVE) or hits.any(CLEAR_IMPRODUTIVE):
             score += confidence_factors["clear_keywords"]
 
         # Text length factor (medium length texts are more reliable)
-        word_count = len(text.split())
+        word_count = document.word_count
         if 10 <= word_count <= 100:
             score += confidence_factors["text_length"]
 
@@ -476,120 +1542,69 @@ Responda apenas com o corpo revisado."""
 
         return min(1.0, score)
 
-    async def _classify_openai_with_prompt(self, prompt: str) -> Dict[str, Any]:
+    async def _classify_openai_with_prompt(
+        self, prompt: str, max_tokens: int = 150
+    ) -> Dict[str, Any]:
         """
         OpenAI classification with custom prompt
         """
         # Validate API key is configured
-        if not settings.openai_api_key:
+        if not _credentials_configured():
             raise ValueError("OpenAI API key not configured")
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.openai_api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": settings.model_name,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.1,
-                        "max_tokens": 150,
-                    },
+            data = await self._post_chat_completion(
+                prompt,
+                temperature=0.1,
+                max_tokens=max_tokens,
+            )
+            content = _validate_openai_response(data)
+
+            try:
+                result = _safe_json_loads(content)
+                result["meta"] = {
+                    "model": settings.model_name,
+                    "cost": self._estimate_cost(data.get("usage", {}), prompt, content),
+                    "fallback": False,
+                    "tokens": _token_counts(data, prompt, content),
+                }
+                return result
+            except Exception as json_error:
+                logger.warning(
+                    "Failed to parse OpenAI JSON response",
+                    extra={"raw_content": content, "error": str(json_error)},
                 )
-
-                if response.status_code != 200:
-                    error_data = response.json() if response.content else {}
-                    error_msg = error_data.get("error", {}).get(
-                        "message", "Unknown error"
-                    )
-                    logger.error(
-                        "OpenAI API error",
-                        extra={
-                            "status_code": response.status_code,
-                            "error": error_msg,
-                            "response": error_data,
-                        },
-                    )
-                    raise Exception(
-                        f"OpenAI API error ({response.status_code}): {error_msg}"
-                    )
-
-                data = response.json()
-                content = _validate_openai_response(data)
-
-                try:
-                    result = _safe_json_loads(content)
-                    result["meta"] = {
+                return {
+                    "category": "Produtivo",
+                    "rationale": PARSE_ERROR_RATIONALE,
+                    "meta": {
                         "model": settings.model_name,
-                        "cost": self._estimate_cost(data.get("usage", {})),
-                        "fallback": False,
-                    }
-                    return result
-                except Exception as json_error:
-                    logger.warning(
-                        "Failed to parse OpenAI JSON response",
-                        extra={"raw_content": content, "error": str(json_error)},
-                    )
-                    return {
-                        "category": "Produtivo",
-                        "rationale": "Erro na resposta da IA",
-                        "meta": {
-                            "model": settings.model_name,
-                            "fallback": True,
-                        },
-                    }
+                        "fallback": True,
+                    },
+                }
 
         except Exception:
             logger.error("OpenAI classification error", exc_info=True)
             raise
 
-    async def _generate_reply_openai_with_prompt(self, prompt: str) -> str:
+    async def _generate_reply_openai_with_prompt(
+        self, prompt: str, max_tokens: int = 300
+    ) -> str:
         """
         Generate reply using OpenAI with custom prompt
         """
         # Validate API key is configured
-        if not settings.openai_api_key:
+        if not _credentials_configured():
             raise ValueError("OpenAI API key not configured")
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {settings.openai_api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": settings.model_name,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "temperature": 0.3,
-                        "max_tokens": 300,
-                    },
-                )
-
-                if response.status_code != 200:
-                    error_data = response.json() if response.content else {}
-                    error_msg = error_data.get("error", {}).get(
-                        "message", "Unknown error"
-                    )
-                    logger.error(
-                        "OpenAI API error",
-                        extra={
-                            "status_code": response.status_code,
-                            "error": error_msg,
-                            "response": error_data,
-                        },
-                    )
-                    raise Exception(
-                        f"OpenAI API error ({response.status_code}): {error_msg}"
-                    )
-
-                data = response.json()
-                content = _validate_openai_response(data)
-                return content
+            data = await self._post_chat_completion(
+                prompt,
+                temperature=0.3,
+                max_tokens=max_tokens,
+            )
+            content = _validate_openai_response(data)
+            return content
 
         except Exception:
             logger.error("OpenAI reply generation error", exc_info=True)
@@ -598,3 +1613,4 @@ Responda apenas com o corpo revisado."""
 
 # Global AI provider instance
 ai_provider = AIProvider()
+overload_controller.queue_time_source = ai_provider.upstream_queue_ms
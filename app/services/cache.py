@@ -0,0 +1,121 @@
+"""
+In-process LRU+TTL cache for classification results
+Keys are content hashes of the canonicalized email text plus a version
+string, so changing the prompts or the model invalidates old entries
+"""
+
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def canonicalize_text(text: str) -> str:
+    """Canonical form used for cache keys (case and whitespace insensitive)"""
+    return " ".join(text.split()).casefold()
+
+
+def make_cache_key(text: str, version: str) -> str:
+    """Content-addressed key: sha256 of version + canonical text"""
+    digest = hashlib.sha256()
+    digest.update(version.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(canonicalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class _CacheEntry:
+    value: Dict[str, Any]
+    size: int
+    expires_at: float
+
+
+class ClassificationCache:
+    """LRU cache with TTL and limits on entry count and total bytes"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached value, or None on miss/expiry"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(entry.value)
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a copy of value, evicting least recently used entries"""
+        size = len(key) + len(json.dumps(value, default=str))
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+
+        self._entries[key] = _CacheEntry(
+            value=copy.deepcopy(value),
+            size=size,
+            expires_at=time.monotonic() + self.ttl_seconds,
+        )
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def clear(self) -> int:
+        """Flush all entries, returning how many were removed"""
+        removed = len(self._entries)
+        self._entries.clear()
+        self._bytes = 0
+        logger.info("Classification cache flushed", removed=removed)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
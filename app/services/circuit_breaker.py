@@ -0,0 +1,149 @@
+"""
+Circuit breaker for upstream AI endpoints
+Trips on error rate or slow-call rate over a rolling time window so that
+callers fail fast (and fall back) instead of waiting for timeouts
+"""
+
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Closed -> open when the rolling window has enough calls and either the
+    error rate or the slow-call rate reaches its threshold. Open -> half-open
+    after open_seconds; half-open admits a few probes and closes again only
+    when all of them succeed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 30.0,
+        min_requests: int = 10,
+        error_rate_threshold: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        slow_call_rate_threshold: float = 0.5,
+        open_seconds: float = 30.0,
+        half_open_probes: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.error_rate_threshold = error_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._clock = clock
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        # (timestamp, succeeded, slow)
+        self._window: Deque[Tuple[float, bool, bool]] = deque()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Admit a call, or reject it (fast) while the circuit is open"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+            self._probes_in_flight += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, succeeded: Optional[bool], latency: float) -> None:
+        """
+        Record the outcome of an admitted call.
+        succeeded=None means the call was cancelled and is not judged.
+        """
+        if self._state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if succeeded is None:
+                return
+            if not succeeded or latency >= self.slow_call_seconds:
+                self._trip()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                self._transition(CLOSED)
+            return
+
+        if succeeded is None or self._state != CLOSED:
+            return
+
+        now = self._clock()
+        self._window.append((now, succeeded, latency >= self.slow_call_seconds))
+        self._evict(now)
+
+        total = len(self._window)
+        if total < self.min_requests:
+            return
+        failures = sum(1 for _, ok, _ in self._window if not ok)
+        slow = sum(1 for _, _, is_slow in self._window if is_slow)
+        if (
+            failures / total >= self.error_rate_threshold
+            or slow / total >= self.slow_call_rate_threshold
+        ):
+            self._trip()
+
+    def stats(self) -> Dict[str, Any]:
+        self._evict(self._clock())
+        total = len(self._window)
+        failures = sum(1 for _, ok, _ in self._window if not ok)
+        return {
+            "state": self.state,
+            "window_calls": total,
+            "window_error_rate": round(failures / total, 4) if total else 0.0,
+            "rejected": self.rejected,
+            "times_opened": self.times_opened,
+        }
+
+    def _trip(self) -> None:
+        self._opened_at = self._clock()
+        self.times_opened += 1
+        self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        logger.warning(
+            "Circuit breaker state change",
+            breaker=self.name,
+            previous=self._state,
+            state=state,
+        )
+        self._state = state
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        if state == CLOSED:
+            self._window.clear()
+
+    def _evict(self, now: float) -> None:
+        while self._window and now - self._window[0][0] > self.window_seconds:
+            self._window.popleft()
@@ -0,0 +1,165 @@
+"""
+Extractive compression of long emails
+Emails longer than the input limit are no longer rejected: their
+sentences are scored with vectorized features (classification keyword
+weight, novelty against earlier sentences, position, questions) and the
+best ones are kept, in their original order, until a character and
+optionally a token budget is filled.
+"""
+
+import re
+import textwrap
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from app.services.features import folded_words
+from app.services.keywords import (
+    HEURISTIC_IMPRODUTIVE,
+    HEURISTIC_PRODUCTIVE,
+    TECHNICAL,
+    URGENCY,
+    keyword_matcher,
+)
+from app.services.tokens import estimate_tokens, trim_to_tokens
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# Longer runs without punctuation are cut into chunks at word boundaries
+MAX_SENTENCE_CHARS = 300
+
+KEYWORD_WEIGHT = 0.45
+NOVELTY_WEIGHT = 0.3
+POSITION_WEIGHT = 0.15
+QUESTION_WEIGHT = 0.1
+
+
+@lru_cache(maxsize=1)
+def _keyword_weights() -> Dict[str, float]:
+    return keyword_matcher.word_weights(
+        [HEURISTIC_PRODUCTIVE, HEURISTIC_IMPRODUTIVE, TECHNICAL, URGENCY]
+    )
+
+
+@dataclass(frozen=True)
+class CompressedText:
+    """Sentences kept from a text and how much of it they cover"""
+
+    text: str
+    original_chars: int
+    sentences: int
+    kept_sentences: int
+
+    @property
+    def ratio(self) -> float:
+        if not self.original_chars:
+            return 1.0
+        return round(len(self.text) / self.original_chars, 4)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "original_chars": self.original_chars,
+            "compressed_chars": len(self.text),
+            "ratio": self.ratio,
+            "sentences": self.sentences,
+            "kept_sentences": self.kept_sentences,
+        }
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of text, none longer than MAX_SENTENCE_CHARS"""
+    sentences = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if len(sentence) <= MAX_SENTENCE_CHARS:
+            if sentence:
+                sentences.append(sentence)
+        else:
+            sentences.extend(
+                textwrap.wrap(sentence, MAX_SENTENCE_CHARS, break_on_hyphens=False)
+            )
+    return sentences
+
+
+def score_sentences(
+    words: Sequence[Sequence[str]], questions: np.ndarray
+) -> np.ndarray:
+    """
+    Relevance of each sentence from its folded words: keyword weight per
+    sqrt(word), share of words not seen in earlier sentences, closeness to
+    the opening (or, less, the closing) and whether it asks something.
+    Sentences whose words all appeared before score -inf
+    """
+    count = len(words)
+    lengths = np.fromiter((len(sentence) for sentence in words), np.int64, count)
+    ids: Dict[str, int] = {}
+    token_ids = np.fromiter(
+        (ids.setdefault(word, len(ids)) for sentence in words for word in sentence),
+        np.int64,
+        int(lengths.sum()),
+    )
+    owners = np.repeat(np.arange(count), lengths)
+    sizes = np.maximum(lengths, 1)
+
+    weights = _keyword_weights()
+    vocabulary = np.fromiter((weights.get(word, 0.0) for word in ids), float, len(ids))
+    keyword = np.bincount(owners, vocabulary[token_ids], count) / np.sqrt(sizes)
+    if keyword.max() > 0:
+        keyword /= keyword.max()
+
+    first_seen = np.zeros(len(token_ids))
+    first_seen[np.unique(token_ids, return_index=True)[1]] = 1.0
+    novelty = np.bincount(owners, first_seen, count) / sizes
+
+    index = np.arange(count)
+    position = np.maximum(1.0 / (1 + index), 0.5 / (count - index))
+
+    scores = (
+        KEYWORD_WEIGHT * keyword
+        + NOVELTY_WEIGHT * novelty
+        + POSITION_WEIGHT * position
+        + QUESTION_WEIGHT * questions
+    )
+    return np.where(novelty > 0, scores, -np.inf)
+
+
+def compress(
+    text: str, max_chars: int, max_tokens: Optional[int] = None
+) -> CompressedText:
+    """Best-scoring sentences of text, in order, within the budgets"""
+    sentences = split_sentences(text)
+    fits = len(text) <= max_chars and (
+        not max_tokens or estimate_tokens(text) <= max_tokens
+    )
+    if fits or not sentences:
+        return CompressedText(text, len(text), len(sentences), len(sentences))
+
+    scores = score_sentences(
+        [folded_words(sentence) for sentence in sentences],
+        np.fromiter((s.endswith("?") for s in sentences), float, len(sentences)),
+    )
+    kept = np.zeros(len(sentences), dtype=bool)
+    used_chars = -1
+    used_tokens = 0
+    for index in np.argsort(-scores, kind="stable"):
+        if np.isneginf(scores[index]):
+            break
+        sentence = sentences[index]
+        chars = used_chars + 1 + len(sentence)
+        if chars > max_chars:
+            continue
+        if max_tokens:
+            tokens = used_tokens + estimate_tokens(sentence)
+            if tokens > max_tokens:
+                continue
+            used_tokens = tokens
+        used_chars = chars
+        kept[index] = True
+
+    result = " ".join(sentences[index] for index in np.flatnonzero(kept))
+    if not result:
+        # Budget below one sentence: fall back to the opening
+        result = text[:max_chars].rstrip()
+        if max_tokens:
+            result = trim_to_tokens(result, max_tokens)
+    return CompressedText(result, len(text), len(sentences), int(kept.sum()))
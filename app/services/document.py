@@ -0,0 +1,91 @@
+"""
+Per-request document analysis propagated through contextvars
+preprocess_text analyzes the cleaned text once (folded tokens, keyword
+hits, question count) and publishes it like the request deadline; the
+heuristics, confidence scoring, prompt selection and response quality
+stages read it instead of lowercasing, splitting and scanning again.
+"""
+
+import re
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from app.services.features import folded_words
+from app.services.keywords import TECHNICAL, URGENCY, KeywordHits, keyword_matcher
+
+_WORDS = re.compile(r"[^\W_]+")
+
+_document: ContextVar[Optional["Document"]] = ContextVar(
+    "request_document", default=None
+)
+
+
+@dataclass(frozen=True)
+class Document:
+    """Single-pass analysis of a text, shared by every pipeline stage"""
+
+    text: str
+    tokens: Tuple[str, ...]
+    hits: KeywordHits
+    question_count: int
+    # Character accounting of preprocessing (reply-chain stripping)
+    preprocessing: Optional[Dict[str, Any]] = None
+
+    @classmethod
+    def from_text(
+        cls, text: str, preprocessing: Optional[Dict[str, Any]] = None
+    ) -> "Document":
+        tokens = tuple(folded_words(text)) if text else ()
+        return cls(
+            text=text,
+            tokens=tokens,
+            hits=keyword_matcher.match_words(tokens),
+            question_count=text.count("?"),
+            preprocessing=preprocessing,
+        )
+
+    @property
+    def word_count(self) -> int:
+        return len(self.tokens)
+
+    @property
+    def technical(self) -> bool:
+        return self.hits.any(TECHNICAL)
+
+    @property
+    def urgent(self) -> bool:
+        return self.hits.any(URGENCY)
+
+    @cached_property
+    def vocabulary(self) -> FrozenSet[str]:
+        return frozenset(self.tokens)
+
+    @cached_property
+    def spans(self) -> List[Tuple[int, int]]:
+        """(start, end) offsets of each word in text, computed on first use"""
+        return [match.span() for match in _WORDS.finditer(self.text)]
+
+
+def use_document(document: Document) -> Document:
+    """Publish document as the current request's analysis"""
+    _document.set(document)
+    return document
+
+
+def clear_document() -> None:
+    _document.set(None)
+
+
+def current_document(text: str) -> Optional[Document]:
+    """The current request's analysis if it covers text"""
+    current = _document.get()
+    if current is not None and (current.text is text or current.text == text):
+        return current
+    return None
+
+
+def analyze(text: str) -> Document:
+    """The current request's analysis when it covers text, else a new one"""
+    return current_document(text) or Document.from_text(text)
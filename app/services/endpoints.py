@@ -0,0 +1,231 @@
+"""
+Registry of OpenAI-compatible upstream endpoints
+Routes each call to a healthy endpoint, either in configured order
+(failover) or by lowest expected latency (EWMA x load), caps per-endpoint
+concurrency and lets callers fail over to the next candidate.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.services.circuit_breaker import CircuitOpenError
+
+PRIORITY = "priority"
+LATENCY = "latency"
+# settings.provider -> routing policy ("OpenAI" keeps its historical meaning)
+ROUTING_POLICIES = {"OpenAI": PRIORITY, "failover": PRIORITY, "latency": LATENCY}
+
+
+class NoEndpointAvailable(CircuitOpenError):
+    """Every endpoint is open or already tried"""
+
+
+class EndpointSaturated(Exception):
+    """Every endpoint left to try is at its concurrency cap (wait and retry)"""
+
+
+class Endpoint:
+    """One OpenAI-compatible server plus its live routing statistics"""
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        max_concurrency: int = 0,
+        alpha: float = 0.3,
+    ):
+        self.name = name
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.max_concurrency = max_concurrency  # 0 = no per-endpoint cap
+        self.alpha = alpha
+        self.ewma: Optional[float] = None  # seconds, successful calls only
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.failed_at = 0.0
+        # Called when a call finishes, freeing a concurrency slot
+        self.on_release: Optional[Callable[[], None]] = None
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url.rstrip('/')}/chat/completions"
+
+    def has_capacity(self) -> bool:
+        return not self.max_concurrency or self.in_flight < self.max_concurrency
+
+    def recently_failed(self, cooldown: float) -> bool:
+        """Last call failed less than cooldown seconds ago"""
+        return (
+            self.consecutive_failures > 0
+            and time.monotonic() - self.failed_at < cooldown
+        )
+
+    def expected_latency(self) -> float:
+        """
+        EWMA latency scaled by current load; 0 for an endpoint never
+        measured, so every endpoint gets explored once
+        """
+        if self.ewma is None:
+            return 0.0
+        return self.ewma * (self.in_flight + 1)
+
+    def prepare(
+        self, headers: Dict[str, str], payload: Dict[str, Any]
+    ) -> Tuple[Dict[str, str], Dict[str, Any]]:
+        """Request headers and payload with this endpoint's own key and model"""
+        if self.api_key:
+            headers = {**headers, "Authorization": f"Bearer {self.api_key}"}
+        if self.model:
+            payload = {**payload, "model": self.model}
+        return headers, payload
+
+    def start(self) -> None:
+        self.in_flight += 1
+
+    def finish(self, succeeded: Optional[bool], latency: float) -> None:
+        """Record one call; None (cancelled) only frees the slot"""
+        self.in_flight = max(0, self.in_flight - 1)
+        if self.on_release is not None:
+            self.on_release()
+        if succeeded is None:
+            return
+        self.requests += 1
+        if not succeeded:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.failed_at = time.monotonic()
+            return
+        self.consecutive_failures = 0
+        if self.ewma is None:
+            self.ewma = latency
+        else:
+            self.ewma += self.alpha * (latency - self.ewma)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "ewma_ms": None if self.ewma is None else round(self.ewma * 1000, 1),
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class EndpointRegistry:
+    """Configured endpoints and the routing decision among them"""
+
+    def __init__(self, alpha: float = 0.3, failure_cooldown: float = 30.0):
+        self.alpha = alpha
+        # Seconds a failed endpoint waits behind healthy ones before it is
+        # tried first again
+        self.failure_cooldown = failure_cooldown
+        self._endpoints: Dict[str, Endpoint] = {}
+        self._specs: Optional[List[Dict[str, Any]]] = None
+        self._capacity_waiters: List[asyncio.Future] = []
+        self.failovers = 0
+        self.saturated_waits = 0
+
+    @property
+    def endpoints(self) -> List[Endpoint]:
+        return list(self._endpoints.values())
+
+    def configure(self, specs: Sequence[Dict[str, Any]]) -> None:
+        """
+        (Re)load endpoint specs; cheap when unchanged. Endpoints that keep
+        their name and base URL keep their statistics.
+        """
+        if specs == self._specs:
+            return
+        endpoints: Dict[str, Endpoint] = {}
+        for index, spec in enumerate(specs):
+            name = spec.get("name") or f"endpoint{index}"
+            endpoint = self._endpoints.get(name)
+            if endpoint is None or endpoint.base_url != spec["base_url"]:
+                endpoint = Endpoint(name, spec["base_url"], alpha=self.alpha)
+                endpoint.on_release = self._wake_capacity_waiters
+            endpoint.api_key = spec.get("api_key")
+            endpoint.model = spec.get("model")
+            endpoint.max_concurrency = int(spec.get("max_concurrency") or 0)
+            endpoints[name] = endpoint
+        self._endpoints = endpoints
+        self._specs = [dict(spec) for spec in specs]
+
+    def candidates(
+        self,
+        policy: str,
+        is_open: Callable[[Endpoint], bool] = lambda endpoint: False,
+        exclude: Sequence[Endpoint] = (),
+    ) -> List[Endpoint]:
+        """
+        Usable endpoints, best first. Endpoints whose last call failed
+        within failure_cooldown go after the healthy ones; among equals the
+        policy decides: configured order (priority) or lowest expected
+        latency (latency).
+        """
+        usable = [
+            endpoint
+            for endpoint in self._endpoints.values()
+            if endpoint not in exclude
+            and endpoint.has_capacity()
+            and not is_open(endpoint)
+        ]
+        cooldown = self.failure_cooldown
+        if policy == LATENCY:
+            return sorted(
+                usable,
+                key=lambda e: (e.recently_failed(cooldown), e.expected_latency()),
+            )
+        return sorted(usable, key=lambda e: e.recently_failed(cooldown))
+
+    def choose(
+        self,
+        policy: str,
+        is_open: Callable[[Endpoint], bool] = lambda endpoint: False,
+        exclude: Sequence[Endpoint] = (),
+    ) -> Endpoint:
+        candidates = self.candidates(policy, is_open, exclude)
+        if candidates:
+            return candidates[0]
+        if any(
+            endpoint not in exclude and not is_open(endpoint)
+            for endpoint in self._endpoints.values()
+        ):
+            raise EndpointSaturated("Every upstream endpoint is at its cap")
+        raise NoEndpointAvailable("No upstream endpoint available")
+
+    async def wait_for_capacity(self, timeout: float) -> bool:
+        """Wait until some endpoint frees a slot; False after timeout"""
+        self.saturated_waits += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._capacity_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=max(0.0, timeout))
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if waiter in self._capacity_waiters:
+                self._capacity_waiters.remove(waiter)
+
+    def _wake_capacity_waiters(self) -> None:
+        waiters, self._capacity_waiters = self._capacity_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "failovers": self.failovers,
+            "saturated_waits": self.saturated_waits,
+            "endpoints": {
+                endpoint.name: endpoint.stats() for endpoint in self._endpoints.values()
+            },
+        }
@@ -0,0 +1,142 @@
+"""
+Few-shot example bank
+Labeled emails indexed as TF-IDF vectors over hashed n-grams. The matrix
+is precomputed at load time over the buckets the bank actually uses, so
+picking the most similar examples for a request is one small dense
+mat-vec plus a partial sort.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.logger import get_logger
+from app.services.features import hashed_counts
+from app.services.tokens import estimate_tokens
+
+logger = get_logger(__name__)
+
+DEFAULT_BANK_PATH = Path(__file__).resolve().parent.parent / "data" / "examples.jsonl"
+
+
+@dataclass
+class Example:
+    text: str
+    category: str
+    rationale: str
+    tokens: int = 0  # estimated tokens of the rendered example
+
+
+def render_example(example: Example) -> str:
+    """One few-shot example in the classification prompt format"""
+    answer = json.dumps(
+        {"category": example.category, "rationale": example.rationale},
+        ensure_ascii=False,
+    )
+    return f'Email: "{example.text}"\nClassificação: {answer}\n\n'
+
+
+class ExampleBank:
+    """Labeled examples and their precomputed TF-IDF matrix"""
+
+    def __init__(self, examples: Sequence[Dict[str, Any]]):
+        self.examples = [
+            Example(e["text"], e["category"], e.get("rationale", "")) for e in examples
+        ]
+        for example in self.examples:
+            example.tokens = estimate_tokens(render_example(example))
+        self.version = hashlib.sha256(
+            json.dumps(list(examples), sort_keys=True).encode("utf-8")
+        ).hexdigest()[:12]
+
+        rows = [hashed_counts(example.text) for example in self.examples]
+        # Columns are only the hash buckets used somewhere in the bank
+        self.vocabulary = np.unique(
+            np.concatenate([indices for indices, _ in rows] or [np.empty(0, np.int64)])
+        )
+        n = len(self.examples)
+        document_frequency = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for indices, _ in rows:
+            document_frequency[np.searchsorted(self.vocabulary, indices)] += 1
+        self.idf = np.log((1 + n) / (1 + document_frequency)) + 1
+        # Terms never seen in the bank weigh like the rarest ones
+        self.unseen_idf = float(np.log(1 + n) + 1)
+
+        self.matrix = np.zeros((n, len(self.vocabulary)), dtype=np.float32)
+        for row, (indices, counts) in enumerate(rows):
+            columns = np.searchsorted(self.vocabulary, indices)
+            self.matrix[row, columns] = (1 + np.log(counts)) * self.idf[columns]
+        norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        self.matrix /= np.where(norms == 0, 1, norms)
+
+    def __len__(self) -> int:
+        return len(self.examples)
+
+    @classmethod
+    def from_file(cls, path: Path) -> "ExampleBank":
+        with open(path, encoding="utf-8") as handle:
+            return cls([json.loads(line) for line in handle if line.strip()])
+
+    def similarities(self, text: str) -> np.ndarray:
+        """Cosine similarity of text to every example"""
+        indices, counts = hashed_counts(text)
+        if not len(indices) or not len(self.vocabulary):
+            return np.zeros(len(self), dtype=np.float32)
+        columns = np.searchsorted(self.vocabulary, indices)
+        columns = np.minimum(columns, len(self.vocabulary) - 1)
+        known = self.vocabulary[columns] == indices
+        weights = 1 + np.log(counts)
+        idf = np.where(known, self.idf[columns], self.unseen_idf)
+        weights = weights * idf
+        norm = np.linalg.norm(weights)
+        return self.matrix[:, columns[known]] @ (weights[known] / norm)
+
+    def search(self, text: str, k: int) -> List[Tuple[int, float]]:
+        """Indices and similarities of the k most similar examples"""
+        scores = self.similarities(text)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top]
+
+    def select(
+        self,
+        text: str,
+        k: int,
+        token_budget: int,
+        min_similarity: float = 0.0,
+    ) -> List[Example]:
+        """
+        Up to k most similar examples above min_similarity whose rendered
+        size fits in token_budget, most similar first
+        """
+        selected: List[Example] = []
+        used = 0
+        for index, score in self.search(text, 2 * k):
+            if len(selected) == k or score < min_similarity:
+                break
+            example = self.examples[index]
+            if used + example.tokens <= token_budget:
+                selected.append(example)
+                used += example.tokens
+        return selected
+
+
+def load_example_bank(path: Optional[str] = None) -> Optional[ExampleBank]:
+    """The configured bank, or None when its file is missing or invalid"""
+    bank_path = Path(path) if path else DEFAULT_BANK_PATH
+    try:
+        bank = ExampleBank.from_file(bank_path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(
+            "Few-shot example bank unavailable", path=str(bank_path), error=str(e)
+        )
+        return None
+    logger.info("Few-shot example bank loaded", path=str(bank_path), examples=len(bank))
+    return bank
@@ -0,0 +1,165 @@
+"""
+User feedback and online learning
+Corrections sent to /api/feedback are appended to a JSONL log (the
+{"text", "category"} format scripts/train_local_model.py reads) and folded
+into a private working copy of the local naive Bayes model in O(tokens).
+Every few corrections the working copy is frozen into a snapshot, saved
+atomically and published by swapping a single reference, so classifiers
+never take a lock and always read a complete model.
+"""
+
+import asyncio
+import json
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from app.core.logger import get_logger
+from app.services.local_model import NaiveBayesModel
+
+logger = get_logger(__name__)
+
+# Tiers that answer without calling the LLM
+LOCAL_TIERS = ("heuristic", "local")
+
+
+class FeedbackLearner:
+    """Online naive Bayes updates from corrections, published as snapshots"""
+
+    def __init__(
+        self,
+        model: NaiveBayesModel,
+        model_path: Optional[Path] = None,
+        log_path: Optional[Path] = None,
+        snapshot_every: int = 10,
+    ):
+        self.published = model
+        self.model_path = model_path
+        self.log_path = log_path
+        self.snapshot_every = max(1, snapshot_every)
+        self._working = model.copy()
+        self._publish_lock = asyncio.Lock()
+        # Keeps concurrent corrections from interleaving lines in the log
+        self._log_lock = asyncio.Lock()
+        self.pending = 0
+        self.corrections = 0
+        self.disagreements = 0
+        self.snapshots = 0
+        self.last_snapshot_at: Optional[float] = None
+
+    async def record(
+        self,
+        text: str,
+        category: str,
+        predicted: Optional[str] = None,
+        user: Optional[str] = None,
+    ) -> bool:
+        """
+        Log a correction and learn from it; True when enough corrections
+        are pending that a new snapshot should be published
+        """
+        if category not in self._working.classes:
+            raise ValueError(f"Unknown category: {category}")
+        if self.log_path is not None:
+            entry = {
+                "text": text,
+                "category": category,
+                "predicted": predicted,
+                "user": user,
+                "timestamp": datetime.utcnow().isoformat(),
+            }
+            async with self._log_lock:
+                await asyncio.to_thread(self._append_log, entry)
+        self._working.partial_fit([text], [category])
+        self.corrections += 1
+        if predicted is not None and predicted != category:
+            self.disagreements += 1
+        self.pending += 1
+        return self.pending >= self.snapshot_every
+
+    def _append_log(self, entry: Dict[str, Any]) -> None:
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as handle:
+            handle.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    async def publish(self) -> NaiveBayesModel:
+        """Freeze, persist and publish the working model"""
+        async with self._publish_lock:
+            snapshot = self._working.copy()
+            snapshot.version = snapshot.fingerprint()
+            self.pending = 0
+            if self.model_path is not None:
+                await asyncio.to_thread(snapshot.save, self.model_path)
+            self.published = snapshot
+            self.snapshots += 1
+            self.last_snapshot_at = time.time()
+        logger.info(
+            "Local model snapshot published",
+            version=snapshot.version,
+            documents=snapshot.documents,
+            corrections=self.corrections,
+        )
+        return snapshot
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "corrections": self.corrections,
+            "disagreements": self.disagreements,
+            "pending": self.pending,
+            "snapshots": self.snapshots,
+            "model_version": self.published.version,
+            "documents": self.published.documents,
+            "last_snapshot_at": self.last_snapshot_at,
+        }
+
+
+class LocalShareTracker:
+    """
+    Share of classifications answered without the LLM (heuristic or local
+    model tiers, over those plus the LLM tier) in fixed time buckets, to
+    show the trend as feedback teaches the local model
+    """
+
+    def __init__(self, bucket_seconds: float = 3600, buckets: int = 24):
+        self.bucket_seconds = bucket_seconds
+        # [bucket start, local, llm]
+        self._buckets: Deque[List[float]] = deque(maxlen=buckets)
+        self.local = 0
+        self.llm = 0
+
+    def record(self, tier: str, now: Optional[float] = None) -> None:
+        if tier in LOCAL_TIERS:
+            column = 1
+            self.local += 1
+        elif tier == "llm":
+            column = 2
+            self.llm += 1
+        else:
+            return
+        now = time.time() if now is None else now
+        start = now - now % self.bucket_seconds
+        if not self._buckets or self._buckets[-1][0] != start:
+            self._buckets.append([start, 0, 0])
+        self._buckets[-1][column] += 1
+
+    @staticmethod
+    def _share(local: float, llm: float) -> Optional[float]:
+        total = local + llm
+        return round(local / total, 4) if total else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "share": self._share(self.local, self.llm),
+            "local": self.local,
+            "llm": self.llm,
+            "series": [
+                {
+                    "start": datetime.utcfromtimestamp(start).isoformat(),
+                    "requests": int(local + llm),
+                    "share": self._share(local, llm),
+                }
+                for start, local, llm in self._buckets
+            ],
+        }
@@ -0,0 +1,95 @@
+"""
+Request hedging for upstream AI calls
+When the first attempt is slower than a tracked latency percentile, a
+second identical request is sent and the first answer wins. A budget
+caps hedges to a share of recent traffic.
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+
+class LatencyTracker:
+    """Rolling sample of recent successful upstream latencies (seconds)"""
+
+    def __init__(self, size: int = 500):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Nearest-rank percentile, q in (0, 1]; None without samples"""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))
+        return ordered[index]
+
+
+class HedgePolicy:
+    """Decides when to hedge and enforces the hedge budget"""
+
+    def __init__(
+        self,
+        percentile: float = 0.9,
+        min_samples: int = 20,
+        min_delay: float = 0.05,
+        max_ratio: float = 0.1,
+        budget_window: int = 1000,
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.budget_window = budget_window
+        self.tracker = LatencyTracker()
+        # Primary count at which each recent hedge was granted, so that
+        # concurrent hedges are each counted against the window
+        self._hedged_at: Deque[int] = deque()
+        self.primaries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+    def hedge_delay(self) -> Optional[float]:
+        """Delay before hedging, or None until enough latency samples exist"""
+        if len(self.tracker) < self.min_samples:
+            return None
+        return max(self.min_delay, self.tracker.percentile(self.percentile))
+
+    def record_primary(self) -> None:
+        self.primaries += 1
+
+    def try_acquire(self) -> bool:
+        """Take a hedge from the budget (share of recent primary requests)"""
+        window = min(self.primaries, self.budget_window)
+        while self._hedged_at and self._hedged_at[0] <= self.primaries - window:
+            self._hedged_at.popleft()
+        if len(self._hedged_at) + 1 > self.max_ratio * window:
+            self.budget_denied += 1
+            return False
+        self._hedged_at.append(self.primaries)
+        self.hedges += 1
+        return True
+
+    def record_winner(self, hedge_won: bool) -> None:
+        if hedge_won:
+            self.hedge_wins += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "primaries": self.primaries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "budget_denied": self.budget_denied,
+            "hedge_delay_ms": (
+                round(self.hedge_delay() * 1000, 1)
+                if self.hedge_delay() is not None
+                else None
+            ),
+            "latency_samples": len(self.tracker),
+        }
@@ -1,6 +1,12 @@
 from typing import Tuple
 
 from app.core.logger import get_logger
+from app.services.document import analyze
+from app.services.keywords import (
+    CONFIDENCE,
+    HEURISTIC_IMPRODUTIVE,
+    HEURISTIC_PRODUCTIVE,
+)
 
 logger = get_logger(__name__)
 
@@ -13,95 +19,11 @@ def classify_heuristic(text: str) -> Tuple[str, float, str]:
     if not text or len(text.strip()) < 10:
         return "Improdutivo", 0.5, "Texto muito curto para análise"
 
-    text_lower = text.lower()
-
-    # High-weight productive terms
-    high_weight_terms = [
-        "suporte",
-        "chamado",
-        "ticket",
-        "protocolo",
-        "erro",
-        "bug",
-        "problema",
-        "falha",
-        "urgente",
-        "bloqueio",
-        "travado",
-        "status",
-        "situação",
-        "andamento",
-        "prazo",
-        "vencimento",
-        "fatura",
-        "cobrança",
-        "pagamento",
-        "débito",
-        "crédito",
-        "acesso",
-        "senha",
-        "login",
-        "usuário",
-        "permissão",
-        "sistema",
-        "plataforma",
-        "funcionalidade",
-        "recurso",
-    ]
-
-    # Medium-weight productive terms
-    medium_weight_terms = [
-        "dúvida",
-        "pergunta",
-        "informação",
-        "esclarecimento",
-        "solicitação",
-        "pedido",
-        "requisição",
-        "configuração",
-        "instalação",
-        "atualização",
-        "versão",
-        "compatibility",
-    ]
-
-    # Low-weight terms (slightly productive)
-    low_weight_terms = [
-        "questão",
-        "assunto",
-        "tópico",
-        "sobre",
-        "referente",
-        "preciso",
-        "necessário",
-        "importante",
-        "ajuda",
-    ]
-
-    # Improdutive indicators
-    improdutive_terms = [
-        "parabéns",
-        "felicitações",
-        "agradecimento",
-        "obrigado",
-        "obrigada",
-        "gratidão",
-        "sucesso",
-        "feliz",
-        "satisfeito",
-        "excelente",
-        "ótimo",
-        "bom trabalho",
-        "bem feito",
-    ]
-
-    # Calculate scores
-    high_score = sum(3 for term in high_weight_terms if term in text_lower)
-    medium_score = sum(2 for term in medium_weight_terms if term in text_lower)
-    low_score = sum(1 for term in low_weight_terms if term in text_lower)
-    improdutive_score = sum(2 for term in improdutive_terms if term in text_lower)
-
-    productive_score = high_score + medium_score + low_score
+    hits = analyze(text).hits
+    improdutive_score = hits.weight(HEURISTIC_IMPRODUTIVE)
+
+    # High (3), medium (2) and low (1) weight productive terms
+    productive_score = hits.weight(HEURISTIC_PRODUCTIVE)
 
     # Text length bonus (longer texts are more likely to be productive)
     length_bonus = min(len(text) // 200, 2)
@@ -141,20 +63,7 @@ def get_classification_confidence(category: str, text: str) -> float:
     length_factor = min(len(text) / 1000, 0.2)
 
     # Keywords density
-    keywords_found = len(
-        [
-            term
-            for term in [
-                "suporte",
-                "problema",
-                "erro",
-                "ajuda",
-                "dúvida",
-                "status",
-            ]
-            if term in text.lower()
-        ]
-    )
+    keywords_found = analyze(text).hits.count(CONFIDENCE)
     keyword_factor = min(keywords_found * 0.1, 0.3)
 
     return min(base_confidence + length_factor + keyword_factor, 0.9)
@@ -0,0 +1,264 @@
+"""
+Shared keyword matcher
+Every keyword list used by the heuristics, NLP helpers, confidence scoring
+and prompt selection lives here and is compiled once into a single table
+of accent- and case-folded word forms (singular and plural). A scan
+tokenizes the text once and finds the hits of every lexicon with set
+lookups, so cost is O(words) instead of O(terms x length), and only whole
+words match ("que" no longer matches "queixa").
+"""
+
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Sequence, Tuple
+
+from app.services.features import folded_words
+
+HEURISTIC_PRODUCTIVE = "heuristic_productive"
+HEURISTIC_IMPRODUTIVE = "heuristic_improdutive"
+CONFIDENCE = "confidence"
+PRODUCTIVE = "productive"
+PORTUGUESE = "portuguese"
+CLEAR_PRODUCTIVE = "clear_productive"
+CLEAR_IMPRODUTIVE = "clear_improdutive"
+TECHNICAL = "technical"
+URGENCY = "urgency"
+NEXT_STEPS = "next_steps"
+INFORMAL = "informal"
+
+
+def _weighted(weight: float, terms: Iterable[str]) -> Dict[str, float]:
+    return dict.fromkeys(terms, weight)
+
+
+LEXICONS: Dict[str, Dict[str, float]] = {
+    # classify_heuristic: high (3), medium (2) and low (1) weight terms
+    HEURISTIC_PRODUCTIVE: {
+        **_weighted(
+            3,
+            [
+                "suporte",
+                "chamado",
+                "ticket",
+                "protocolo",
+                "erro",
+                "bug",
+                "problema",
+                "falha",
+                "urgente",
+                "bloqueio",
+                "travado",
+                "status",
+                "situação",
+                "andamento",
+                "prazo",
+                "vencimento",
+                "fatura",
+                "cobrança",
+                "pagamento",
+                "débito",
+                "crédito",
+                "acesso",
+                "senha",
+                "login",
+                "usuário",
+                "permissão",
+                "sistema",
+                "plataforma",
+                "funcionalidade",
+                "recurso",
+            ],
+        ),
+        **_weighted(
+            2,
+            [
+                "dúvida",
+                "pergunta",
+                "informação",
+                "esclarecimento",
+                "solicitação",
+                "pedido",
+                "requisição",
+                "configuração",
+                "instalação",
+                "atualização",
+                "versão",
+                "compatibility",
+            ],
+        ),
+        **_weighted(
+            1,
+            [
+                "questão",
+                "assunto",
+                "tópico",
+                "sobre",
+                "referente",
+                "preciso",
+                "necessário",
+                "importante",
+                "ajuda",
+            ],
+        ),
+    },
+    HEURISTIC_IMPRODUTIVE: _weighted(
+        2,
+        [
+            "parabéns",
+            "felicitações",
+            "agradecimento",
+            "obrigado",
+            "obrigada",
+            "gratidão",
+            "sucesso",
+            "feliz",
+            "satisfeito",
+            "excelente",
+            "ótimo",
+            "bom trabalho",
+            "bem feito",
+        ],
+    ),
+    # get_classification_confidence
+    CONFIDENCE: _weighted(
+        1, ["suporte", "problema", "erro", "ajuda", "dúvida", "status"]
+    ),
+    # extract_keywords
+    PRODUCTIVE: _weighted(
+        1,
+        [
+            "suporte",
+            "status",
+            "chamado",
+            "erro",
+            "problema",
+            "bug",
+            "protocolo",
+            "ticket",
+            "urgente",
+            "bloqueio",
+            "acesso",
+            "fatura",
+            "cobrança",
+            "pagamento",
+            "prazo",
+            "vencimento",
+            "sistema",
+            "funcionalidade",
+            "recurso",
+            "configuração",
+            "dúvida",
+            "informação",
+            "esclarecimento",
+            "solicitação",
+        ],
+    ),
+    # detect_language
+    PORTUGUESE: _weighted(1, ["que", "para", "com", "não", "por", "uma", "seu", "sua"]),
+    # AIProvider._calculate_confidence
+    CLEAR_PRODUCTIVE: _weighted(
+        1,
+        ["problema", "erro", "ajuda", "suporte", "acesso", "protocolo", "chamado"],
+    ),
+    CLEAR_IMPRODUTIVE: _weighted(1, ["obrigado", "parabéns", "feliz", "agradecimento"]),
+    # PromptOptimizer.should_use_enhanced_prompt
+    TECHNICAL: _weighted(1, ["protocolo", "chamado", "ticket"]),
+    URGENCY: _weighted(1, ["urgente", "crítico", "imediato"]),
+    # PromptOptimizer.analyze_response_quality
+    NEXT_STEPS: _weighted(1, ["será", "prazo", "retorno"]),
+    INFORMAL: _weighted(1, ["tchau", "beijo", "xoxo"]),
+}
+
+
+def word_forms(term: str) -> List[str]:
+    """Folded singular and plural forms of a term (inflecting its last word)"""
+    folded = " ".join(folded_words(term))
+    forms = [folded, folded + "s", folded + "es"]
+    if folded.endswith("cao"):
+        forms.append(folded[:-3] + "coes")
+    return forms
+
+
+@dataclass(frozen=True)
+class KeywordHits:
+    """Terms found per lexicon (in lexicon order) and their summed weights"""
+
+    # Shared by every stage through the Document cache: treat as read-only
+    matches: Mapping[str, Tuple[str, ...]]
+    weights: Mapping[str, float]
+
+    def terms(self, lexicon: str) -> List[str]:
+        return list(self.matches.get(lexicon, ()))
+
+    def count(self, lexicon: str) -> int:
+        return len(self.matches.get(lexicon, ()))
+
+    def weight(self, lexicon: str) -> float:
+        return self.weights.get(lexicon, 0)
+
+    def any(self, lexicon: str) -> bool:
+        return lexicon in self.matches
+
+
+class KeywordMatcher:
+    """Whole-word, accent-insensitive matcher over several weighted lexicons"""
+
+    def __init__(self, lexicons: Mapping[str, Mapping[str, float]]):
+        self.lexicons = {name: dict(terms) for name, terms in lexicons.items()}
+        # folded form -> [(lexicon, position in lexicon, term, weight)]
+        self._forms: Dict[str, List[Tuple[str, int, str, float]]] = {}
+        for name, terms in self.lexicons.items():
+            for position, (term, weight) in enumerate(terms.items()):
+                for form in word_forms(term):
+                    entries = self._forms.setdefault(form, [])
+                    if (name, position, term, weight) not in entries:
+                        entries.append((name, position, term, weight))
+        self._words: FrozenSet[str] = frozenset(
+            form for form in self._forms if " " not in form
+        )
+        self._phrases: FrozenSet[str] = frozenset(
+            form for form in self._forms if " " in form
+        )
+        # Only texts holding the first word of some phrase pay for the
+        # phrase search
+        self._phrase_starts: FrozenSet[str] = frozenset(
+            phrase.split(" ", 1)[0] for phrase in self._phrases
+        )
+
+    def word_weights(self, lexicons: Iterable[str]) -> Dict[str, float]:
+        """Summed weight of each single-word form over the given lexicons"""
+        names = set(lexicons)
+        weights: Dict[str, float] = {}
+        for form in self._words:
+            weight = sum(entry[3] for entry in self._forms[form] if entry[0] in names)
+            if weight:
+                weights[form] = weight
+        return weights
+
+    def match(self, text: str) -> KeywordHits:
+        """All hits of every lexicon in one pass over the words of text"""
+        return self.match_words(folded_words(text))
+
+    def match_words(self, words: Sequence[str]) -> KeywordHits:
+        """All hits of every lexicon among already folded words"""
+        if not words:
+            return KeywordHits({}, {})
+        found = set(self._words.intersection(words))
+        if not self._phrase_starts.isdisjoint(words):
+            joined = f" {' '.join(words)} "
+            found.update(phrase for phrase in self._phrases if f" {phrase} " in joined)
+
+        hits: Dict[str, Dict[int, Tuple[str, float]]] = {}
+        for form in found:
+            for name, position, term, weight in self._forms[form]:
+                hits.setdefault(name, {})[position] = (term, weight)
+        matches = {}
+        weights = {}
+        for name, terms in hits.items():
+            ordered = [terms[position] for position in sorted(terms)]
+            matches[name] = tuple(term for term, _ in ordered)
+            weights[name] = sum(weight for _, weight in ordered)
+        return KeywordHits(matches, weights)
+
+
+# Instância global, compilada uma vez na importação
+keyword_matcher = KeywordMatcher(LEXICONS)
@@ -0,0 +1,286 @@
+"""
+Local naive Bayes classifier
+Multinomial naive Bayes over the hashed n-gram features: no network and no
+model download. The model is just per-class term counts, a (classes x
+buckets) float32 array saved as .npy (memory-mapped when loaded) plus a
+small JSON header, trained by scripts/train_local_model.py and updated
+online from user feedback in O(tokens). Prediction gathers
+log-likelihoods only for the buckets present, so classifying a batch is a
+handful of vectorized NumPy operations.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.logger import get_logger
+from app.services.examples import DEFAULT_BANK_PATH
+from app.services.features import DEFAULT_DIM, hashed_terms, ngrams, term_buckets
+
+logger = get_logger(__name__)
+
+MODEL_FORMAT = 1
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+DEFAULT_MODEL_PATH = DATA_DIR / "local_model"
+# Labeled training corpus (also used when no trained model file exists)
+DEFAULT_CORPUS_PATHS = (DATA_DIR / "corpus.jsonl", DEFAULT_BANK_PATH)
+CLASSES = ("Produtivo", "Improdutivo")
+MODEL_NAME = "local_nb"
+
+
+def header_file(path: Path) -> Path:
+    """JSON header of a model saved at path; it names the counts file"""
+    return Path(path).with_suffix(".json")
+
+
+def _write_atomically(path: Path, write) -> None:
+    """Write through a temporary file in the same directory, then rename"""
+    temporary = path.with_name(f".{path.name}.tmp")
+    with open(temporary, "wb") as handle:
+        write(handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(temporary, path)
+
+
+def read_corpus(*paths: Path) -> Tuple[List[str], List[str]]:
+    """Texts and categories of JSONL corpora ({"text", "category"} per line)"""
+    texts, labels = [], []
+    for path in paths:
+        with open(path, encoding="utf-8") as handle:
+            for line in handle:
+                if line.strip():
+                    record = json.loads(line)
+                    texts.append(record["text"])
+                    labels.append(record["category"])
+    return texts, labels
+
+
+class NaiveBayesModel:
+    """Multinomial naive Bayes with Lidstone smoothing over hashed n-grams"""
+
+    def __init__(
+        self,
+        feature_counts: np.ndarray,
+        class_counts: Sequence[float],
+        classes: Sequence[str] = CLASSES,
+        alpha: float = 0.1,
+        max_n: int = 2,
+        version: str = "",
+    ):
+        self.classes = list(classes)
+        # (classes, dim); read-only when memory-mapped from disk
+        self.feature_counts = feature_counts
+        self.class_counts = np.asarray(class_counts, dtype=np.float64)
+        self.alpha = alpha
+        self.max_n = max_n
+        self.dim = feature_counts.shape[1]
+        self.version = version
+        self._totals = feature_counts.sum(axis=1, dtype=np.float64)
+
+    @classmethod
+    def train(
+        cls,
+        texts: Sequence[str],
+        labels: Sequence[str],
+        classes: Sequence[str] = CLASSES,
+        dim: int = DEFAULT_DIM,
+        alpha: float = 0.1,
+        max_n: int = 2,
+    ) -> "NaiveBayesModel":
+        classes = list(classes)
+        label_ids = np.array([classes.index(label) for label in labels], np.int64)
+        rows, buckets = hashed_terms(texts, dim, max_n)
+        term_labels = label_ids[rows]
+        feature_counts = np.zeros((len(classes), dim), dtype=np.float32)
+        for c in range(len(classes)):
+            feature_counts[c] = np.bincount(buckets[term_labels == c], minlength=dim)
+        class_counts = np.bincount(label_ids, minlength=len(classes))
+        model = cls(feature_counts, class_counts, classes, alpha, max_n)
+        model.version = model.fingerprint()
+        return model
+
+    def fingerprint(self) -> str:
+        digest = hashlib.sha256(np.ascontiguousarray(self.feature_counts).tobytes())
+        digest.update(self.class_counts.tobytes())
+        return digest.hexdigest()[:12]
+
+    def copy(self) -> "NaiveBayesModel":
+        """Writable in-memory copy (e.g. of a memory-mapped model)"""
+        return type(self)(
+            np.array(self.feature_counts, dtype=np.float32),
+            self.class_counts.copy(),
+            self.classes,
+            self.alpha,
+            self.max_n,
+            self.version,
+        )
+
+    def partial_fit(self, texts: Sequence[str], labels: Sequence[str]) -> None:
+        """
+        Add labeled texts to the counts in place, in O(terms); the model
+        must be writable (see copy). The version is left for the caller
+        to refresh, since fingerprinting reads the whole matrix.
+        """
+        if not self.feature_counts.flags.writeable:
+            raise ValueError("Read-only (memory-mapped) model: update a copy()")
+        rows, buckets = hashed_terms(texts, self.dim, self.max_n)
+        label_ids = np.array([self.classes.index(label) for label in labels])
+        term_labels = label_ids[rows]
+        for c in np.unique(label_ids):
+            class_buckets = buckets[term_labels == c]
+            np.add.at(self.feature_counts[c], class_buckets, 1)
+            self._totals[c] += len(class_buckets)
+            self.class_counts[c] += np.count_nonzero(label_ids == c)
+
+    @property
+    def documents(self) -> int:
+        return int(self.class_counts.sum())
+
+    def _log_prior(self) -> np.ndarray:
+        counts = self.class_counts + 1
+        return np.log(counts / counts.sum())
+
+    def _log_likelihood(self, buckets: np.ndarray) -> np.ndarray:
+        """log P(term | class) of the given buckets, shape (classes, terms)"""
+        counts = np.asarray(self.feature_counts[:, buckets], dtype=np.float64)
+        denominators = self._totals + self.alpha * self.dim
+        return np.log(counts + self.alpha) - np.log(denominators)[:, None]
+
+    def joint_log_likelihood(self, texts: Sequence[str]) -> np.ndarray:
+        """Unnormalized log posteriors, shape (texts, classes)"""
+        rows, buckets = hashed_terms(texts, self.dim, self.max_n)
+        weights = self._log_likelihood(buckets)
+        scores = np.empty((len(texts), len(self.classes)))
+        for c in range(len(self.classes)):
+            scores[:, c] = np.bincount(rows, weights=weights[c], minlength=len(texts))
+        return scores + self._log_prior()
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        scores = self.joint_log_likelihood(texts)
+        scores -= scores.max(axis=1, keepdims=True)
+        probabilities = np.exp(scores)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def predict(self, texts: Sequence[str]) -> List[str]:
+        if not texts:
+            return []
+        best = self.joint_log_likelihood(texts).argmax(axis=1)
+        return [self.classes[i] for i in best]
+
+    def indicative_terms(self, text: str, category: str, k: int = 3) -> List[str]:
+        """Words of text that most favour category over the other classes"""
+        words = list(dict.fromkeys(ngrams(text, max_n=1)))
+        # Skip stems and short function words (a, de, to)
+        words = [word for word in words if len(word) > 2 and not word.startswith("~")]
+        if not words:
+            return []
+        weights = self._log_likelihood(term_buckets(words, self.dim))
+        target = self.classes.index(category)
+        others = np.delete(weights, target, axis=0).max(axis=0)
+        margin = weights[target] - others
+        top = np.argsort(-margin, kind="stable")[:k]
+        return [words[i] for i in top if margin[i] > 0]
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        """Category, confidence and rationale of one email"""
+        probabilities = self.predict_proba([text])[0]
+        best = int(probabilities.argmax())
+        category = self.classes[best]
+        terms = self.indicative_terms(text, category)
+        if terms:
+            rationale = "Modelo local (naive Bayes): termos indicativos " + ", ".join(
+                f"'{term}'" for term in terms
+            )
+        else:
+            rationale = "Modelo local (naive Bayes): sem termos indicativos"
+        return {
+            "category": category,
+            "confidence": round(min(float(probabilities[best]), 0.99), 3),
+            "rationale": rationale,
+        }
+
+    def save(self, path: Path) -> Path:
+        """
+        Persist atomically: the counts go to a new file named after the
+        version, then the header pointing at it replaces the old header in
+        one rename, so a reader or a crash never pairs mismatched files.
+        Returns the counts file.
+        """
+        header_path = header_file(path)
+        header_path.parent.mkdir(parents=True, exist_ok=True)
+        version = self.version or self.fingerprint()
+        counts_path = header_path.with_name(f"{header_path.stem}-{version}.npy")
+        counts = np.ascontiguousarray(self.feature_counts, np.float32)
+        _write_atomically(counts_path, lambda handle: np.save(handle, counts))
+        header = {
+            "format": MODEL_FORMAT,
+            "counts": counts_path.name,
+            "classes": self.classes,
+            "class_counts": self.class_counts.tolist(),
+            "alpha": self.alpha,
+            "max_n": self.max_n,
+            "dim": self.dim,
+            "version": version,
+        }
+        _write_atomically(
+            header_path,
+            lambda handle: handle.write(json.dumps(header, indent=2).encode("utf-8")),
+        )
+        # Older snapshots are unreachable now (open memory maps stay valid)
+        for stale in header_path.parent.glob(f"{header_path.stem}-*.npy"):
+            if stale != counts_path:
+                stale.unlink(missing_ok=True)
+        return counts_path
+
+    @classmethod
+    def load(cls, path: Path, mmap: bool = True) -> "NaiveBayesModel":
+        header_path = header_file(path)
+        header = json.loads(header_path.read_text(encoding="utf-8"))
+        if header.get("format") != MODEL_FORMAT:
+            raise ValueError(f"Unsupported local model format: {header.get('format')}")
+        counts_path = header_path.with_name(header["counts"])
+        feature_counts = np.load(counts_path, mmap_mode="r" if mmap else None)
+        if feature_counts.shape != (len(header["classes"]), header["dim"]):
+            raise ValueError("Local model counts do not match its header")
+        return cls(
+            feature_counts,
+            header["class_counts"],
+            header["classes"],
+            header["alpha"],
+            header["max_n"],
+            header["version"],
+        )
+
+
+def load_local_model(path: Optional[str] = None) -> Optional[NaiveBayesModel]:
+    """
+    The trained model at path (memory-mapped); without a model file, one
+    trained in memory on the bundled corpus. None if neither is usable.
+    """
+    model_path = Path(path) if path else DEFAULT_MODEL_PATH
+    try:
+        model = NaiveBayesModel.load(model_path)
+        logger.info(
+            "Local model loaded",
+            path=str(model_path),
+            version=model.version,
+            documents=model.documents,
+        )
+        return model
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(
+            "Local model file unavailable, training on the bundled corpus",
+            path=str(model_path),
+            error=str(e),
+        )
+    try:
+        model = NaiveBayesModel.train(*read_corpus(*DEFAULT_CORPUS_PATHS))
+    except (OSError, ValueError, KeyError) as e:
+        logger.error("Local model unavailable", error=str(e))
+        return None
+    return model
@@ -0,0 +1,201 @@
+"""
+Near-duplicate classification reuse
+Templated mail (notifications that differ only in ticket numbers, names
+or dates) never hits the exact cache. Recent classifications are indexed
+by a MinHash signature of their words and word bigrams (digits masked)
+and looked up with banded LSH: only entries sharing a whole band of the
+signature are compared, and a match needs an estimated Jaccard
+similarity of at least the configured threshold.
+"""
+
+import copy
+import re
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.logger import get_logger
+from app.services.features import fold
+
+logger = get_logger(__name__)
+
+NUM_PERMUTATIONS = 64
+# 16 bands of 4 rows: pairs at Jaccard 0.8 become candidates with
+# probability 1 - (1 - 0.8**4)**16 > 0.9998, pairs at 0.3 with ~0.12
+ROWS_PER_BAND = 4
+# Reject candidates whose length differs too much despite a close signature
+MIN_LENGTH_RATIO = 0.75
+
+_DIGITS = re.compile(r"\d+")
+_WORDS = re.compile(r"[^\W_]+")
+
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer over uint64 values"""
+    x = values + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+# Permutations x -> a*x + b (mod 2**32), a odd, one row per permutation
+_SEEDS = _mix64(np.arange(1, 2 * NUM_PERMUTATIONS + 1, dtype=np.uint64))
+_A = ((_SEEDS[:NUM_PERMUTATIONS] >> np.uint64(32)).astype(np.uint32) | 1)[:, None]
+_B = (_SEEDS[NUM_PERMUTATIONS:] >> np.uint64(32)).astype(np.uint32)[:, None]
+
+
+def minhash(text: str) -> Tuple[np.ndarray, int]:
+    """MinHash signature of text's words and word bigrams, and their count"""
+    words = _WORDS.findall(fold(_DIGITS.sub("0", text)))
+    if not words:
+        return np.zeros(NUM_PERMUTATIONS, dtype=np.uint32), 0
+    # crc32 (as in features.py) keeps signatures stable across processes;
+    # unigrams are spread over 64 bits before being combined into bigrams
+    unigrams = _mix64(
+        np.fromiter(
+            (zlib.crc32(word.encode("utf-8")) for word in words),
+            dtype=np.uint64,
+            count=len(words),
+        )
+    )
+    bigrams = _mix64(unigrams[:-1] ^ (unigrams[1:] << np.uint64(1)))
+    shingles = np.concatenate([unigrams, bigrams]) >> np.uint64(32)
+    shingles = shingles.astype(np.uint32)
+    return (shingles * _A + _B).min(axis=1), len(shingles)
+
+
+@dataclass
+class _Entry:
+    signature: np.ndarray
+    terms: int
+    value: Dict[str, Any]
+    version: str
+    created_at: float
+    expires_at: float
+
+
+class NearDuplicateIndex:
+    """MinHash LSH index of recent results, bounded by LRU and TTL"""
+
+    def __init__(
+        self,
+        min_similarity: float = 0.8,
+        max_entries: int = 5000,
+        ttl_seconds: float = 3600,
+        min_terms: int = 8,
+    ):
+        self.min_similarity = min_similarity
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.min_terms = min_terms
+        self.bands = NUM_PERMUTATIONS // ROWS_PER_BAND
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._tables: List[Dict[bytes, Set[str]]] = [{} for _ in range(self.bands)]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _band_keys(signature: np.ndarray) -> List[bytes]:
+        return [band.tobytes() for band in signature.reshape(-1, ROWS_PER_BAND)]
+
+    def add(self, key: str, text: str, value: Dict[str, Any], version: str) -> None:
+        """Index a copy of value under text's signature"""
+        if self.max_entries <= 0:
+            return
+        signature, terms = minhash(text)
+        if terms < self.min_terms:
+            return
+        if key in self._entries:
+            self._remove(key)
+        now = time.monotonic()
+        self._entries[key] = _Entry(
+            signature, terms, copy.deepcopy(value), version, now, now + self.ttl_seconds
+        )
+        for table, band in zip(self._tables, self._band_keys(signature)):
+            table.setdefault(band, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def lookup(
+        self, text: str, version: str
+    ) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        (copy of the most similar indexed result, provenance) at or above
+        the similarity threshold, or None
+        """
+        signature, terms = minhash(text)
+        best: Optional[Tuple[float, str]] = None
+        if terms >= self.min_terms:
+            candidates: Set[str] = set()
+            for table, band in zip(self._tables, self._band_keys(signature)):
+                candidates.update(table.get(band, ()))
+            now = time.monotonic()
+            for key in candidates:
+                entry = self._entries[key]
+                if entry.expires_at <= now:
+                    self._remove(key)
+                    self.expirations += 1
+                    continue
+                shorter, longer = sorted((terms, entry.terms))
+                if entry.version != version or shorter < MIN_LENGTH_RATIO * longer:
+                    continue
+                similarity = float(np.count_nonzero(signature == entry.signature))
+                similarity /= NUM_PERMUTATIONS
+                if similarity >= self.min_similarity and (
+                    best is None or similarity > best[0]
+                ):
+                    best = (similarity, key)
+
+        if best is None:
+            self.misses += 1
+            return None
+        similarity, key = best
+        entry = self._entries[key]
+        self._entries.move_to_end(key)
+        self.hits += 1
+        provenance = {
+            "source": key[:16],
+            "similarity": round(similarity, 4),
+            "age_seconds": round(time.monotonic() - entry.created_at, 1),
+        }
+        return copy.deepcopy(entry.value), provenance
+
+    def clear(self) -> int:
+        """Drop all entries, returning how many were removed"""
+        removed = len(self._entries)
+        self._entries.clear()
+        self._tables = [{} for _ in range(self.bands)]
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "min_similarity": self.min_similarity,
+            "bands": self.bands,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        for table, band in zip(self._tables, self._band_keys(entry.signature)):
+            keys = table.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del table[band]
@@ -1,61 +1,350 @@
 import re
-from typing import List
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
 
+from app.core import deadline
+from app.core.config import settings
 from app.core.logger import get_logger
+from app.services.compression import CompressedText, compress
+from app.services.document import Document, analyze, use_document
+from app.services.keywords import PORTUGUESE, PRODUCTIVE
 
 logger = get_logger(__name__)
 
 
-def clean_text(text: str) -> str:
-    """Clean and normalize text for processing"""
-    if not text:
-        return ""
+# Header lines (after stripping) and the footer mobile clients append
+_HEADER_PREFIXES = ("De:", "Para:", "Assunto:", "Data:")
+_MOBILE_FOOTER = "Enviado do meu"
+# Besides word characters and whitespace, preprocessing keeps .,!?-
+_KEPT_PUNCTUATION = frozenset(".,!?-_")
 
-    # Remove email headers (line by line)
-    lines = text.split("\n")
-    cleaned_lines = []
 
-    for line in lines:
+def _body(text: str) -> str:
+    """
+    Stripped lines up to the signature separator ("--"), minus header
+    lines, joined by spaces and cut at the mobile footer
+    """
+    kept = []
+    for line in text.split("\n"):
         line = line.strip()
-        # Skip header lines
-        if (
-            line.startswith("De:")
-            or line.startswith("Para:")
-            or line.startswith("Assunto:")
-            or line.startswith("Data:")
-        ):
+        if line.startswith(_HEADER_PREFIXES):
             continue
-        # Skip signature separator but stop processing after it
-        if re.match(r"^--+\s*$", line):
+        if line.startswith("--") and not line.strip("-"):
+            break
+        kept.append(line)
+    body = " ".join(kept)
+    footer = body.find(_MOBILE_FOOTER)
+    return body if footer < 0 else body[:footer]
+
+
+@lru_cache(maxsize=4096)
+def _is_filtered(char: str) -> bool:
+    return not (char.isalnum() or char.isspace() or char in _KEPT_PUNCTUATION)
+
+
+def _filter_chars(text: str) -> str:
+    """Drop every char that is not a word char, whitespace or .,!?-"""
+    for char in set(text):
+        if _is_filtered(char):
+            text = text.replace(char, "")
+    return text
+
+
+# Reply chains: everything from the first marker on is an older message
+_REPLY_HEADER = re.compile(r"^(?:Em|On)\s.*\b(?:escreveu|wrote)\s*:$", re.IGNORECASE)
+_REPLY_HEADER_START = re.compile(r"^(?:Em|On)\s", re.IGNORECASE)
+_THREAD_SEPARATOR = re.compile(
+    r"^(?:-{2,}\s*(?:mensagem original|original message|forwarded message"
+    r"|mensagem encaminhada)\s*-*"
+    r"|_{10,}"
+    r"|(?:begin forwarded message|in[ií]cio da mensagem (?:encaminhada|reenviada)):?)$",
+    re.IGNORECASE,
+)
+# Outlook quotes the previous message under a From/Sent header block.
+# Date/Data is left out: a copied or forwarded header at the top of an
+# email has it too, and forwards with a separator are matched above
+_QUOTED_FROM = re.compile(r"^(?:de|from)\s*:", re.IGNORECASE)
+_QUOTED_SENT = re.compile(r"^(?:enviad[oa](?: em)?|sent)\s*:", re.IGNORECASE)
+_HEADER_FIELD = re.compile(r"^[^\W\d][\w -]{0,20}:(?:\s|$)")
+# Boilerplate: everything from the first marker on is dropped
+_MOBILE_SIGNATURE = re.compile(
+    r"^(?:enviad[oa] (?:do|de|pelo|a partir do) (?:meu|minha|o|a)\b"
+    r"|sent from (?:my|outlook|mail|yahoo)\b"
+    r"|(?:get|obter o|baixe o|baixar o) outlook (?:for|para)\b)",
+    re.IGNORECASE,
+)
+_LEGAL_LABEL = re.compile(
+    r"^(?:aviso legal|aviso de confidencialidade|confidentiality notice|"
+    r"legal notice|disclaimer)\b",
+    re.IGNORECASE,
+)
+_LEGAL_TEXT = re.compile(
+    r"^(?:(?:esta|essa) (?:mensagem|comunica[cç][aã]o|transmiss[aã]o)"
+    r"|(?:este|esse) (?:e-?mail|correio eletr[oô]nico)"
+    r"|this (?:message|e-?mail|communication|transmission)"
+    r"|(?:as|a) informa[cç](?:[oõ]es|[aã]o) (?:contidas?|presentes?) "
+    r"(?:nesta mensagem|neste e-?mail)"
+    r"|the information (?:contained )?in this (?:message|e-?mail))\b"
+    r".*(?:confidencia|confidential|sigilos|privilegiad|privileged|"
+    r"destinat[aá]rio|intended recipient)",
+    re.IGNORECASE,
+)
+_PRINT_FOOTER = re.compile(
+    r"^(?:antes de imprimir|pense no meio ambiente|"
+    r"please consider the environment|think before (?:you )?print)",
+    re.IGNORECASE,
+)
+
+_QUOTED = "quoted"
+_BOILERPLATE = "boilerplate"
+# A footer longer than this is body text that happens to match a marker
+_MAX_FOOTER_LINES = 8
+
+
+@dataclass(frozen=True)
+class ExtractedMessage:
+    """Newest message body of an email and the characters cut around it"""
+
+    text: str
+    original_chars: int
+    quoted_chars: int = 0
+    boilerplate_chars: int = 0
+
+    @property
+    def saved_chars(self) -> int:
+        return self.original_chars - len(self.text)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "original_chars": self.original_chars,
+            "kept_chars": len(self.text),
+            "saved_chars": self.saved_chars,
+            "quoted_chars": self.quoted_chars,
+            "boilerplate_chars": self.boilerplate_chars,
+        }
+
+
+def _cut_reason(lines: List[str], index: int, line: str) -> Optional[str]:
+    """Why the email's newest message ends at lines[index], if it does"""
+    if _REPLY_HEADER.match(line) or _THREAD_SEPARATOR.match(line):
+        return _QUOTED
+    # Gmail wraps long "Em <data>, <nome> <email> escreveu:" lines
+    if _REPLY_HEADER_START.match(line) and index + 1 < len(lines):
+        if _REPLY_HEADER.match(f"{line} {lines[index + 1].strip()}"):
+            return _QUOTED
+    if _QUOTED_FROM.match(line) and any(
+        _QUOTED_SENT.match(following.strip())
+        for following in lines[index + 1 : index + 4]
+    ):
+        return _QUOTED
+    if line.startswith("--") and not line.strip("-"):
+        return _BOILERPLATE
+    if (
+        _MOBILE_SIGNATURE.match(line)
+        or _LEGAL_LABEL.match(line)
+        or _LEGAL_TEXT.match(line)
+        or _PRINT_FOOTER.match(line)
+    ):
+        return _BOILERPLATE
+    return None
+
+
+def _quote_start(lines: List[str], index: int) -> int:
+    """First line from index on that opens the quoted thread"""
+    while index < len(lines):
+        line = lines[index].strip()
+        if line.startswith(">") or _cut_reason(lines, index, line) == _QUOTED:
             break
-        # Skip empty lines at the beginning
-        if not line and not cleaned_lines:
+        index += 1
+    return index
+
+
+def _is_footer(lines: List[str], index: int, end: int) -> bool:
+    """
+    Whether lines[index:end], which closes the newest message, is a footer:
+    short, and for legal or print notices set apart by a blank line
+    """
+    block = [line for line in lines[index:end] if line.strip()]
+    if len(block) > _MAX_FOOTER_LINES:
+        return False
+    line = lines[index].strip()
+    if _LEGAL_LABEL.match(line) or _LEGAL_TEXT.match(line) or _PRINT_FOOTER.match(line):
+        return index > 0 and not lines[index - 1].strip()
+    return True
+
+
+def extract_latest_message(text: str) -> ExtractedMessage:
+    """
+    Keep only the newest message of a reply chain: drop ">" quoted lines,
+    and cut at the first quote marker ("Em ... escreveu:", "On ... wrote:",
+    "-----Mensagem original-----", Outlook From/Sent blocks), mobile
+    signature or legal footer that follows some content. Footers are only
+    cut as a short trailing block. A forward with nothing written above
+    it keeps the forwarded message instead.
+    """
+    if not text:
+        return ExtractedMessage("", 0)
+    lines = text.split("\n")
+    kept: List[str] = []
+    has_content = False
+    removed = {_QUOTED: 0, _BOILERPLATE: 0}
+    index = 0
+    while index < len(lines):
+        raw = lines[index]
+        line = raw.strip()
+        if line.startswith(">"):
+            removed[_QUOTED] += len(raw) + 1
+            index += 1
+            continue
+        reason = _cut_reason(lines, index, line)
+        end = index
+        if reason == _BOILERPLATE and has_content:
+            # A signature or footer usually sits right above the quoted
+            # thread: account for each part separately
+            end = _quote_start(lines, index + 1)
+            if not _is_footer(lines, index, end):
+                reason = None
+        if reason is not None and has_content:
+            start, index = index, end
+            removed[reason] += sum(len(rest) + 1 for rest in lines[start:index])
+            removed[_QUOTED] += sum(len(rest) + 1 for rest in lines[index:])
+            break
+        if reason == _QUOTED:
+            # Forward without comment: drop the marker and its header block
+            # and treat the forwarded message as the body
+            index += 1
+            removed[_QUOTED] += len(raw) + 1
+            while index < len(lines) and _HEADER_FIELD.match(lines[index].strip()):
+                removed[_QUOTED] += len(lines[index]) + 1
+                index += 1
             continue
-        cleaned_lines.append(line)
+        kept.append(raw)
+        if line and not line.startswith(_HEADER_PREFIXES):
+            has_content = True
+        index += 1
+
+    if not has_content:
+        # Nothing but quotes or boilerplate: better the whole text than none
+        return ExtractedMessage(text, len(text))
+    # Each dropped line is counted with one newline, so the parts add up
+    return ExtractedMessage(
+        "\n".join(kept), len(text), removed[_QUOTED], removed[_BOILERPLATE]
+    )
+
+
+class PreprocessingStats:
+    """Characters cut from requests by reply-chain and boilerplate stripping"""
 
-    # Join lines and clean up
-    result = " ".join(cleaned_lines)
+    def __init__(self):
+        self.requests = 0
+        self.stripped = 0
+        self.original_chars = 0
+        self.kept_chars = 0
+        self.quoted_chars = 0
+        self.boilerplate_chars = 0
+        self.compressed = 0
+        self.compressed_original_chars = 0
+        self.compressed_chars = 0
 
-    # Remove other footers
-    result = re.sub(r"Enviado do meu.*$", "", result, flags=re.MULTILINE)
+    def record(self, message: ExtractedMessage) -> None:
+        self.requests += 1
+        self.stripped += message.saved_chars > 0
+        self.original_chars += message.original_chars
+        self.kept_chars += len(message.text)
+        self.quoted_chars += message.quoted_chars
+        self.boilerplate_chars += message.boilerplate_chars
 
-    # Normalize spaces
-    result = re.sub(r"\s+", " ", result)
+    def record_compression(self, compressed: CompressedText) -> None:
+        self.compressed += 1
+        self.compressed_original_chars += compressed.original_chars
+        self.compressed_chars += len(compressed.text)
 
-    return result.strip()
+    def stats(self) -> Dict[str, Any]:
+        saved = self.original_chars - self.kept_chars
+        return {
+            "requests": self.requests,
+            "stripped_requests": self.stripped,
+            "original_chars": self.original_chars,
+            "saved_chars": saved,
+            "quoted_chars": self.quoted_chars,
+            "boilerplate_chars": self.boilerplate_chars,
+            "saved_ratio": (
+                round(saved / self.original_chars, 4) if self.original_chars else 0.0
+            ),
+            "compressed_requests": self.compressed,
+            "compression_ratio": (
+                round(self.compressed_chars / self.compressed_original_chars, 4)
+                if self.compressed_original_chars
+                else 1.0
+            ),
+        }
+
+
+preprocessing_stats = PreprocessingStats()
+
+
+def clean_text(text: str) -> str:
+    """Clean and normalize text for processing"""
+    if not text:
+        return ""
+    # str.split() and re's \s agree on whitespace: this collapses runs
+    # and trims in one step
+    return " ".join(_body(text).split())
 
 
 def preprocess_text(text: str) -> str:
     """Full text preprocessing pipeline"""
-    try:
-        # Basic cleaning
-        cleaned = clean_text(text)
+    return preprocess_document(text).text
 
-        # Additional normalization
-        cleaned = re.sub(r"[^\w\s\.,\!\?\-]", "", cleaned)
-        cleaned = re.sub(r"\s+", " ", cleaned).strip()
 
+def preprocess_document(text: str) -> Document:
+    """
+    Keep the newest message of text, preprocess it, compress it to
+    max_input_chars when still longer and analyze the result once,
+    publishing the analysis for the later stages of the request
+    """
+    preprocessing = None
+    if settings.thread_stripping_enabled and text:
+        message = extract_latest_message(text)
+        preprocessing_stats.record(message)
+        preprocessing = message.stats()
+        text = message.text
+    text = normalize_text(text)
+    if settings.compression_enabled and len(text) > settings.max_input_chars:
+        compressed = compress(
+            text, settings.max_input_chars, settings.compression_max_tokens or None
+        )
+        preprocessing_stats.record_compression(compressed)
+        preprocessing = {**(preprocessing or {}), "compression": compressed.stats()}
         logger.info(
+            "Long email compressed",
+            original_chars=compressed.original_chars,
+            compressed_chars=len(compressed.text),
+            kept_sentences=compressed.kept_sentences,
+            sentences=compressed.sentences,
+        )
+        text = compressed.text
+    return use_document(Document.from_text(text, preprocessing))
+
+
+def normalize_text(text: str) -> str:
+    """clean_text plus character filtering, without the document analysis"""
+    try:
+        body = _body(text) if text else ""
+
+        # Out of budget: skip the extra pass, the caller will degrade anyway
+        if deadline.expired():
+            logger.warning(
+                "Preprocessing cut short by request deadline",
+                original_length=len(text),
+            )
+            return " ".join(body.split())
+
+        # Filtering keeps whitespace, so one collapse afterwards suffices
+        cleaned = " ".join(_filter_chars(body).split())
+
+        logger.debug(
             "Text preprocessed successfully",
             original_length=len(text),
             cleaned_length=len(cleaned),
@@ -72,42 +361,7 @@ def extract_keywords(text: str) -> List[str]:
     if not text:
         return []
 
-    # Define productive keywords with weights
-    productive_keywords = [
-        "suporte",
-        "status",
-        "chamado",
-        "erro",
-        "problema",
-        "bug",
-        "protocolo",
-        "ticket",
-        "urgente",
-        "bloqueio",
-        "acesso",
-        "fatura",
-        "cobrança",
-        "pagamento",
-        "prazo",
-        "vencimento",
-        "sistema",
-        "funcionalidade",
-        "recurso",
-        "configuração",
-        "dúvida",
-        "informação",
-        "esclarecimento",
-        "solicitação",
-    ]
-
-    text_lower = text.lower()
-    found_keywords = []
-
-    for keyword in productive_keywords:
-        if keyword in text_lower:
-            found_keywords.append(keyword)
-
-    return found_keywords
+    return analyze(text).hits.terms(PRODUCTIVE)
 
 
 def detect_language(text: str) -> str:
@@ -115,10 +369,7 @@ def detect_language(text: str) -> str:
     if not text:
         return "pt"
 
-    # Simple Portuguese indicators
-    pt_indicators = ["que", "para", "com", "não", "por", "uma", "seu", "sua"]
-    text_lower = text.lower()
-
-    count = sum(1 for indicator in pt_indicators if indicator in text_lower)
+    # Simple Portuguese indicators (whole words only)
+    count = analyze(text).hits.count(PORTUGUESE)
 
     return "pt" if count >= 2 else "unknown"
@@ -0,0 +1,185 @@
+"""
+Overload control and automatic degradation
+Watches event-loop lag, in-flight requests and upstream queue time and
+steps the service down (and back up, with hysteresis) through:
+full LLM -> LLM classification + template replies -> heuristics -> 503
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Sequence
+
+from app.core.config import settings
+from app.core.logger import get_logger
+
+logger = get_logger(__name__)
+
+FULL = "full"
+CLASSIFY_ONLY = "classify_only"
+HEURISTIC = "heuristic"
+SHED = "shed"
+MODES = (FULL, CLASSIFY_ONLY, HEURISTIC, SHED)
+
+
+def _level(value: float, thresholds: Sequence[float]) -> int:
+    """How many thresholds `value` reaches (0 = below all of them)"""
+    return sum(1 for threshold in thresholds if value >= threshold)
+
+
+class LoopLagMonitor:
+    """Measures event-loop lag as the oversleep of a periodic timer"""
+
+    def __init__(self, interval: float = 0.25, window: int = 8):
+        self.interval = interval
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def lag_ms(self) -> float:
+        """Worst lag over the last few ticks, in milliseconds"""
+        return max(self._samples, default=0.0) * 1000
+
+    def record(self, lag_seconds: float) -> None:
+        self._samples.append(max(0.0, lag_seconds))
+
+    def start(self, on_tick: Optional[Callable[[], Any]] = None) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run(on_tick))
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self, on_tick: Optional[Callable[[], Any]]) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.record(time.monotonic() - started - self.interval)
+            if on_tick is not None:
+                on_tick()
+
+
+class OverloadController:
+    """
+    Picks the service mode from load signals. Escalation is immediate;
+    recovery goes one mode at a time, only once every signal is below
+    recover_ratio of its threshold and the current mode has been held for
+    cooldown_seconds, so the mode does not flap around a threshold.
+    """
+
+    def __init__(
+        self,
+        loop_lag_ms: Sequence[float] = (100.0, 250.0, 500.0),
+        in_flight: Sequence[float] = (64, 128, 256),
+        queue_ms: Sequence[float] = (1000.0, 2500.0, 4000.0),
+        recover_ratio: float = 0.7,
+        cooldown_seconds: float = 10.0,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.thresholds = {
+            "loop_lag_ms": tuple(loop_lag_ms),
+            "in_flight": tuple(in_flight),
+            "queue_ms": tuple(queue_ms),
+        }
+        self.recover_ratio = recover_ratio
+        self.cooldown_seconds = cooldown_seconds
+        self.enabled = enabled
+        self._clock = clock
+        self._level = 0
+        self._changed_at = clock()
+        self.monitor = LoopLagMonitor()
+        self.queue_time_source: Callable[[], float] = lambda: 0.0
+        self.in_flight = 0
+        self.signals: Dict[str, float] = {
+            "loop_lag_ms": 0.0,
+            "in_flight": 0,
+            "queue_ms": 0.0,
+        }
+        self.transitions = 0
+        self.shed = 0
+
+    @property
+    def mode(self) -> str:
+        return MODES[self._level]
+
+    def at_least(self, mode: str) -> bool:
+        """True when the service is degraded to `mode` or further"""
+        return self._level >= MODES.index(mode)
+
+    def request_started(self) -> None:
+        self.in_flight += 1
+
+    def request_finished(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def evaluate(
+        self,
+        loop_lag_ms: Optional[float] = None,
+        in_flight: Optional[float] = None,
+        queue_ms: Optional[float] = None,
+    ) -> str:
+        """Update the mode from current signals (explicit values win)"""
+        if not self.enabled:
+            return self.mode
+        self.signals = {
+            "loop_lag_ms": self.monitor.lag_ms if loop_lag_ms is None else loop_lag_ms,
+            "in_flight": self.in_flight if in_flight is None else in_flight,
+            "queue_ms": self.queue_time_source() if queue_ms is None else queue_ms,
+        }
+        target = max(
+            _level(value, self.thresholds[name]) for name, value in self.signals.items()
+        )
+        recovered = max(
+            _level(value, [t * self.recover_ratio for t in self.thresholds[name]])
+            for name, value in self.signals.items()
+        )
+
+        now = self._clock()
+        if target > self._level:
+            self._set_level(target, now)
+        elif (
+            recovered < self._level and now - self._changed_at >= self.cooldown_seconds
+        ):
+            self._set_level(self._level - 1, now)
+        return self.mode
+
+    def record_shed(self) -> None:
+        self.shed += 1
+
+    def _set_level(self, level: int, now: float) -> None:
+        logger.warning(
+            "Service mode change",
+            previous=MODES[self._level],
+            mode=MODES[level],
+            **self.signals,
+        )
+        self._level = level
+        self._changed_at = now
+        self.transitions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "signals": {name: round(value, 1) for name, value in self.signals.items()},
+            "in_flight": self.in_flight,
+            "transitions": self.transitions,
+            "shed": self.shed,
+            "mode_seconds": round(self._clock() - self._changed_at, 1),
+        }
+
+
+overload_controller = OverloadController(
+    loop_lag_ms=settings.overload_loop_lag_ms,
+    in_flight=settings.overload_in_flight,
+    queue_ms=settings.overload_queue_ms,
+    recover_ratio=settings.overload_recover_ratio,
+    cooldown_seconds=settings.overload_cooldown_seconds,
+    enabled=settings.overload_control_enabled,
+)
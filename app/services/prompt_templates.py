@@ -3,6 +3,61 @@ Templates de prompts otimizados e sistema de few-shot learning
 Demonstra ajuste e melhoria da IA através de engenharia de prompts
 """
 
+import hashlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.document import analyze
+from app.services.examples import (
+    Example,
+    ExampleBank,
+    load_example_bank,
+    render_example,
+)
+from app.services.keywords import INFORMAL, NEXT_STEPS
+from app.services.tokens import estimate_tokens, trim_to_tokens
+
+# Estilo de saudação/encerramento por tom de resposta
+TONE_STYLES = {
+    "formal": {
+        "greeting": "Prezado(a)",
+        "closing": "Atenciosamente,\nEquipe de Atendimento",
+        "style": "linguagem formal e protocolar",
+    },
+    "neutro": {
+        "greeting": "Olá",
+        "closing": "Cordialmente,\nSuporte",
+        "style": "linguagem clara e direta",
+    },
+    "amigavel": {
+        "greeting": "Oi! 😊",
+        "closing": "Um abraço,\nTime de Suporte",
+        "style": "linguagem calorosa e próxima, com emojis apropriados",
+    },
+}
+
+
+@dataclass
+class BudgetedPrompt:
+    """Prompt pronto para envio, com estimativa de tokens e limite de saída"""
+
+    text: str
+    input_tokens: int
+    max_tokens: int
+    template: str
+    trimmed_chars: int = 0
+    examples: int = 0
+
+    def token_meta(self) -> Dict[str, Any]:
+        return {
+            "input_estimate": self.input_tokens,
+            "max_output": self.max_tokens,
+            "template": self.template,
+            "trimmed_chars": self.trimmed_chars,
+            "examples": self.examples,
+        }
+
 
 class PromptTemplates:
     """Classe para gerenciar templates de prompts otimizados"""
@@ -42,6 +97,29 @@ Classificação: {{"category": "Improdutivo", "rationale": "Mensagem social não
 AGORA CLASSIFIQUE:
 Email: \"\"\"{text}\"\"\"
 
+Responda APENAS em JSON válido seguindo o formato dos exemplos:
+{{"category":"Produtivo|Improdutivo","rationale":"<justificativa específica e objetiva>"}} """
+
+    @staticmethod
+    def get_classification_prompt_with_selected_examples(
+        text: str, examples: Sequence[Example]
+    ) -> str:
+        """
+        Prompt few-shot com exemplos escolhidos do banco por similaridade
+        com o email (mesma estrutura do prompt de exemplos fixos)
+        """
+        shots = "".join(render_example(example) for example in examples)
+        return f"""Tarefa: Classificar emails corporativos como "Produtivo" ou "Improdutivo".
+
+DEFINIÇÕES:
+- Produtivo: Requer ação/resposta (suporte técnico, dúvidas, problemas, solicitações, status, cobrança, acesso)
+- Improdutivo: Não requer ação imediata (agradecimentos, felicitações, mensagens sociais)
+
+EXEMPLOS SEMELHANTES:
+
+{shots}AGORA CLASSIFIQUE:
+Email: \"\"\"{text}\"\"\"
+
 Responda APENAS em JSON válido seguindo o formato dos exemplos:
 {{"category":"Produtivo|Improdutivo","rationale":"<justificativa específica e objetiva>"}} """
 
@@ -52,25 +130,7 @@ Responda APENAS em JSON válido seguindo o formato dos exemplos:
         """
         Prompt melhorado para geração de respostas com contexto empresarial
         """
-        tone_styles = {
-            "formal": {
-                "greeting": "Prezado(a)",
-                "closing": "Atenciosamente,\nEquipe de Atendimento",
-                "style": "linguagem formal e protocolar",
-            },
-            "neutro": {
-                "greeting": "Olá",
-                "closing": "Cordialmente,\nSuporte",
-                "style": "linguagem clara e direta",
-            },
-            "amigavel": {
-                "greeting": "Oi! 😊",
-                "closing": "Um abraço,\nTime de Suporte",
-                "style": "linguagem calorosa e próxima, com emojis apropriados",
-            },
-        }
-
-        style_config = tone_styles.get(tone, tone_styles["neutro"])
+        style_config = TONE_STYLES.get(tone, TONE_STYLES["neutro"])
 
         if category == "Produtivo":
             return f"""Contexto: Você é um especialista em atendimento ao cliente de uma empresa de tecnologia.
@@ -138,6 +198,34 @@ Mensagens como a sua motivam nosso trabalho diário. Agradecemos pela confiança
 AGORA RESPONDA AO EMAIL:
 \"\"\"{text}\"\"\""""
 
+    @staticmethod
+    def get_combined_classification_reply_prompt(text: str, tone: str) -> str:
+        """
+        Prompt único que classifica e gera a resposta na mesma chamada
+        Evita duas idas e voltas sequenciais ao modelo
+        """
+        style_config = TONE_STYLES.get(tone, TONE_STYLES["neutro"])
+
+        return f"""Tarefa: Classificar o email corporativo e redigir a resposta adequada.
+
+DEFINIÇÕES:
+- Produtivo: Requer ação/resposta (suporte técnico, dúvidas, problemas, solicitações, status, cobrança, acesso)
+- Improdutivo: Não requer ação imediata (agradecimentos, felicitações, mensagens sociais)
+
+INSTRUÇÕES PARA A RESPOSTA:
+- Tom: {style_config['style']}
+- Saudação: "{style_config['greeting']}"
+- Encerramento: "{style_config['closing']}"
+- Se Produtivo: reconheça o pedido, informe próximos passos, solicite dados faltantes (protocolo, detalhes) e prazo de 24h úteis; 4-6 linhas
+- Se Improdutivo: agradeça, valorize a mensagem e encerre cordialmente sem criar expectativas; 3-4 linhas
+- Não inclua disclaimers sobre IA
+
+EMAIL:
+\"\"\"{text}\"\"\"
+
+Responda APENAS em JSON válido:
+{{"category":"Produtivo|Improdutivo","rationale":"<justificativa específica e objetiva>","reply":"<corpo da resposta>"}}"""
+
     @staticmethod
     def get_refinement_prompt_advanced(reply: str, tone: str) -> str:
         """
@@ -193,25 +281,64 @@ Baseado nesta análise, classifique como Produtivo ou Improdutivo e justifique."
 class PromptOptimizer:
     """Sistema para otimização contínua de prompts baseado em feedback"""
 
-    def __init__(self):
+    def __init__(
+        self,
+        example_bank: Optional[ExampleBank] = None,
+        few_shot_k: int = 4,
+        few_shot_token_budget: int = 300,
+        few_shot_min_similarity: float = 0.05,
+    ):
         self.confidence_threshold = 0.7
         self.templates = PromptTemplates()
+        self.example_bank = example_bank
+        self.few_shot_k = few_shot_k
+        self.few_shot_token_budget = few_shot_token_budget
+        self.few_shot_min_similarity = few_shot_min_similarity
+        self.version = self._compute_version()
+
+    def _compute_version(self) -> str:
+        """
+        Impressão digital dos templates de classificação
+        Muda sempre que o texto dos prompts muda (usada em chaves de cache)
+        """
+        probe = "\x00probe\x00"
+        rendered = (
+            self.templates.get_classification_prompt_with_examples(probe)
+            + self._get_simple_classification_prompt(probe)
+            + self.templates.get_combined_classification_reply_prompt(probe, "")
+            + self.templates.get_classification_prompt_with_selected_examples(probe, [])
+        )
+        if self.example_bank is not None:
+            rendered += self.example_bank.version
+        return hashlib.sha256(rendered.encode("utf-8")).hexdigest()[:12]
+
+    def select_examples(self, text: str, input_budget: int) -> List[Example]:
+        """
+        Exemplos do banco mais parecidos com o email, dentro do orçamento de
+        few-shot e do que sobra do orçamento de entrada
+        """
+        if self.example_bank is None:
+            return []
+        base = estimate_tokens(
+            self.templates.get_classification_prompt_with_selected_examples(text, [])
+        )
+        budget = min(self.few_shot_token_budget, input_budget - base)
+        if budget <= 0:
+            return []
+        return self.example_bank.select(
+            text, self.few_shot_k, budget, self.few_shot_min_similarity
+        )
 
     def should_use_enhanced_prompt(self, text: str) -> bool:
         """
         Determina se deve usar prompt melhorado baseado na complexidade do texto
         """
+        document = analyze(text)
         complexity_indicators = [
-            len(text.split()) > 50,  # Texto longo
-            any(
-                word in text.lower()
-                # Termos técnicos
-                for word in ["protocolo", "chamado", "ticket"]
-            ),
-            text.count("?") > 1,  # Múltiplas perguntas
-            any(
-                word in text.lower() for word in ["urgente", "crítico", "imediato"]
-            ),  # Urgência
+            document.word_count > 50,  # Texto longo
+            document.technical,  # Termos técnicos
+            document.question_count > 1,  # Múltiplas perguntas
+            document.urgent,  # Urgência
         ]
 
         return sum(complexity_indicators) >= 2
@@ -223,14 +350,117 @@ class PromptOptimizer:
         if self.should_use_enhanced_prompt(text):
             return self.templates.get_classification_prompt_with_examples(text)
         else:
-            # Prompt simplificado para casos básicos
-            return f"""Classifique este email como "Produtivo" (requer ação) ou "Improdutivo" (não requer ação):
+            return self._get_simple_classification_prompt(text)
+
+    @staticmethod
+    def _get_simple_classification_prompt(text: str) -> str:
+        """Prompt simplificado para casos básicos"""
+        return f"""Classifique este email como "Produtivo" (requer ação) ou "Improdutivo" (não requer ação):
 
 "{text}"
 
 Responda em JSON: {{
                 "category":"Produtivo|Improdutivo","rationale":"motivo"}} """
 
+    def build_classification_prompt(
+        self, text: str, input_budget: int, max_tokens: int
+    ) -> BudgetedPrompt:
+        """
+        Prompt de classificação dentro do orçamento de tokens: com o banco de
+        exemplos, few-shot com os exemplos mais parecidos (quando houver);
+        sem ele, few-shot fixo quando o texto pede. Senão o simples (com o
+        email cortado se preciso)
+        """
+        templates = [("simple", self._get_simple_classification_prompt)]
+        examples: List[Example] = []
+        if self.example_bank is not None:
+            examples = self.select_examples(text, input_budget)
+            if examples:
+                templates.insert(
+                    0,
+                    (
+                        "few_shot_dynamic",
+                        lambda email: self.templates.get_classification_prompt_with_selected_examples(  # noqa: E501
+                            email, examples
+                        ),
+                    ),
+                )
+        elif self.should_use_enhanced_prompt(text):
+            templates.insert(
+                0, ("few_shot", self.templates.get_classification_prompt_with_examples)
+            )
+        prompt = self._fit(templates, text, input_budget, max_tokens)
+        if prompt.template == "few_shot_dynamic":
+            prompt.examples = len(examples)
+        return prompt
+
+    def build_reply_prompt(
+        self, text: str, category: str, tone: str, input_budget: int, max_tokens: int
+    ) -> BudgetedPrompt:
+        """Prompt de resposta dentro do orçamento de tokens"""
+        return self._fit(
+            [
+                (
+                    "reply",
+                    lambda email: self.templates.get_reply_generation_prompt_enhanced(
+                        email, category, tone
+                    ),
+                )
+            ],
+            text,
+            input_budget,
+            max_tokens,
+        )
+
+    def build_combined_prompt(
+        self, text: str, tone: str, input_budget: int, max_tokens: int
+    ) -> BudgetedPrompt:
+        """Prompt combinado (classificação + resposta) dentro do orçamento"""
+        return self._fit(
+            [
+                (
+                    "combined",
+                    lambda email: self.templates.get_combined_classification_reply_prompt(
+                        email, tone
+                    ),
+                )
+            ],
+            text,
+            input_budget,
+            max_tokens,
+        )
+
+    @staticmethod
+    def _fit(
+        templates: List[Tuple[str, Callable[[str], str]]],
+        text: str,
+        input_budget: int,
+        max_tokens: int,
+    ) -> BudgetedPrompt:
+        """
+        Primeiro template (em ordem de preferência) cujo prompt cabe no
+        orçamento; se nenhum couber, o menor deles com o email cortado
+        """
+        for name, render in templates:
+            prompt = render(text)
+            tokens = estimate_tokens(prompt)
+            if tokens <= input_budget:
+                return BudgetedPrompt(prompt, tokens, max_tokens, name)
+
+        overheads = [
+            (estimate_tokens(render("")), name, render) for name, render in templates
+        ]
+        overhead, name, render = min(overheads, key=lambda item: item[0])
+        trimmed = trim_to_tokens(text, input_budget - overhead)
+        prompt = render(trimmed)
+        return BudgetedPrompt(
+            prompt,
+            estimate_tokens(prompt),
+            max_tokens,
+            name,
+            trimmed_chars=len(text) - len(trimmed),
+        )
+
     def get_optimized_reply_prompt(self, text: str, category: str, tone: str) -> str:
         """
         Retorna prompt otimizado para geração de resposta
@@ -243,17 +473,14 @@ Responda em JSON: {{
         """
         Analisa qualidade da resposta para feedback e melhoria contínua
         """
+        reply = analyze(response)
         quality_metrics = {
             "length_appropriate": 50 <= len(response) <= 300,
-            "addresses_request": any(
-                word in response.lower() for word in original_text.lower().split()[:10]
-            ),
-            "has_next_steps": "será" in response
-            or "prazo" in response
-            or "retorno" in response,
-            "professional_tone": not any(
-                word in response.lower() for word in ["tchau", "beijo", "xoxo"]
+            "addresses_request": not reply.vocabulary.isdisjoint(
+                analyze(original_text).tokens[:10]
             ),
+            "has_next_steps": reply.hits.any(NEXT_STEPS),
+            "professional_tone": not reply.hits.any(INFORMAL),
             "category_appropriate": True,  # Simplificado para demo
         }
 
@@ -267,4 +494,13 @@ Responda em JSON: {{
 
 
 # Instância global do otimizador
-prompt_optimizer = PromptOptimizer()
+prompt_optimizer = PromptOptimizer(
+    example_bank=(
+        load_example_bank(settings.few_shot_bank_path)
+        if settings.few_shot_bank_enabled
+        else None
+    ),
+    few_shot_k=settings.few_shot_k,
+    few_shot_token_budget=settings.few_shot_token_budget,
+    few_shot_min_similarity=settings.few_shot_min_similarity,
+)
@@ -0,0 +1,128 @@
+"""
+Retry policy for upstream AI calls
+Capped exponential backoff with full jitter, honoring Retry-After and the
+OpenAI x-ratelimit-* headers, always bounded by the caller's deadline
+"""
+
+import random
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Mapping, Optional
+
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Parse OpenAI reset durations such as '20ms', '1s' or '6m0s'"""
+    parts = _DURATION_PART.findall(value.strip())
+    if not parts or "".join(n + u for n, u in parts) != value.strip():
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def parse_retry_after(value: str, now: Optional[float] = None) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    if now is None:
+        now = time.time()
+    return max(0.0, retry_at - now)
+
+
+class RetryPolicy:
+    """Decides whether and how long to wait before another attempt"""
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 0.25,
+        max_delay: float = 4.0,
+        rand: Callable[[float, float], float] = random.uniform,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._rand = rand
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: uniform(0, min(max_delay, base * 2^(attempt-1)))"""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return self._rand(0.0, ceiling)
+
+    def delay_for_response(
+        self, attempt: int, status_code: int, headers: Mapping[str, Any]
+    ) -> float:
+        """Server hints win over backoff: Retry-After, then x-ratelimit-reset-*"""
+        hinted = self._header_delay(status_code, headers)
+        return hinted if hinted is not None else self.backoff(attempt)
+
+    def can_retry(self, attempt: int, delay: float, remaining: float) -> bool:
+        """
+        Retry only if attempts remain and waiting still leaves budget for
+        another attempt (never sleep past the deadline)
+        """
+        return attempt < self.max_attempts and delay < remaining
+
+    @staticmethod
+    def _header_delay(status_code: int, headers: Mapping[str, Any]) -> Optional[float]:
+        try:
+            retry_after = headers.get("retry-after")
+            if isinstance(retry_after, str):
+                parsed = parse_retry_after(retry_after)
+                if parsed is not None:
+                    return parsed
+
+            if status_code != 429:
+                return None
+            for kind in ("requests", "tokens"):
+                remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+                reset = headers.get(f"x-ratelimit-reset-{kind}")
+                if remaining == "0" and isinstance(reset, str):
+                    parsed = parse_duration(reset)
+                    if parsed is not None:
+                        return parsed
+        except (AttributeError, TypeError):
+            return None
+        return None
+
+
+class RetryStats:
+    """Per-attempt counters for the admin metrics"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.exhausted = 0
+        self.backoff_seconds = 0.0
+        self.retries_by_reason: Dict[str, int] = {}
+
+    def record_attempt(self) -> None:
+        self.attempts += 1
+
+    def record_retry(self, reason: str, delay: float) -> None:
+        self.retries += 1
+        self.backoff_seconds += delay
+        self.retries_by_reason[reason] = self.retries_by_reason.get(reason, 0) + 1
+
+    def record_exhausted(self) -> None:
+        self.exhausted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "attempts": self.attempts,
+            "retries": self.retries,
+            "exhausted": self.exhausted,
+            "backoff_seconds": round(self.backoff_seconds, 3),
+            "retries_by_reason": dict(self.retries_by_reason),
+        }
@@ -0,0 +1,119 @@
+"""
+Weighted fair queueing of upstream capacity
+Interactive traffic has strict priority over bulk traffic; inside each
+class, flows (users) share capacity in proportion to their weights
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from app.core.traffic import BULK, INTERACTIVE
+from app.services.hedging import LatencyTracker
+
+
+class _ClassQueue:
+    """Start-time fair queue for one traffic class"""
+
+    def __init__(self):
+        self.heap: List[Tuple[float, int, asyncio.Future]] = []
+        self.virtual_time = 0.0
+        self.last_finish: Dict[str, float] = {}
+
+    def push(self, waiter: asyncio.Future, flow: str, weight: float, seq: int) -> None:
+        start = max(self.virtual_time, self.last_finish.get(flow, 0.0))
+        finish = start + 1.0 / weight
+        self.last_finish[flow] = finish
+        heapq.heappush(self.heap, (finish, seq, waiter))
+
+    def pop(self) -> Optional[asyncio.Future]:
+        while self.heap:
+            finish, _, waiter = heapq.heappop(self.heap)
+            self.virtual_time = max(self.virtual_time, finish)
+            if not waiter.done():
+                return waiter
+        if not self.heap:
+            # Idle: forget old finish tags so returning flows start fresh
+            self.last_finish.clear()
+        return None
+
+    def remove(self, waiter: asyncio.Future) -> bool:
+        for index, entry in enumerate(self.heap):
+            if entry[2] is waiter:
+                self.heap.pop(index)
+                heapq.heapify(self.heap)
+                return True
+        return False
+
+
+class FairQueue:
+    """Waiter queue for the admission controller"""
+
+    def __init__(
+        self,
+        weights: Optional[Mapping[str, float]] = None,
+        default_weight: float = 1.0,
+    ):
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self._classes = {INTERACTIVE: _ClassQueue(), BULK: _ClassQueue()}
+        self._seq = itertools.count()
+        self._wait_times = {name: LatencyTracker() for name in self._classes}
+        self._dispatched = {name: 0 for name in self._classes}
+        self._enqueued_at: Dict[asyncio.Future, float] = {}
+
+    def __len__(self) -> int:
+        return sum(len(queue.heap) for queue in self._classes.values())
+
+    def weight(self, flow: str) -> float:
+        return max(1e-6, self.weights.get(flow, self.default_weight))
+
+    def push(self, waiter: asyncio.Future, traffic_class: str, flow: str) -> None:
+        self._classes[traffic_class].push(
+            waiter, flow, self.weight(flow), next(self._seq)
+        )
+        self._enqueued_at[waiter] = time.monotonic()
+
+    def pop(self) -> Optional[asyncio.Future]:
+        """Next waiter: any interactive one first, then bulk (strict priority)"""
+        for name in (INTERACTIVE, BULK):
+            waiter = self._classes[name].pop()
+            if waiter is not None:
+                self._dispatched[name] += 1
+                self._enqueued_at.pop(waiter, None)
+                return waiter
+        self._enqueued_at.clear()
+        return None
+
+    def remove(self, waiter: asyncio.Future) -> None:
+        self._enqueued_at.pop(waiter, None)
+        for queue in self._classes.values():
+            if queue.remove(waiter):
+                return
+
+    def oldest_wait(self) -> float:
+        """Seconds the longest-waiting caller has been queued (0 if none)"""
+        if not self._enqueued_at:
+            return 0.0
+        return time.monotonic() - min(self._enqueued_at.values())
+
+    def record_wait(self, traffic_class: str, seconds: float) -> None:
+        self._wait_times[traffic_class].record(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {}
+        for name, queue in self._classes.items():
+            waits = self._wait_times[name]
+            stats[name] = {
+                "queued": len(queue.heap),
+                "dispatched": self._dispatched[name],
+                "wait_p50_ms": _ms(waits.percentile(0.5)),
+                "wait_p95_ms": _ms(waits.percentile(0.95)),
+            }
+        return stats
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 1) if seconds is not None else None
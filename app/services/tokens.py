@@ -0,0 +1,43 @@
+"""
+Offline token estimation for prompts
+Approximates BPE token counts (cl100k-style) from letter runs, digit
+groups and symbols, without downloading a tokenizer; cheap enough to run
+on every prompt before it is sent.
+"""
+
+import re
+
+# Letter runs, up to three digits, or any other single visible character
+_PIECES = re.compile(r"[^\W\d_]+|\d{1,3}|\S")
+# Short words are single tokens; longer ones split every ~6 ASCII letters
+CHARS_PER_TOKEN = 6
+
+
+def _piece_tokens(piece: str) -> int:
+    if piece.isascii():
+        return (len(piece) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    # Accented words split into more pieces; emoji take 2-3 tokens
+    if piece.isalpha():
+        return (len(piece) + 3) // 4
+    return 2
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimated token count of text (errs slightly high for PT/EN prose)"""
+    if not text:
+        return 0
+    return sum(_piece_tokens(piece) for piece in _PIECES.findall(text))
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of text whose estimate fits in max_tokens"""
+    if max_tokens <= 0:
+        return ""
+    used = 0
+    end = 0
+    for match in _PIECES.finditer(text):
+        used += _piece_tokens(match.group())
+        if used > max_tokens:
+            return text[:end].rstrip()
+        end = match.end()
+    return text
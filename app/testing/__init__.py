@@ -0,0 +1 @@
+# Testing helpers module init
@@ -0,0 +1,256 @@
+"""
+Local fake of the OpenAI /v1/chat/completions endpoint
+Configurable latency distributions, 5xx/429 injection, SSE streaming and
+deterministic JSON classifications, for offline tests and benchmarks.
+
+Run standalone:
+    python -m app.testing.fake_openai --port 8081 --latency lognormal --latency-ms 80
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.services.heuristics import classify_heuristic
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "exponential", "lognormal")
+
+_TRIPLE_QUOTED = re.compile(r'"""(.*?)"""', re.DOTALL)
+_QUOTED_LINE = re.compile(r'^"(.*?)"\s*$', re.DOTALL | re.MULTILINE)
+
+
+class FakeOpenAIConfig:
+    """Behaviour of the fake server; every field can be changed at runtime"""
+
+    def __init__(
+        self,
+        latency: str = "constant",
+        latency_ms: float = 20.0,
+        latency_sigma: float = 0.5,
+        slow_rate: float = 0.0,
+        slow_ms: float = 1000.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: float = 1.0,
+        stream_chunk_ms: float = 5.0,
+        seed: Optional[int] = None,
+    ):
+        if latency not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency}")
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.stream_chunk_ms = stream_chunk_ms
+        self.rng = random.Random(seed)
+
+    def sample_latency(self) -> float:
+        """One service time in seconds from the configured distribution"""
+        if self.slow_rate and self.rng.random() < self.slow_rate:
+            return self.slow_ms / 1000
+        mean = self.latency_ms
+        if self.latency == "uniform":
+            value = self.rng.uniform(0, 2 * mean)
+        elif self.latency == "exponential":
+            value = self.rng.expovariate(1 / mean) if mean > 0 else 0.0
+        elif self.latency == "lognormal":
+            # latency_ms is the median, sigma shapes the tail
+            value = mean * math.exp(self.rng.gauss(0, self.latency_sigma))
+        else:
+            value = mean
+        return max(0.0, value) / 1000
+
+
+def _email_text(prompt: str) -> str:
+    """The email embedded in one of our prompts (last quoted block)"""
+    blocks = _TRIPLE_QUOTED.findall(prompt) or _QUOTED_LINE.findall(prompt)
+    return blocks[-1] if blocks else prompt
+
+
+def fake_completion(prompt: str) -> str:
+    """
+    Deterministic answer for a prompt: JSON classification (plus reply for
+    the combined prompt) decided by the heuristic scorer, or a plain reply
+    """
+    category, _, rationale = classify_heuristic(_email_text(prompt))
+    reply = (
+        "Prezado(a), recebemos sua solicitação e retornaremos em até 24h úteis."
+        if category == "Produtivo"
+        else "Olá! Agradecemos sua mensagem. Tenha um ótimo dia!"
+    )
+    if '"reply"' in prompt:
+        return json.dumps(
+            {"category": category, "rationale": rationale, "reply": reply},
+            ensure_ascii=False,
+        )
+    if '"category"' in prompt:
+        return json.dumps(
+            {"category": category, "rationale": rationale}, ensure_ascii=False
+        )
+    return reply
+
+
+def create_fake_openai_app(config: Optional[FakeOpenAIConfig] = None) -> FastAPI:
+    """Build the fake server; its config and counters live on app.state"""
+    app = FastAPI(title="Fake OpenAI")
+    app.state.config = config or FakeOpenAIConfig()
+    app.state.stats = {
+        "requests": 0,
+        "in_flight": 0,
+        "max_in_flight": 0,
+        "errors": 0,
+        "rate_limited": 0,
+    }
+
+    @app.get("/stats")
+    async def stats() -> Dict[str, Any]:
+        return app.state.stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        cfg: FakeOpenAIConfig = app.state.config
+        counters = app.state.stats
+        body = await request.json()
+        counters["requests"] += 1
+
+        roll = cfg.rng.random()
+        if roll < cfg.rate_limit_rate:
+            counters["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests"}},
+                status_code=429,
+                headers={
+                    "retry-after": str(cfg.retry_after),
+                    "x-ratelimit-remaining-requests": "0",
+                    "x-ratelimit-reset-requests": f"{int(cfg.retry_after * 1000)}ms",
+                },
+            )
+        if roll < cfg.rate_limit_rate + cfg.error_rate:
+            counters["errors"] += 1
+            return JSONResponse(
+                {"error": {"message": "Injected upstream failure"}}, status_code=500
+            )
+
+        counters["in_flight"] += 1
+        counters["max_in_flight"] = max(
+            counters["max_in_flight"], counters["in_flight"]
+        )
+        try:
+            await asyncio.sleep(cfg.sample_latency())
+        finally:
+            counters["in_flight"] -= 1
+
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        content = fake_completion(prompt)
+        model = body.get("model", "fake-model")
+
+        if body.get("stream"):
+            return StreamingResponse(
+                _stream_chunks(content, model, cfg.stream_chunk_ms),
+                media_type="text/event-stream",
+            )
+
+        return {
+            "id": f"chatcmpl-fake-{counters['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (len(prompt) + len(content)) // 4,
+            },
+        }
+
+    return app
+
+
+class HostRoutingTransport(httpx.AsyncBaseTransport):
+    """
+    In-process transport serving several fake servers by host name, e.g.
+    http://primary/v1 and http://secondary/v1, to exercise endpoint routing
+    """
+
+    def __init__(self, apps: Dict[str, FastAPI]):
+        self.transports = {
+            host: httpx.ASGITransport(app=app) for host, app in apps.items()
+        }
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = self.transports.get(request.url.host)
+        if transport is None:
+            raise httpx.ConnectError(f"Unknown fake host {request.url.host}")
+        return await transport.handle_async_request(request)
+
+
+async def _stream_chunks(content: str, model: str, chunk_ms: float):
+    for index, word in enumerate(content.split(" ")):
+        delta = word if index == 0 else " " + word
+        chunk = {"model": model, "choices": [{"index": 0, "delta": {"content": delta}}]}
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        if chunk_ms:
+            await asyncio.sleep(chunk_ms / 1000)
+    yield "data: [DONE]\n\n"
+
+
+def add_server_arguments(parser: argparse.ArgumentParser) -> None:
+    """Fake server options, shared with the benchmark harness"""
+    parser.add_argument("--latency", choices=LATENCY_DISTRIBUTIONS, default="constant")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-ms", type=float, default=1000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeOpenAIConfig:
+    return FakeOpenAIConfig(
+        latency=args.latency,
+        latency_ms=args.latency_ms,
+        latency_sigma=args.latency_sigma,
+        slow_rate=args.slow_rate,
+        slow_ms=args.slow_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    cli = argparse.ArgumentParser(description="Fake OpenAI chat completions server")
+    cli.add_argument("--host", default="127.0.0.1")
+    cli.add_argument("--port", type=int, default=8081)
+    add_server_arguments(cli)
+    cli_args = cli.parse_args()
+    uvicorn.run(
+        create_fake_openai_app(config_from_args(cli_args)),
+        host=cli_args.host,
+        port=cli_args.port,
+        log_level="warning",
+    )
@@ -3,6 +3,7 @@ from typing import Optional
 
 from pypdf import PdfReader
 
+from app.core import deadline
 from app.core.logger import get_logger
 
 logger = get_logger(__name__)
@@ -19,7 +20,15 @@ def extract_text_from_pdf(file_content: bytes) -> Optional[str]:
 
         # Extract text from all pages
         text = ""
-        for page in reader.pages:
+        for index, page in enumerate(reader.pages):
+            # Keep what was read so far once the request runs out of time
+            if text and deadline.expired():
+                logger.warning(
+                    "PDF extraction stopped at request deadline",
+                    pages_read=index,
+                    pages=len(reader.pages),
+                )
+                break
             page_text = page.extract_text()
             if page_text:
                 text += page_text + "\n"
@@ -1,6 +1,7 @@
+import json
 import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, Optional
 
 from fastapi import (
     APIRouter,
@@ -12,11 +13,12 @@ from fastapi import (
     UploadFile,
     status,
 )
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 
+from app.core import deadline, traffic
 from app.core.auth import (
     Token,
     User,
@@ -25,13 +27,15 @@ from app.core.auth import (
     create_access_token,
     create_refresh_token,
     get_current_active_user,
+    hash_api_key,
     rate_limit_check,
     require_scopes,
 )
 from app.core.config import settings
 from app.core.logger import get_logger
-from app.services.ai import ai_provider
-from app.services.nlp import preprocess_text
+from app.services.ai import VALID_CATEGORIES, ai_provider
+from app.services.nlp import preprocess_text, preprocessing_stats
+from app.services.overload import FULL, SHED, overload_controller
 from app.utils.pdf import extract_text_from_pdf, validate_pdf
 from app.utils.txt import extract_text_from_txt, validate_txt
 
@@ -42,6 +46,60 @@ router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
+async def request_deadline(request: Request) -> float:
+    """
+    Start the end-to-end deadline for this request. Every later stage
+    (extraction, preprocessing, AI calls) reads the remaining budget from
+    the context; clients may ask for a shorter one via a header.
+    """
+    budget = deadline.parse_timeout_header(
+        request.headers.get(settings.request_timeout_header),
+        settings.request_deadline_seconds,
+    )
+    deadline.start_deadline(budget)
+    return budget
+
+
+async def interactive_traffic(request: Request) -> None:
+    """Tag UI-facing requests for priority upstream scheduling"""
+    host = request.client.host if request.client else "unknown"
+    traffic.set_traffic(traffic.INTERACTIVE, f"ip:{host}")
+
+
+async def overload_shed():
+    """Shed the request with 503 + Retry-After while overload is at its last mode"""
+    if overload_controller.evaluate() == SHED:
+        overload_controller.record_shed()
+        raise HTTPException(
+            status_code=503,
+            detail="Serviço sobrecarregado, tente novamente em instantes",
+            headers={"Retry-After": str(settings.overload_retry_after_seconds)},
+        )
+
+
+async def overload_guard():
+    """Shed the request when overloaded, else count it as in flight"""
+    await overload_shed()
+    overload_controller.request_started()
+    try:
+        yield
+    finally:
+        overload_controller.request_finished()
+
+
+async def _counted_stream(events: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Count a streamed response as in flight until its body is done; yield
+    dependencies finish before StreamingResponse sends the body
+    """
+    overload_controller.request_started()
+    try:
+        async for event in events:
+            yield event
+    finally:
+        overload_controller.request_finished()
+
+
 class ClassifyRequest(BaseModel):
     text: str
     tone: str = "neutro"
@@ -52,10 +110,29 @@ class RefineRequest(BaseModel):
     tone: str
 
 
+class FeedbackRequest(BaseModel):
+    text: str
+    category: str  # corrected category
+    predicted: Optional[str] = None  # category the classifier returned
+
+
+class FeedbackResponse(BaseModel):
+    stored: bool
+    model_version: str
+    corrections: int
+    pending: int
+
+
 class ClassificationMeta(BaseModel):
     model: str
+    model_version: Optional[str] = None
     cost: float = 0.0
     fallback: bool = False
+    cached: bool = False
+    service_mode: str = FULL
+    tokens: Optional[Dict[str, Any]] = None
+    near_duplicate: Optional[Dict[str, Any]] = None
+    preprocessing: Optional[Dict[str, Any]] = None
 
 
 class ClassificationResponse(BaseModel):
@@ -73,6 +150,7 @@ class ClassifyResponse(ClassificationResponse):
 class RefineResponse(BaseModel):
     reply: str
     latency_ms: int
+    meta: Dict[str, Any] = {}
 
 
 class APIClassificationResponse(BaseModel):
@@ -103,7 +181,17 @@ async def index(request: Request):
 @router.get("/health")
 async def health():
     """Health check endpoint"""
-    return {"status": "ok", "timestamp": datetime.utcnow().isoformat()}
+    breakers = ai_provider.breaker_states()
+    mode = overload_controller.mode
+    degraded = "open" in breakers.values() or mode != FULL
+    return {
+        "status": "degraded" if degraded else "ok",
+        "mode": mode,
+        "overload": overload_controller.stats(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "upstream_pool": ai_provider.pool_stats(),
+        "circuit_breakers": breakers,
+    }
 
 
 # Authentication endpoints
@@ -149,7 +237,11 @@ async def get_me(current_user: User = Depends(get_current_active_user)):
 
 
 # Protected classification endpoints
-@router.post("/api/classify/text", response_model=APIClassificationResponse)
+@router.post(
+    "/api/classify/text",
+    response_model=APIClassificationResponse,
+    dependencies=[Depends(overload_guard), Depends(request_deadline)],
+)
 async def classify_text_api(
     request: ClassifyRequest,
     current_user: User = Depends(require_scopes("classify:read")),
@@ -160,11 +252,12 @@ async def classify_text_api(
 
     Requires 'classify:read' scope.
     """
+    traffic.set_traffic(traffic.BULK, f"user:{current_user.username}")
     try:
-        if len(request.text) > settings.max_input_chars:
+        if len(request.text) > _input_limit():
             raise HTTPException(
                 status_code=400,
-                detail=f"Text exceeds limit of {settings.max_input_chars}",
+                detail=f"Text exceeds limit of {_input_limit()}",
             )
 
         # Preprocess text
@@ -192,7 +285,11 @@ async def classify_text_api(
         raise HTTPException(status_code=500, detail="Erro na classificação")
 
 
-@router.post("/api/classify/file", response_model=APIClassificationResponse)
+@router.post(
+    "/api/classify/file",
+    response_model=APIClassificationResponse,
+    dependencies=[Depends(overload_guard), Depends(request_deadline)],
+)
 async def classify_file_api(
     file: UploadFile = File(...),
     current_user: User = Depends(require_scopes("classify:read")),
@@ -204,6 +301,7 @@ async def classify_file_api(
     Requires 'classify:read' scope.
     Supports PDF and TXT files.
     """
+    traffic.set_traffic(traffic.BULK, f"user:{current_user.username}")
     try:
         # Extract text from file
         text = await _extract_text(None, file)
@@ -236,8 +334,99 @@ async def classify_file_api(
         raise HTTPException(status_code=500, detail="Erro na classificação do arquivo")
 
 
+@router.post("/api/feedback", response_model=FeedbackResponse)
+async def submit_feedback(
+    request: FeedbackRequest,
+    current_user: User = Depends(require_scopes("classify:read")),
+    _: bool = Depends(rate_limit_check),
+):
+    """
+    Store a classification correction and train the local model on it.
+
+    Requires 'classify:read' scope.
+    """
+    if not settings.feedback_enabled:
+        raise HTTPException(status_code=404, detail="Feedback desabilitado")
+    if request.category not in VALID_CATEGORIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Categoria inválida: use {', '.join(VALID_CATEGORIES)}",
+        )
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Texto vazio")
+    if len(request.text) > _input_limit():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Text exceeds limit of {_input_limit()}",
+        )
+
+    try:
+        # Learn from the same text the classifier sees (compressed to
+        # max_input_chars when longer)
+        result = await ai_provider.record_feedback(
+            preprocess_text(request.text),
+            request.category,
+            predicted=request.predicted,
+            user=current_user.username,
+        )
+    except Exception as e:
+        logger.error(
+            "Feedback error",
+            extra={"user": current_user.username, "error": str(e)},
+            exc_info=True,
+        )
+        raise HTTPException(status_code=500, detail="Erro ao registrar feedback")
+
+    logger.info(
+        "Feedback stored",
+        user=current_user.username,
+        category=request.category,
+        predicted=request.predicted,
+        model_version=result["model_version"],
+    )
+    return result
+
+
+# Admin endpoints
+@router.get("/api/admin/metrics")
+async def get_metrics(current_user: User = Depends(require_scopes("admin"))):
+    """
+    Runtime metrics of the upstream AI layer.
+
+    Requires 'admin' scope.
+    """
+    return {**ai_provider.metrics(), "preprocessing": preprocessing_stats.stats()}
+
+
+@router.get("/api/admin/cache")
+async def get_cache_stats(current_user: User = Depends(require_scopes("admin"))):
+    """
+    Inspect the classification result cache.
+
+    Requires 'admin' scope.
+    """
+    return ai_provider.cache.stats()
+
+
+@router.delete("/api/admin/cache")
+async def flush_cache(current_user: User = Depends(require_scopes("admin"))):
+    """
+    Flush the classification result cache.
+
+    Requires 'admin' scope.
+    """
+    removed = ai_provider.cache.clear()
+    ai_provider.near_duplicates.clear()
+    logger.info("Cache flushed by admin", user=current_user.username)
+    return {"flushed": removed}
+
+
 # Alternative API key authentication (for legacy systems)
-@router.post("/api/v1/classify", response_model=LegacyClassificationResponse)
+@router.post(
+    "/api/v1/classify",
+    response_model=LegacyClassificationResponse,
+    dependencies=[Depends(overload_guard), Depends(request_deadline)],
+)
 async def classify_with_api_key(
     request: ClassifyRequest, api_key: str = Depends(api_key_auth)
 ):
@@ -246,11 +435,12 @@ async def classify_with_api_key(
 
     Legacy endpoint for systems that cannot use JWT.
     """
+    traffic.set_traffic(traffic.BULK, f"key:{hash_api_key(api_key or '')[:12]}")
     try:
-        if len(request.text) > settings.max_input_chars:
+        if len(request.text) > _input_limit():
             raise HTTPException(
                 status_code=400,
-                detail=f"Text exceeds limit of {settings.max_input_chars}",
+                detail=f"Text exceeds limit of {_input_limit()}",
             )
 
         # Preprocess text
@@ -274,7 +464,15 @@ async def classify_with_api_key(
         raise HTTPException(status_code=500, detail="Erro na classificação")
 
 
-@router.post("/classify", response_model=ClassifyResponse)
+@router.post(
+    "/classify",
+    response_model=ClassifyResponse,
+    dependencies=[
+        Depends(overload_guard),
+        Depends(request_deadline),
+        Depends(interactive_traffic),
+    ],
+)
 async def classify_email(
     request: Request,
     text: Optional[str] = Form(None),
@@ -285,28 +483,15 @@ async def classify_email(
     start_time = time.time()
 
     try:
-        # Extract text from file or form
-        email_text = await _extract_text(text, file)
-
-        # Validate input
-        if not email_text or len(email_text.strip()) < 5:
-            raise HTTPException(status_code=400, detail="Texto muito curto ou vazio")
-
-        if len(email_text) > settings.max_input_chars:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Texto excede o limite de {settings.max_input_chars} caracteres",
-            )
+        # Extract and validate text from file or form
+        email_text = await _extract_email_text(text, file)
 
         # Preprocess text
         processed_text = preprocess_text(email_text)
 
-        # Classify using AI
-        classification = await ai_provider.classify(processed_text)
-
-        # Generate reply
-        reply = await ai_provider.generate_reply(
-            processed_text, classification["category"], tone
+        # Classify and generate reply (one or two upstream calls)
+        classification, reply = await ai_provider.classify_and_reply(
+            processed_text, tone
         )
 
         # Calculate response time
@@ -352,7 +537,101 @@ async def classify_email(
         raise HTTPException(status_code=500, detail="Erro interno do servidor")
 
 
-@router.post("/refine", response_model=RefineResponse)
+def _sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post(
+    "/classify/stream",
+    dependencies=[
+        Depends(overload_shed),
+        Depends(request_deadline),
+        Depends(interactive_traffic),
+    ],
+)
+async def classify_email_stream(
+    request: Request,
+    text: Optional[str] = Form(None),
+    tone: str = Form("neutro"),
+    file: Optional[UploadFile] = File(None),
+):
+    """
+    Classify email and stream the reply as Server-Sent Events.
+
+    Events: "classification" as soon as the category is known, "token"
+    for each reply chunk, then "done" with the full reply and timings.
+    """
+    start_time = time.time()
+
+    email_text = await _extract_email_text(text, file)
+    processed_text = preprocess_text(email_text)
+
+    async def event_stream() -> AsyncIterator[str]:
+        try:
+            classification = await ai_provider.classify(processed_text)
+            classification_ms = round((time.time() - start_time) * 1000)
+            yield _sse_event(
+                "classification",
+                {
+                    "category": classification["category"],
+                    "confidence": classification["confidence"],
+                    "rationale": classification["rationale"],
+                    "meta": classification["meta"],
+                },
+            )
+
+            chunks = []
+            first_token_ms = None
+            async for chunk in ai_provider.stream_reply(
+                processed_text, classification["category"], tone
+            ):
+                if first_token_ms is None:
+                    first_token_ms = round((time.time() - start_time) * 1000)
+                chunks.append(chunk)
+                yield _sse_event("token", {"text": chunk})
+
+            latency_ms = max(1, round((time.time() - start_time) * 1000))
+            logger.info(
+                "Streaming classification completed",
+                text_length=len(email_text),
+                category=classification["category"],
+                tone=tone,
+                latency_ms=latency_ms,
+                first_token_ms=first_token_ms,
+            )
+            yield _sse_event(
+                "done",
+                {
+                    "reply": "".join(chunks),
+                    "latency_ms": latency_ms,
+                    "timings": {
+                        "classification_ms": classification_ms,
+                        "first_token_ms": first_token_ms,
+                        "total_ms": latency_ms,
+                    },
+                },
+            )
+        except Exception as e:
+            logger.error("Streaming classification failed", error=str(e))
+            yield _sse_event("error", {"detail": "Erro interno do servidor"})
+
+    return StreamingResponse(
+        _counted_stream(event_stream()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post(
+    "/refine",
+    response_model=RefineResponse,
+    dependencies=[
+        Depends(overload_guard),
+        Depends(request_deadline),
+        Depends(interactive_traffic),
+    ],
+)
 async def refine_reply(request: RefineRequest):
     """Refine existing reply with new tone"""
     start_time = time.time()
@@ -376,7 +655,13 @@ async def refine_reply(request: RefineRequest):
             latency_ms=latency_ms,
         )
 
-        return JSONResponse(content={"reply": refined_reply, "latency_ms": latency_ms})
+        return JSONResponse(
+            content={
+                "reply": refined_reply,
+                "latency_ms": latency_ms,
+                "meta": {"service_mode": overload_controller.mode},
+            }
+        )
 
     except HTTPException:
         raise
@@ -395,9 +680,39 @@ async def refine_reply(request: RefineRequest):
         raise HTTPException(status_code=500, detail="Erro ao refinar resposta")
 
 
+def _input_limit() -> int:
+    """Longest email accepted; above max_input_chars it is compressed"""
+    if settings.compression_enabled:
+        return max(settings.max_compressible_chars, settings.max_input_chars)
+    return settings.max_input_chars
+
+
+async def _extract_email_text(
+    form_text: Optional[str], file: Optional[UploadFile]
+) -> str:
+    """Extract text from form or file and validate its length"""
+    email_text = await _extract_text(form_text, file)
+
+    if not email_text or len(email_text.strip()) < 5:
+        raise HTTPException(status_code=400, detail="Texto muito curto ou vazio")
+
+    if len(email_text) > _input_limit():
+        raise HTTPException(
+            status_code=400,
+            detail=f"Texto excede o limite de {_input_limit()} caracteres",
+        )
+
+    return email_text
+
+
 async def _extract_text(form_text: Optional[str], file: Optional[UploadFile]) -> str:
     """Extract text from form input or uploaded file"""
 
+    if deadline.expired():
+        raise HTTPException(
+            status_code=504, detail="Tempo limite da requisição excedido"
+        )
+
     if form_text and form_text.strip():
         return form_text.strip()
 
@@ -1,20 +1,35 @@
 import os
 import sys
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
 from app.core.logger import setup_logging
+from app.services.ai import ai_provider
+from app.services.overload import overload_controller
 from app.web.routes import router
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the pooled upstream client once and reuse it across requests
+    await ai_provider.startup()
+    # Sample event-loop lag and re-evaluate the service mode in the background
+    overload_controller.monitor.start(overload_controller.evaluate)
+    yield
+    await overload_controller.monitor.stop()
+    await ai_provider.aclose()
+
+
 def create_app() -> FastAPI:
     app = FastAPI(
         title="AutoU - Classificador de E-mails",
         description="Sistema inteligente de classificação e resposta "
         " automática de e-mails",
         version="1.0.0",
+        lifespan=lifespan,
     )
 
     # Setup logging
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Benchmark end-to-end do AIProvider contra um servidor OpenAI-compatível
+
+Sem --base-url, sobe o servidor fake local (app.testing.fake_openai) em
+127.0.0.1 e aponta o AIProvider para ele via OPENAI_BASE_URL; pool,
+retries, timeouts e controle de admissão são exercitados de verdade.
+
+Exemplos:
+    python scripts/benchmark.py --requests 500 --concurrency 50
+    python scripts/benchmark.py --latency lognormal --latency-ms 80 --slow-rate 0.02
+    python scripts/benchmark.py --mode classify_and_reply --rate-limit-rate 0.05
+    python scripts/benchmark.py --servers 3 --policy latency --error-rate 0.1
+    python scripts/benchmark.py --hedging --slow-rate 0.02 --slow-ms 2000
+    python scripts/benchmark.py --base-url http://localhost:8000/v1 --json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.testing.fake_openai import (  # noqa: E402
+    add_server_arguments,
+    config_from_args,
+    create_fake_openai_app,
+)
+
+EMAILS = [
+    "Preciso de suporte urgente, o sistema está fora do ar desde ontem.",
+    "Qual o status do chamado 4821? Aguardo retorno sobre o faturamento.",
+    "Não consigo acessar minha conta, aparece erro 403 no login.",
+    "Obrigado pela ajuda de ontem, o problema foi resolvido.",
+    "Parabéns pela apresentação, feliz aniversário para toda a equipe!",
+]
+
+
+class FakeServerThread:
+    """Serves the fake OpenAI app with uvicorn on a free local port"""
+
+    def __init__(self, app):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        config = uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, log_level="warning"
+        )
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/v1"
+
+    def __enter__(self) -> "FakeServerThread":
+        self.thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("fake server did not start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run_benchmark(
+    requests: int, concurrency: int, mode: str, tone: str = "neutro"
+) -> Dict[str, Any]:
+    """Fire `requests` calls with at most `concurrency` in flight"""
+    # Imported late so the provider picks up the benchmark settings
+    from app.services.ai import AIProvider
+
+    provider = AIProvider()
+    await provider.startup()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    fallbacks = 0
+
+    async def one(index: int) -> None:
+        nonlocal fallbacks
+        # Unique text per request: measure the upstream, not the cache
+        text = f"{EMAILS[index % len(EMAILS)]} Ref {index}"
+        async with semaphore:
+            started = time.perf_counter()
+            if mode == "stream":
+                async for _ in provider.stream_reply(text, "Produtivo", tone):
+                    pass
+                result = None
+            elif mode == "classify_and_reply":
+                result, _ = await provider.classify_and_reply(text, tone)
+            else:
+                result = await provider.classify(text)
+            latencies.append(time.perf_counter() - started)
+        if result is not None and result["meta"].get("fallback"):
+            fallbacks += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    metrics = provider.metrics()
+    await provider.aclose()
+
+    ordered = sorted(latencies)
+    return {
+        "mode": mode,
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            name: round(_percentile(ordered, q) * 1000, 1)
+            for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+        },
+        "fallbacks": fallbacks,
+        "retries": metrics["retries"],
+        "admission": {
+            key: metrics["admission"][key]
+            for key in ("limit", "admitted", "queued_total", "rejected_timeout")
+        },
+        "pool": metrics["pool"],
+        "hedging": metrics["hedging"],
+        "endpoints": {
+            "failovers": metrics["endpoints"]["failovers"],
+            "requests": {
+                name: endpoint["requests"]
+                for name, endpoint in metrics["endpoints"]["endpoints"].items()
+            },
+        },
+    }
+
+
+def _print_report(report: Dict[str, Any], server_stats: Optional[Dict]) -> None:
+    latency = report["latency_ms"]
+    print(f"\nModo: {report['mode']}")
+    print(
+        f"Requisições: {report['requests']}  Concorrência: {report['concurrency']}"
+        f"  Tempo: {report['elapsed_s']}s"
+    )
+    print(f"Throughput: {report['throughput_rps']} req/s")
+    print(
+        f"Latência (ms): p50={latency['p50']} p95={latency['p95']}"
+        f" p99={latency['p99']} max={latency['max']}"
+    )
+    print(f"Fallbacks: {report['fallbacks']}  Retries: {report['retries']['retries']}")
+    print(f"Admissão: {report['admission']}")
+    print(f"Hedging: {report['hedging']}")
+    print(f"Endpoints: {report['endpoints']}")
+    if server_stats:
+        print(f"Servidor fake: {server_stats}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument(
+        "--mode",
+        choices=("classify", "classify_and_reply", "stream"),
+        default="classify",
+    )
+    parser.add_argument("--base-url", help="Use an existing server instead")
+    parser.add_argument(
+        "--servers", type=int, default=1, help="Fake endpoints to route across"
+    )
+    parser.add_argument(
+        "--policy", choices=("OpenAI", "failover", "latency"), default="OpenAI"
+    )
+    parser.add_argument(
+        "--hedging",
+        action="store_true",
+        help="Enable HEDGING_ENABLED to compare tail latency",
+    )
+    parser.add_argument("--json", action="store_true", help="Print a JSON report")
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+
+    settings.provider = args.policy
+    settings.openai_api_key = settings.openai_api_key or "benchmark-key"
+    settings.classification_cache_enabled = False
+    settings.hedging_enabled = args.hedging
+
+    server_stats = None
+    if args.base_url:
+        settings.openai_base_url = args.base_url
+        report = asyncio.run(run_benchmark(args.requests, args.concurrency, args.mode))
+    else:
+        with ExitStack() as stack:
+            servers = [
+                stack.enter_context(
+                    FakeServerThread(create_fake_openai_app(config_from_args(args)))
+                )
+                for _ in range(max(1, args.servers))
+            ]
+            settings.openai_endpoints = [
+                {"name": f"fake{index}", "base_url": server.base_url}
+                for index, server in enumerate(servers)
+            ]
+            report = asyncio.run(
+                run_benchmark(args.requests, args.concurrency, args.mode)
+            )
+            server_stats = [
+                httpx.get(f"http://127.0.0.1:{server.port}/stats").json()
+                for server in servers
+            ]
+
+    if args.json:
+        print(json.dumps({**report, "server": server_stats}, indent=2))
+    else:
+        _print_report(report, server_stats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark do processamento de texto por requisição
+
+Mede, sobre e-mails sintéticos de --chars caracteres, o custo das etapas
+locais que rodam antes (e depois) da chamada ao LLM, sem rede.
+
+Etapas:
+    keywords  varredura única do KeywordMatcher contra a busca antiga:
+              um "termo in texto.lower()" por termo, em cada chamador
+    analysis  Document.from_text (uma passada, lida por heurística, escore
+              de confiança e seleção de prompt) contra o trabalho que cada
+              etapa refazia: buscas de palavras-chave, split e contagem de "?"
+    normalize normalize_text (clean_text + filtro de caracteres) contra a
+              versão anterior (re.match por linha e cinco passadas de
+              re.sub), sobre um e-mail com linhas, cabeçalhos e símbolos
+
+Exemplos:
+    python scripts/benchmark_text.py
+    python scripts/benchmark_text.py --chars 20000 --repeat 200 --json
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.document import Document  # noqa: E402
+from app.services.keywords import LEXICONS, keyword_matcher  # noqa: E402
+from app.services.nlp import normalize_text  # noqa: E402
+
+SENTENCES = [
+    "Preciso de suporte urgente, o sistema está fora do ar desde ontem.",
+    "Qual o status do chamado 4821? Aguardo retorno sobre o faturamento.",
+    "Não consigo acessar minha conta, aparece erro 403 no login.",
+    "Segue em anexo a planilha com os lançamentos do mês para conferência.",
+    "Obrigado pela ajuda de ontem, o problema foi resolvido.",
+    "A reunião de alinhamento foi remarcada para quinta-feira às 15h.",
+    "Parabéns pela apresentação, feliz aniversário para toda a equipe!",
+]
+
+
+def synthetic_email(chars: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    parts = []
+    while sum(len(part) + 1 for part in parts) < chars:
+        parts.append(rng.choice(SENTENCES))
+    return " ".join(parts)[:chars]
+
+
+def synthetic_raw_email(chars: int, seed: int = 0) -> str:
+    """Multi-line email with headers, indentation and symbols"""
+    rng = random.Random(seed)
+    lines = ["De: cliente@empresa.com", "Assunto: Re: chamado 4821", ""]
+    while sum(len(line) + 1 for line in lines) < chars:
+        lines.append(f"  {rng.choice(SENTENCES)} (ref. #{rng.randint(1, 9999)})  ")
+    return "\n".join(lines)[:chars]
+
+
+def legacy_preprocess(text: str) -> str:
+    """clean_text + preprocess_text as they were before the rewrite"""
+    cleaned_lines = []
+    for line in text.split("\n"):
+        line = line.strip()
+        if (
+            line.startswith("De:")
+            or line.startswith("Para:")
+            or line.startswith("Assunto:")
+            or line.startswith("Data:")
+        ):
+            continue
+        if re.match(r"^--+\s*$", line):
+            break
+        if not line and not cleaned_lines:
+            continue
+        cleaned_lines.append(line)
+    result = " ".join(cleaned_lines)
+    result = re.sub(r"Enviado do meu.*$", "", result, flags=re.MULTILINE)
+    result = re.sub(r"\s+", " ", result).strip()
+    result = re.sub(r"[^\w\s\.,\!\?\-]", "", result)
+    return re.sub(r"\s+", " ", result).strip()
+
+
+def legacy_keyword_scan(text: str) -> Dict[str, int]:
+    """Substring scans as done before, one lowercase copy per caller"""
+    counts = {}
+    for name, terms in LEXICONS.items():
+        text_lower = text.lower()
+        counts[name] = sum(1 for term in terms if term in text_lower)
+    return counts
+
+
+def legacy_analysis(text: str) -> int:
+    """Per-stage rescans of the heuristic, confidence and prompt stages"""
+    legacy_keyword_scan(text)
+    # _calculate_confidence and should_use_enhanced_prompt each split
+    return len(text.split()) + len(text.split()) + text.count("?")
+
+
+def timed(function: Callable[[str], object], text: str, repeat: int) -> float:
+    """Mean milliseconds per call"""
+    function(text)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function(text)
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def run(chars: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    text = synthetic_email(chars)
+    raw = synthetic_raw_email(chars)
+    assert legacy_preprocess(raw) == normalize_text(raw)
+    stages = {
+        "keywords": (legacy_keyword_scan, keyword_matcher.match, text),
+        "analysis": (legacy_analysis, Document.from_text, text),
+        "normalize": (legacy_preprocess, normalize_text, raw),
+    }
+    report = {}
+    for stage, (before, after, text) in stages.items():
+        legacy = timed(before, text, repeat)
+        current = timed(after, text, repeat)
+        report[stage] = {
+            "legacy_ms": round(legacy, 4),
+            "current_ms": round(current, 4),
+            "speedup": round(legacy / current, 1),
+        }
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--chars", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=500)
+    parser.add_argument("--json", action="store_true", help="Print a JSON report")
+    args = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+
+    report = run(args.chars, args.repeat)
+    if args.json:
+        print(json.dumps({"chars": args.chars, **report}, indent=2))
+    else:
+        print(f"E-mail sintético de {args.chars} caracteres, {args.repeat} repetições")
+        for stage, numbers in report.items():
+            print(
+                f"  {stage:<10} antes {numbers['legacy_ms']:.4f} ms  "
+                f"agora {numbers['current_ms']:.4f} ms  "
+                f"({numbers['speedup']}x)"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
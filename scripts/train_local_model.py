@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Treina o classificador local (naive Bayes sobre n-gramas com hashing)
+
+Lê corpora JSONL rotulados ({"text", "category"} por linha; por padrão
+app/data/corpus.jsonl e app/data/examples.jsonl), reporta a acurácia por
+validação cruzada e grava o modelo em LOCAL_MODEL_PATH (.npy + .json),
+carregado com memory-map quando PROVIDER=local.
+
+Exemplos:
+    python scripts/train_local_model.py
+    python scripts/train_local_model.py --data emails.jsonl --output models/nb
+    python scripts/train_local_model.py --alpha 0.5 --folds 10 --json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings  # noqa: E402
+from app.services.features import DEFAULT_DIM  # noqa: E402
+from app.services.local_model import (  # noqa: E402
+    DEFAULT_CORPUS_PATHS,
+    DEFAULT_MODEL_PATH,
+    NaiveBayesModel,
+    read_corpus,
+)
+
+
+def cross_validate(texts, labels, folds: int, **params) -> float:
+    """Accuracy of k-fold cross-validation over a fixed shuffle"""
+    order = np.random.default_rng(0).permutation(len(texts))
+    correct = 0
+    for fold in np.array_split(order, folds):
+        held_out = set(fold.tolist())
+        train = [i for i in order if i not in held_out]
+        model = NaiveBayesModel.train(
+            [texts[i] for i in train], [labels[i] for i in train], **params
+        )
+        predicted = model.predict([texts[i] for i in fold])
+        correct += sum(p == labels[i] for p, i in zip(predicted, fold))
+    return correct / len(texts)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--data", nargs="+", type=Path, default=list(DEFAULT_CORPUS_PATHS)
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path(settings.local_model_path or DEFAULT_MODEL_PATH),
+    )
+    parser.add_argument("--alpha", type=float, default=0.1)
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--max-n", type=int, default=2)
+    parser.add_argument("--folds", type=int, default=5, help="0 to skip")
+    parser.add_argument("--json", action="store_true", help="Print a JSON report")
+    args = parser.parse_args(argv)
+
+    texts, labels = read_corpus(*args.data)
+    params = {"dim": args.dim, "alpha": args.alpha, "max_n": args.max_n}
+
+    started = time.perf_counter()
+    model = NaiveBayesModel.train(texts, labels, **params)
+    train_seconds = time.perf_counter() - started
+    counts_path = model.save(args.output)
+
+    report = {
+        "documents": model.documents,
+        "classes": dict(zip(model.classes, model.class_counts.astype(int).tolist())),
+        "version": model.version,
+        "output": str(counts_path),
+        "size_bytes": counts_path.stat().st_size,
+        "train_seconds": round(train_seconds, 3),
+    }
+    if args.folds > 1:
+        report["cv_accuracy"] = round(
+            cross_validate(texts, labels, min(args.folds, len(texts)), **params), 3
+        )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
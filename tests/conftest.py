@@ -1,11 +1,20 @@
 import asyncio
+import inspect
 import logging
+from unittest.mock import patch
 
+import httpx
 import pytest
 from fastapi import FastAPI
 from httpx import AsyncClient
 
-from app.core.auth import User, api_key_auth, get_current_active_user, rate_limit_check
+from app.core.auth import (
+    User,
+    api_key_auth,
+    create_access_token,
+    get_current_active_user,
+    rate_limit_check,
+)
 
 # Importa router e dependências reais
 from app.web.routes import router
@@ -38,6 +47,80 @@ class DummyAIProvider:
         return f"[{tone}] {text.strip()}"
 
 
+@pytest.fixture
+def openai_settings():
+    """Provider OpenAI com chave de teste (o upstream vem de cada teste)"""
+    with (
+        patch("app.services.ai.settings.provider", "OpenAI"),
+        patch("app.services.ai.settings.openai_api_key", "test-key"),
+    ):
+        yield
+
+
+class FakeClock:
+    """Relógio manual: os testes avançam `now` em vez de dormir"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def chat_completion(content: str) -> dict:
+    """Corpo de resposta do chat completions com um único conteúdo"""
+    return {"choices": [{"message": {"content": content}}]}
+
+
+@pytest.fixture
+def mock_upstream():
+    """
+    Fábrica de upstreams OpenAI falsos: mock_upstream(*respostas) devolve
+    (transport, requisições recebidas). Cada resposta atende uma chamada, em
+    ordem, e a última se repete; pode ser um conteúdo (str), um corpo JSON
+    (dict), um httpx.Response, uma exceção a lançar ou uma função
+    (síncrona ou async) do request que devolve qualquer um desses
+    """
+
+    def factory(*responses):
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            item = responses[min(len(calls), len(responses)) - 1]
+            if callable(item) and not isinstance(item, type):
+                item = item(request)
+                if inspect.isawaitable(item):
+                    item = await item
+            if isinstance(item, Exception):
+                raise item
+            if isinstance(item, str):
+                item = chat_completion(item)
+            if isinstance(item, dict):
+                item = httpx.Response(200, json=item)
+            return item
+
+        return httpx.MockTransport(handler), calls
+
+    return factory
+
+
+@pytest.fixture
+def auth_headers():
+    """Cabeçalho Bearer de um token do admin com os escopos pedidos"""
+
+    def headers(scopes):
+        token = create_access_token({"sub": "admin", "scopes": scopes})
+        return {"Authorization": f"Bearer {token}"}
+
+    return headers
+
+
 @pytest.fixture(scope="session")
 def test_app() -> FastAPI:
     app = FastAPI(title="Test Email Classifier")
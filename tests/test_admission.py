@@ -0,0 +1,215 @@
+"""
+Testes do controle de admissão upstream (limite AIMD e ritmo RPM/TPM)
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from app.services.admission import (
+    OVERLOAD,
+    SUCCESS,
+    AdmissionController,
+    AdmissionRejected,
+    AIMDLimit,
+    TokenBucket,
+)
+from app.services.ai import AIProvider
+
+OK = {"choices": [{"message": {"content": "Resposta gerada"}}]}
+
+
+class TestTokenBucket:
+    def test_paces_beyond_burst(self, clock):
+        bucket = TokenBucket(60, burst=2, clock=clock)  # 1 por segundo
+
+        assert bucket.reserve(1) == 0.0
+        assert bucket.reserve(1) == 0.0
+        assert bucket.reserve(1) == pytest.approx(1.0)
+        assert bucket.reserve(1) == pytest.approx(2.0)
+
+    def test_refills_over_time_up_to_capacity(self, clock):
+        bucket = TokenBucket(600, burst=5, clock=clock)
+        bucket.reserve(5)
+        clock.now += 0.3
+        assert bucket.available == pytest.approx(3.0)
+        clock.now += 60
+        assert bucket.available == 5
+
+    def test_refund(self, clock):
+        bucket = TokenBucket(60, burst=1, clock=clock)
+        bucket.reserve(3)
+        bucket.refund(3)
+        assert bucket.available == 1
+
+
+class TestAIMDLimit:
+    def test_multiplicative_decrease(self):
+        limit = AIMDLimit(initial=10, minimum=2, backoff=0.5)
+        limit.on_outcome(OVERLOAD, in_flight=5)
+        assert limit.current == 5
+        for _ in range(5):
+            limit.on_outcome(OVERLOAD, in_flight=0)
+        assert limit.current == 2
+
+    def test_additive_increase_only_when_saturated(self):
+        limit = AIMDLimit(initial=4, maximum=5)
+        limit.on_outcome(SUCCESS, in_flight=0)
+        assert limit.value == 4
+        for _ in range(20):
+            limit.on_outcome(SUCCESS, in_flight=limit.current)
+        assert limit.current == 5
+
+
+class TestAdmissionController:
+    @pytest.mark.asyncio
+    async def test_queues_beyond_limit_and_hands_over_slots(self):
+        controller = AdmissionController(AIMDLimit(initial=2), queue_timeout=1.0)
+        await controller.acquire()
+        await controller.acquire()
+        waiting = [asyncio.create_task(controller.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        stats = controller.stats()
+        assert (stats["in_flight"], stats["queued"], stats["limit"]) == (2, 2, 2)
+
+        controller.release(SUCCESS)
+        await asyncio.wait_for(waiting[0], timeout=1.0)
+        assert not waiting[1].done()
+        assert controller.stats()["in_flight"] == 2
+
+        controller.release(SUCCESS)
+        await asyncio.gather(*waiting)
+        assert controller.stats()["queued"] == 0
+
+    @pytest.mark.asyncio
+    async def test_queue_bound_rejects(self):
+        controller = AdmissionController(AIMDLimit(initial=1), max_queue=1)
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire()
+        assert controller.stats()["rejected_queue_full"] == 1
+
+        controller.release()
+        await waiter
+
+    @pytest.mark.asyncio
+    async def test_queue_time_budget_rejects(self):
+        controller = AdmissionController(AIMDLimit(initial=1), queue_timeout=5.0)
+        await controller.acquire()
+
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire(budget=0.01)
+
+        stats = controller.stats()
+        assert stats["rejected_timeout"] == 1
+        assert stats["queued"] == 0
+        assert stats["in_flight"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_leaves_queue(self):
+        controller = AdmissionController(AIMDLimit(initial=1))
+        await controller.acquire()
+        waiter = asyncio.create_task(controller.acquire())
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        controller.release()
+
+        assert controller.stats()["in_flight"] == 0
+        assert controller.stats()["queued"] == 0
+
+    @pytest.mark.asyncio
+    async def test_rpm_pacing_sleeps_then_admits(self):
+        controller = AdmissionController(
+            AIMDLimit(initial=10), rpm=TokenBucket(60, burst=1), queue_timeout=5.0
+        )
+        with patch(
+            "app.services.admission.asyncio.sleep", new_callable=AsyncMock
+        ) as sleep:
+            await controller.acquire()
+            await controller.acquire()
+
+        sleep.assert_awaited_once()
+        assert sleep.await_args.args[0] == pytest.approx(1.0, abs=0.01)
+        assert controller.stats()["paced"] == 1
+
+    @pytest.mark.asyncio
+    async def test_tpm_pacing_beyond_budget_rejects_and_refunds(self):
+        controller = AdmissionController(
+            AIMDLimit(initial=10), tpm=TokenBucket(600, burst=100), queue_timeout=1.0
+        )
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire(tokens=500)  # 40s de espera > 1s de orçamento
+
+        assert controller.stats()["in_flight"] == 0
+        assert controller.tpm.available == pytest.approx(100, abs=1)
+
+
+class TestProviderAdmission:
+    @pytest.mark.asyncio
+    async def test_concurrency_is_bounded_by_limit(self, openai_settings):
+        active = {"now": 0, "max": 0}
+
+        async def handler(request):
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+            await asyncio.sleep(0.01)
+            active["now"] -= 1
+            return httpx.Response(200, json=OK)
+
+        provider = AIProvider(transport=httpx.MockTransport(handler))
+        provider.admission = AdmissionController(
+            AIMDLimit(initial=2, maximum=2), queue_timeout=5.0
+        )
+
+        replies = await asyncio.gather(
+            *(
+                provider.generate_reply(f"Texto {i}", "Produtivo", "formal")
+                for i in range(6)
+            )
+        )
+
+        assert replies == ["Resposta gerada"] * 6
+        assert active["max"] == 2
+        stats = provider.metrics()["admission"]
+        assert stats["admitted"] == 6
+        assert stats["queued_total"] >= 4
+        assert stats["in_flight"] == 0
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_rate_limited_responses_shrink_the_limit(
+        self, openai_settings, mock_upstream
+    ):
+        transport, _ = mock_upstream(httpx.Response(429))
+        provider = AIProvider(transport=transport)
+        provider.admission = AdmissionController(AIMDLimit(initial=8, backoff=0.5))
+        provider.retry_policy.max_attempts = 1
+
+        with patch("app.services.ai.settings.circuit_breaker_enabled", False):
+            await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert provider.metrics()["admission"]["limit"] == 4
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_rejected_admission_falls_back(self, openai_settings, mock_upstream):
+        transport, calls = mock_upstream(OK)
+        provider = AIProvider(transport=transport)
+        provider.admission = AdmissionController(AIMDLimit(initial=1), max_queue=0)
+        await provider.admission.acquire()  # ocupa o único slot
+
+        reply = await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert calls == []
+        assert reply == provider._generate_reply_fallback("Produtivo", "formal")
+        provider.admission.release()
+        await provider.aclose()
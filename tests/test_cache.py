@@ -0,0 +1,134 @@
+"""
+Testes do cache de resultados de classificação
+"""
+
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.ai import AIProvider
+from app.services.cache import ClassificationCache, canonicalize_text, make_cache_key
+from main import app
+
+client = TestClient(app)
+
+
+class TestClassificationCache:
+    def test_canonical_key_ignores_case_and_whitespace(self):
+        assert canonicalize_text("  Preciso   de\nAJUDA ") == "preciso de ajuda"
+        assert make_cache_key("Preciso de  ajuda", "v1") == make_cache_key(
+            "preciso de ajuda", "v1"
+        )
+        assert make_cache_key("preciso de ajuda", "v1") != make_cache_key(
+            "preciso de ajuda", "v2"
+        )
+
+    def test_hit_miss_counters_and_copy_semantics(self):
+        cache = ClassificationCache(max_entries=10, max_bytes=10_000, ttl_seconds=60)
+        assert cache.get("k") is None
+
+        cache.set("k", {"category": "Produtivo", "meta": {}})
+        value = cache.get("k")
+        value["meta"]["cached"] = True
+
+        assert cache.get("k") == {"category": "Produtivo", "meta": {}}
+        assert cache.stats()["hits"] == 2
+        assert cache.stats()["misses"] == 1
+
+    def test_lru_eviction_by_entries(self):
+        cache = ClassificationCache(max_entries=2, max_bytes=10_000, ttl_seconds=60)
+        cache.set("a", {"v": 1})
+        cache.set("b", {"v": 2})
+        cache.get("a")
+        cache.set("c", {"v": 3})
+
+        assert cache.get("b") is None
+        assert cache.get("a") == {"v": 1}
+        assert cache.stats()["evictions"] == 1
+
+    def test_eviction_by_bytes(self):
+        cache = ClassificationCache(max_entries=100, max_bytes=200, ttl_seconds=60)
+        for i in range(10):
+            cache.set(f"key-{i}", {"rationale": "x" * 40})
+
+        assert cache.stats()["bytes"] <= 200
+        assert cache.stats()["evictions"] > 0
+        assert cache.get("key-9") is not None
+
+    def test_ttl_expiration(self):
+        cache = ClassificationCache(max_entries=10, max_bytes=10_000, ttl_seconds=5)
+        with patch("app.services.cache.time.monotonic", return_value=100.0):
+            cache.set("k", {"v": 1})
+        with patch("app.services.cache.time.monotonic", return_value=106.0):
+            assert cache.get("k") is None
+        assert cache.stats()["expirations"] == 1
+        assert len(cache) == 0
+
+
+class TestAIProviderCache:
+    @pytest.fixture
+    def upstream(self, openai_settings, mock_upstream):
+        return mock_upstream(
+            '{"category": "Produtivo", "rationale": "Pedido de suporte"}'
+        )
+
+    @pytest.mark.asyncio
+    async def test_repeated_text_served_from_cache(self, upstream):
+        transport, calls = upstream
+        provider = AIProvider(transport=transport)
+
+        first = await provider.classify("Preciso de suporte no sistema")
+        second = await provider.classify("preciso de  suporte no sistema")
+
+        assert len(calls) == 1
+        assert "cached" not in first["meta"]
+        assert second["meta"]["cached"] is True
+        assert second["category"] == first["category"]
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_model_change_invalidates_entries(self, upstream):
+        transport, calls = upstream
+        provider = AIProvider(transport=transport)
+
+        await provider.classify("Preciso de suporte no sistema")
+        with patch("app.services.ai.settings.model_name", "gpt-4o"):
+            await provider.classify("Preciso de suporte no sistema")
+
+        assert len(calls) == 2
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_fallback_results_not_cached(self):
+        with (
+            patch("app.services.ai.settings.provider", "OpenAI"),
+            patch("app.services.ai.settings.openai_api_key", None),
+        ):
+            provider = AIProvider()
+            result = await provider.classify("Preciso de suporte no sistema")
+
+        assert result["meta"]["fallback"] is True
+        assert len(provider.cache) == 0
+
+
+class TestAdminCacheEndpoints:
+    def test_requires_admin_scope(self, auth_headers):
+        response = client.get(
+            "/api/admin/cache", headers=auth_headers(["classify:read"])
+        )
+        assert response.status_code == 403
+
+    def test_inspect_and_flush(self, auth_headers):
+        from app.services.ai import ai_provider
+
+        ai_provider.cache.set("some-key", {"category": "Produtivo"})
+        headers = auth_headers(["admin"])
+
+        stats = client.get("/api/admin/cache", headers=headers).json()
+        assert stats["entries"] >= 1
+        assert "hit_rate" in stats
+
+        flushed = client.delete("/api/admin/cache", headers=headers).json()
+        assert flushed["flushed"] >= 1
+        assert len(ai_provider.cache) == 0
@@ -0,0 +1,92 @@
+"""
+Testes da cascata heurística -> LLM guiada por confiança
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from app.services.ai import AIProvider
+
+
+@pytest.fixture
+def upstream(openai_settings, mock_upstream):
+    with (
+        patch("app.services.ai.settings.cascade_enabled", True),
+        patch("app.services.ai.settings.confidence_threshold", 0.7),
+    ):
+        yield mock_upstream(
+            '{"category": "Produtivo", "rationale": "Requer análise do time"}'
+        )
+
+
+class TestCascade:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "text, category",
+        [
+            ("Parabéns pelo excelente trabalho, equipe!", "Improdutivo"),
+            ("Erro no sistema, não consigo fazer login", "Produtivo"),
+        ],
+    )
+    async def test_obvious_emails_answered_locally(self, upstream, text, category):
+        transport, calls = upstream
+        provider = AIProvider(transport=transport)
+
+        result = await provider.classify(text)
+
+        assert calls == []
+        assert result["category"] == category
+        assert result["meta"]["tier"] == "heuristic"
+        assert result["meta"]["fallback"] is False
+        assert result["confidence"] >= 0.7
+
+    @pytest.mark.asyncio
+    async def test_ambiguous_emails_escalate_to_llm(self, upstream):
+        transport, calls = upstream
+        provider = AIProvider(transport=transport)
+
+        result = await provider.classify("Olá, tudo bem com vocês por aí?")
+
+        assert len(calls) == 1
+        assert result["meta"]["tier"] == "llm"
+        assert provider.metrics()["tiers"]["llm"] == 1
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_threshold_controls_escalation(self, upstream):
+        transport, calls = upstream
+        provider = AIProvider(transport=transport)
+
+        with patch("app.services.ai.settings.confidence_threshold", 0.95):
+            result = await provider.classify("Erro no sistema, não consigo fazer login")
+
+        assert len(calls) == 1
+        assert result["meta"]["tier"] == "llm"
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self, upstream):
+        transport, calls = upstream
+        provider = AIProvider(transport=transport)
+
+        with patch("app.services.ai.settings.cascade_enabled", False):
+            await provider.classify("Parabéns pelo excelente trabalho, equipe!")
+
+        assert len(calls) == 1
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_combined_mode_skips_upstream_classification(self, upstream):
+        transport, calls = upstream
+        provider = AIProvider(transport=transport)
+
+        with patch("app.services.ai.settings.classify_reply_mode", "combined"):
+            classification, _ = await provider.classify_and_reply(
+                "Parabéns pelo excelente trabalho, equipe!", "neutro"
+            )
+
+        # Only the reply goes upstream
+        assert len(calls) == 1
+        assert classification["meta"]["tier"] == "heuristic"
+        await provider.aclose()
@@ -0,0 +1,172 @@
+"""
+Testes do circuit breaker em torno do upstream OpenAI
+"""
+
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.ai import AIProvider
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+def _default_url(provider):
+    return provider.endpoints.endpoints[0].url
+
+
+def _breaker(clock, **overrides):
+    options = dict(
+        window_seconds=10,
+        min_requests=4,
+        error_rate_threshold=0.5,
+        slow_call_seconds=2.0,
+        slow_call_rate_threshold=0.5,
+        open_seconds=5,
+        half_open_probes=2,
+        clock=clock,
+    )
+    options.update(overrides)
+    return CircuitBreaker("test", **options)
+
+
+class TestCircuitBreakerStates:
+    def test_opens_on_error_rate(self, clock):
+        breaker = _breaker(clock)
+
+        for ok in (True, False, True, False):
+            assert breaker.allow_request()
+            breaker.record(ok, 0.1)
+
+        assert breaker.state == OPEN
+        assert breaker.allow_request() is False
+        assert breaker.stats()["rejected"] == 1
+
+    def test_needs_minimum_requests(self, clock):
+        breaker = _breaker(clock)
+        for _ in range(3):
+            breaker.record(False, 0.1)
+        assert breaker.state == CLOSED
+
+    def test_opens_on_slow_calls(self, clock):
+        breaker = _breaker(clock)
+        for _ in range(4):
+            breaker.record(True, 3.0)
+        assert breaker.state == OPEN
+
+    def test_old_outcomes_leave_the_window(self, clock):
+        breaker = _breaker(clock)
+        breaker.record(False, 0.1)
+        breaker.record(False, 0.1)
+        clock.now += 11
+        breaker.record(True, 0.1)
+        breaker.record(True, 0.1)
+        assert breaker.state == CLOSED
+
+    def test_half_open_admits_limited_probes_then_closes(self, clock):
+        breaker = _breaker(clock)
+        for _ in range(4):
+            breaker.record(False, 0.1)
+        clock.now += 5
+
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow_request()
+        assert breaker.allow_request()
+        assert breaker.allow_request() is False
+
+        breaker.record(True, 0.1)
+        breaker.record(True, 0.1)
+        assert breaker.state == CLOSED
+
+    def test_failed_probe_reopens(self, clock):
+        breaker = _breaker(clock)
+        for _ in range(4):
+            breaker.record(False, 0.1)
+        clock.now += 5
+
+        assert breaker.allow_request()
+        breaker.record(False, 0.1)
+        assert breaker.state == OPEN
+        assert breaker.stats()["times_opened"] == 2
+
+    def test_cancelled_probe_releases_slot(self, clock):
+        breaker = _breaker(clock, half_open_probes=1)
+        for _ in range(4):
+            breaker.record(False, 0.1)
+        clock.now += 5
+
+        assert breaker.allow_request()
+        breaker.record(None, 0.1)
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow_request()
+
+
+class TestProviderCircuitBreaker:
+    @pytest.fixture
+    def failing_upstream(self, openai_settings, mock_upstream):
+        with (
+            patch("app.services.ai.settings.circuit_breaker_min_requests", 3),
+            patch("app.services.ai.settings.retry_max_attempts", 1),
+        ):
+            yield mock_upstream(
+                httpx.Response(503, json={"error": {"message": "overloaded"}})
+            )
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_falls_back_without_upstream_call(
+        self, failing_upstream
+    ):
+        transport, calls = failing_upstream
+        provider = AIProvider(transport=transport)
+
+        for i in range(3):
+            await provider.classify(f"Preciso de suporte no sistema {i}")
+        assert len(calls) == 3
+        assert provider.breaker_states()[_default_url(provider)] == OPEN
+
+        started = time.perf_counter()
+        result = await provider.classify("Erro no sistema de faturamento")
+        elapsed = time.perf_counter() - started
+
+        assert len(calls) == 3
+        assert result["meta"]["fallback"] is True
+        assert elapsed < 0.05
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_client_errors_do_not_trip_the_breaker(
+        self, openai_settings, mock_upstream
+    ):
+        transport, _ = mock_upstream(
+            httpx.Response(400, json={"error": {"message": "bad request"}})
+        )
+        with (
+            patch("app.services.ai.settings.circuit_breaker_min_requests", 3),
+            patch("app.services.ai.settings.retry_max_attempts", 1),
+        ):
+            provider = AIProvider(transport=transport)
+            for i in range(5):
+                await provider.classify(f"Texto {i} para classificar")
+
+        assert provider.breaker_states()[_default_url(provider)] == CLOSED
+        await provider.aclose()
+
+
+class TestHealthBreakerState:
+    def test_health_reports_open_breaker_as_degraded(self):
+        from app.services.ai import ai_provider
+        from main import app
+
+        breaker = ai_provider._breaker("https://upstream.test")
+        try:
+            with TestClient(app) as client:
+                assert client.get("/health").json()["status"] == "ok"
+                breaker._trip()
+                data = client.get("/health").json()
+        finally:
+            del ai_provider._breakers["https://upstream.test"]
+
+        assert data["status"] == "degraded"
+        assert data["circuit_breakers"]["https://upstream.test"] == OPEN
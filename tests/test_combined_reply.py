@@ -0,0 +1,150 @@
+"""
+Testes do modo combinado (classificação + resposta em uma única chamada)
+"""
+
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.services.ai import AIProvider, _parse_combined_response
+from app.services.prompt_templates import PromptTemplates
+
+COMBINED = json.dumps(
+    {
+        "category": "Produtivo",
+        "rationale": "Problema de acesso requer suporte",
+        "reply": "Prezado(a),\nRecebemos sua solicitação e retornaremos em 24h.",
+    }
+)
+CLASSIFICATION = '{"category": "Produtivo", "rationale": "Pedido de suporte"}'
+TEMPLATED = (
+    "Não consigo acessar o sistema desde ontem, o chamado {} continua aberto "
+    "e preciso de retorno sobre o andamento da análise"
+)
+
+
+class TestCombinedPrompt:
+    def test_prompt_asks_for_all_fields(self):
+        prompt = PromptTemplates.get_combined_classification_reply_prompt(
+            "Não consigo acessar o sistema", "formal"
+        )
+        assert '"reply"' in prompt
+        assert '"category"' in prompt
+        assert "Prezado(a)" in prompt
+        assert "Não consigo acessar o sistema" in prompt
+
+    def test_parse_valid_response_with_markdown(self):
+        parsed = _parse_combined_response(f"```json\n{COMBINED}\n```")
+        assert parsed["category"] == "Produtivo"
+        assert parsed["reply"].startswith("Prezado(a)")
+
+    @pytest.mark.parametrize(
+        "content",
+        [
+            "not json",
+            '["Produtivo"]',
+            '{"category": "Talvez", "rationale": "x", "reply": "y"}',
+            '{"category": "Produtivo", "rationale": "x"}',
+            '{"category": "Produtivo", "rationale": "x", "reply": "   "}',
+        ],
+    )
+    def test_parse_rejects_invalid_responses(self, content):
+        with pytest.raises(ValueError):
+            _parse_combined_response(content)
+
+
+class TestClassifyAndReply:
+    @pytest.mark.asyncio
+    async def test_combined_mode_uses_one_round_trip(
+        self, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(COMBINED)
+        provider = AIProvider(transport=transport)
+
+        with patch("app.services.ai.settings.classify_reply_mode", "combined"):
+            classification, reply = await provider.classify_and_reply(
+                "Não consigo acessar o sistema", "formal"
+            )
+
+        assert len(calls) == 1
+        assert classification["category"] == "Produtivo"
+        assert classification["meta"]["mode"] == "combined"
+        assert 0 < classification["confidence"] <= 1
+        assert "24h" in reply
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_combined_result_fills_classification_cache(
+        self, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(COMBINED)
+        provider = AIProvider(transport=transport)
+
+        with patch("app.services.ai.settings.classify_reply_mode", "combined"):
+            await provider.classify_and_reply("Não consigo acessar", "formal")
+        result = await provider.classify("Não consigo acessar")
+
+        assert len(calls) == 1
+        assert result["meta"]["cached"] is True
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_combined_mode_shares_tier_accounting(
+        self, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(COMBINED, "Resposta gerada")
+        provider = AIProvider(transport=transport)
+
+        with (
+            patch("app.services.ai.settings.classify_reply_mode", "combined"),
+            patch.object(
+                provider, "_classify_local", wraps=provider._classify_local
+            ) as classify_local,
+        ):
+            await provider.classify_and_reply(TEMPLATED.format(123), "formal")
+            # Quase idêntico: servido pelo índice de quase-duplicatas
+            classification, reply = await provider.classify_and_reply(
+                TEMPLATED.format(456), "formal"
+            )
+
+        assert classify_local.call_count == 1
+        assert classification["meta"]["tier"] == "near_duplicate"
+        assert reply == "Resposta gerada"
+        assert len(calls) == 2
+        assert provider.tier_counts["llm"] == 1
+        assert provider.tier_counts["near_duplicate"] == 1
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_invalid_combined_response_falls_back_to_two_calls(
+        self, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(
+            '{"category": "Produtivo"}', CLASSIFICATION, "Resposta gerada"
+        )
+        provider = AIProvider(transport=transport)
+
+        with patch("app.services.ai.settings.classify_reply_mode", "combined"):
+            classification, reply = await provider.classify_and_reply(
+                "Não consigo acessar o sistema", "neutro"
+            )
+
+        assert len(calls) == 3
+        assert classification["rationale"] == "Pedido de suporte"
+        assert reply == "Resposta gerada"
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_separate_mode_makes_two_calls(self, openai_settings, mock_upstream):
+        transport, calls = mock_upstream(CLASSIFICATION, "Resposta gerada")
+        provider = AIProvider(transport=transport)
+
+        classification, reply = await provider.classify_and_reply(
+            "Não consigo acessar o sistema", "neutro"
+        )
+
+        assert len(calls) == 2
+        assert "mode" not in classification["meta"]
+        assert reply == "Resposta gerada"
+        await provider.aclose()
@@ -0,0 +1,135 @@
+"""
+Testes da compressão extrativa de e-mails longos
+"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.compression import (
+    MAX_SENTENCE_CHARS,
+    compress,
+    score_sentences,
+    split_sentences,
+)
+from app.services.features import folded_words
+from app.services.nlp import PreprocessingStats, preprocess_document
+from app.services.tokens import estimate_tokens
+from main import app
+
+client = TestClient(app)
+
+REQUEST = (
+    "Bom dia. Preciso de suporte urgente: o sistema de faturamento está com "
+    "erro no login desde ontem. Qual o prazo para correção?"
+)
+FILLER = "Segue o histórico da conversa com a equipe comercial sobre o contrato."
+CLOSING = "Aguardo retorno sobre o chamado 4821."
+
+
+def _long_email(repeat=200):
+    history = " ".join(f"{FILLER[:-1]} número {i}." for i in range(repeat))
+    return f"{REQUEST} {history} {CLOSING}"
+
+
+def test_split_sentences_bounds_length():
+    sentences = split_sentences("Primeira frase. Segunda? " + "palavra " * 200)
+    assert sentences[:2] == ["Primeira frase.", "Segunda?"]
+    assert all(len(sentence) <= MAX_SENTENCE_CHARS for sentence in sentences)
+    assert split_sentences("") == []
+
+
+def test_scores_favor_keywords_questions_and_novelty():
+    sentences = [
+        "O tempo hoje está agradável.",
+        "Preciso de suporte urgente com o erro no sistema.",
+        "O tempo hoje está agradável.",
+        "Qual o prazo?",
+    ]
+    scores = score_sentences(
+        [folded_words(sentence) for sentence in sentences],
+        np.array([sentence.endswith("?") for sentence in sentences], float),
+    )
+    assert scores[1] > scores[0]
+    # Repetição sem palavras novas nunca é escolhida
+    assert np.isneginf(scores[2])
+    assert scores[3] > scores[0]
+
+
+def test_keeps_relevant_sentences_in_order_within_budget():
+    text = _long_email()
+    compressed = compress(text, 500)
+    assert len(compressed.text) <= 500
+    assert compressed.text.startswith(REQUEST)
+    assert compressed.text.endswith(CLOSING)
+    assert compressed.kept_sentences < compressed.sentences
+    assert compressed.ratio == round(len(compressed.text) / len(text), 4)
+
+
+def test_token_budget():
+    compressed = compress(_long_email(), 5000, max_tokens=80)
+    assert estimate_tokens(compressed.text) <= 80
+    assert "suporte urgente" in compressed.text
+
+
+def test_short_text_is_unchanged():
+    compressed = compress(REQUEST, 5000)
+    assert compressed.text == REQUEST
+    assert compressed.stats()["ratio"] == 1.0
+
+
+def test_unsplittable_text_falls_back_to_opening():
+    compressed = compress("!" * 600, 100)
+    assert compressed.text == "!" * 100
+    assert compressed.kept_sentences == 0
+
+
+class TestPreprocessing:
+    def test_long_email_is_compressed_to_the_limit(self):
+        text = _long_email()
+        with patch("app.services.nlp.settings.max_input_chars", 1000):
+            document = preprocess_document(text)
+        assert len(document.text) <= 1000
+        compression = document.preprocessing["compression"]
+        assert compression["original_chars"] > 1000
+        assert compression["compressed_chars"] == len(document.text)
+
+    def test_disabled_setting_keeps_text(self):
+        text = _long_email()
+        with (
+            patch("app.services.nlp.settings.max_input_chars", 1000),
+            patch("app.services.nlp.settings.compression_enabled", False),
+        ):
+            document = preprocess_document(text)
+        assert len(document.text) > 1000
+        assert "compression" not in document.preprocessing
+
+    def test_stats_report_ratio(self):
+        stats = PreprocessingStats()
+        stats.record_compression(compress(_long_email(), 1000))
+        summary = stats.stats()
+        assert summary["compressed_requests"] == 1
+        assert 0 < summary["compression_ratio"] < 1
+
+
+class TestRoutes:
+    def test_long_email_is_classified_with_ratio_in_meta(self):
+        text = _long_email()
+        assert len(text) > 5000
+        with patch("app.services.ai.settings.classification_cache_enabled", False):
+            response = client.post("/classify", data={"text": text, "tone": "neutro"})
+        assert response.status_code == 200
+        compression = response.json()["meta"]["preprocessing"]["compression"]
+        assert compression["compressed_chars"] <= 5000
+        assert compression["ratio"] < 1
+
+    @pytest.mark.parametrize("enabled, length", [(True, 100_001), (False, 5001)])
+    def test_limit_still_rejects(self, enabled, length):
+        with patch("app.web.routes.settings.compression_enabled", enabled):
+            response = client.post(
+                "/classify", data={"text": "a" * length, "tone": "neutro"}
+            )
+        assert response.status_code == 400
+        assert "limite" in response.json()["detail"]
@@ -0,0 +1,137 @@
+"""
+Testes do deadline ponta a ponta por requisição (contextvars)
+"""
+
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import deadline
+from app.services.ai import AIProvider, ai_provider
+from app.services.nlp import clean_text, preprocess_text
+from main import app
+
+client = TestClient(app)
+
+OK = {"choices": [{"message": {"content": "Resposta gerada"}}]}
+
+
+@pytest.fixture(autouse=True)
+def _clear_deadline():
+    yield
+    deadline.clear_deadline()
+
+
+class TestDeadlineContext:
+    def test_no_deadline_by_default(self):
+        assert deadline.remaining() is None
+        assert not deadline.expired()
+
+    def test_remaining_and_expired(self):
+        deadline.start_deadline(5.0)
+        assert 4.5 < deadline.remaining() <= 5.0
+        deadline.start_deadline(0.0)
+        assert deadline.expired()
+
+    @pytest.mark.parametrize(
+        "value, expected",
+        [(None, 55.0), ("2.5", 2.5), ("120", 55.0), ("abc", 55.0), ("-1", 55.0)],
+    )
+    def test_client_header_can_only_shorten(self, value, expected):
+        assert deadline.parse_timeout_header(value, 55.0) == expected
+
+
+class TestProviderDeadline:
+    @pytest.mark.asyncio
+    async def test_timeout_is_capped_by_remaining_budget(
+        self, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(OK)
+        provider = AIProvider(transport=transport)
+
+        deadline.start_deadline(5.0)
+        reply = await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert reply == "Resposta gerada"
+        assert 0 < calls[0].extensions["timeout"]["read"] <= 5.0
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_short_budget_degrades_to_template(
+        self, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(OK)
+        provider = AIProvider(transport=transport)
+
+        deadline.start_deadline(0.2)  # abaixo da latência esperada (1s)
+        reply = await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert calls == []
+        assert reply == provider._generate_reply_fallback("Produtivo", "formal")
+        assert provider.metrics()["deadline"]["degraded"] == 1
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_short_budget_degrades_to_heuristic(
+        self, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(OK)
+        provider = AIProvider(transport=transport)
+
+        deadline.start_deadline(0.2)
+        result = await provider.classify("Preciso de suporte urgente no sistema")
+
+        assert calls == []
+        assert result["meta"]["model"] == "heuristic_fallback"
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_expected_latency_learned_from_observed_calls(
+        self, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(OK)
+        provider = AIProvider(transport=transport)
+        for _ in range(provider.hedging.min_samples):
+            provider.hedging.tracker.record(0.01)
+
+        deadline.start_deadline(0.2)
+        reply = await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert reply == "Resposta gerada"
+        assert len(calls) == 1
+        await provider.aclose()
+
+
+class TestStagesDeadline:
+    def test_preprocess_skips_extra_pass_when_expired(self):
+        text = "Olá!! Preciso de ajuda @ sistema #123"
+        deadline.start_deadline(0.0)
+        assert preprocess_text(text) == clean_text(text)
+
+    def test_route_sets_deadline_from_header(self):
+        seen = {}
+
+        async def fake_classify_and_reply(text, tone):
+            seen["remaining"] = deadline.remaining()
+            return (
+                {
+                    "category": "Produtivo",
+                    "confidence": 0.9,
+                    "rationale": "ok",
+                    "meta": {"model": "mock", "cost": 0.0},
+                },
+                "Resposta",
+            )
+
+        with patch.object(ai_provider, "classify_and_reply", fake_classify_and_reply):
+            started = time.monotonic()
+            response = client.post(
+                "/classify",
+                data={"text": "Preciso de suporte no sistema"},
+                headers={"X-Request-Timeout": "3"},
+            )
+
+        assert response.status_code == 200
+        assert 0 < seen["remaining"] <= 3.0 - (time.monotonic() - started) + 0.01
@@ -0,0 +1,70 @@
+"""
+Testes da análise única do documento por requisição
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from app.services.document import Document, analyze, clear_document, use_document
+from app.services.heuristics import classify_heuristic
+from app.services.keywords import PRODUCTIVE
+from app.services.nlp import preprocess_document, preprocess_text
+from app.services.prompt_templates import prompt_optimizer
+
+EMAIL = "Qual o status do chamado 4821? O acesso está urgente. Há previsão?"
+
+
+@pytest.fixture(autouse=True)
+def no_current_document():
+    clear_document()
+    yield
+    clear_document()
+
+
+class TestDocument:
+    def test_single_pass_fields(self):
+        document = Document.from_text(EMAIL)
+
+        assert document.tokens[:4] == ("qual", "o", "status", "do")
+        assert document.word_count == 12
+        assert document.question_count == 2
+        assert document.technical and document.urgent
+        assert document.hits.terms(PRODUCTIVE) == [
+            "status",
+            "chamado",
+            "urgente",
+            "acesso",
+        ]
+        start, end = document.spans[8]
+        assert EMAIL[start:end] == "está"
+
+    def test_empty_text(self):
+        document = Document.from_text("")
+        assert document.word_count == 0 and not document.urgent
+        assert document.spans == []
+
+
+class TestRequestDocument:
+    def test_preprocess_publishes_the_analysis(self):
+        expected = preprocess_text("De: ana@x.com\n" + EMAIL)
+        document = preprocess_document("De: ana@x.com\n" + EMAIL)
+
+        assert document.text == expected == EMAIL
+        assert analyze(expected) is document
+
+    def test_other_texts_are_analyzed_without_replacing_it(self):
+        document = use_document(Document.from_text(EMAIL))
+
+        other = analyze("Obrigado pela ajuda")
+        assert other is not document
+        assert analyze(EMAIL) is document
+
+    def test_stages_read_the_published_analysis(self):
+        text = preprocess_text(EMAIL)
+        with patch(
+            "app.services.document.Document.from_text",
+            side_effect=AssertionError("text analyzed twice"),
+        ):
+            classify_heuristic(text)
+            prompt_optimizer.should_use_enhanced_prompt(text)
@@ -0,0 +1,357 @@
+"""
+Testes do roteamento entre múltiplos endpoints OpenAI-compatíveis
+(failover, latência EWMA, limite de concorrência por endpoint)
+"""
+
+import asyncio
+import time
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.services.admission import AdmissionRejected
+from app.services.ai import AIProvider
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.endpoints import (
+    LATENCY,
+    PRIORITY,
+    Endpoint,
+    EndpointRegistry,
+    EndpointSaturated,
+    NoEndpointAvailable,
+)
+from app.testing.fake_openai import (
+    FakeOpenAIConfig,
+    HostRoutingTransport,
+    create_fake_openai_app,
+)
+
+ENDPOINTS = [
+    {"name": "primary", "base_url": "http://primary/v1"},
+    {"name": "secondary", "base_url": "http://secondary/v1"},
+]
+
+
+def _registry(*specs):
+    registry = EndpointRegistry()
+    registry.configure(list(specs) or ENDPOINTS)
+    return registry
+
+
+def _fake(latency_ms=0, **config):
+    return create_fake_openai_app(
+        FakeOpenAIConfig(latency_ms=latency_ms, seed=3, **config)
+    )
+
+
+@pytest.fixture
+def routed_settings():
+    """Aplica provider/endpoints nos settings até o fim do teste"""
+    with ExitStack() as stack:
+
+        def configure(provider="OpenAI", endpoints=ENDPOINTS):
+            for name, value in (
+                ("provider", provider),
+                ("openai_api_key", "test-key"),
+                ("openai_endpoints", endpoints),
+                ("classification_cache_enabled", False),
+            ):
+                stack.enter_context(patch(f"app.services.ai.settings.{name}", value))
+
+        yield configure
+
+
+def _provider(primary, secondary):
+    transport = HostRoutingTransport({"primary": primary, "secondary": secondary})
+    return AIProvider(transport=transport)
+
+
+class TestEndpointRegistry:
+    def test_priority_keeps_configured_order(self):
+        registry = _registry()
+        assert registry.choose(PRIORITY).name == "primary"
+
+        primary = registry.endpoints[0]
+        primary.finish(False, 0.1)
+        assert registry.choose(PRIORITY).name == "secondary"
+
+    def test_latency_explores_then_prefers_fastest(self):
+        registry = _registry()
+        primary, secondary = registry.endpoints
+        primary.finish(True, 0.2)
+        assert registry.choose(LATENCY) is secondary  # ainda sem medida
+
+        secondary.finish(True, 0.05)
+        assert registry.choose(LATENCY) is secondary
+
+        # Carga atual entra no custo esperado
+        secondary.in_flight = 5
+        assert registry.choose(LATENCY) is primary
+
+    def test_ewma_smooths_latency(self):
+        endpoint = Endpoint("a", "http://a/v1", alpha=0.5)
+        endpoint.finish(True, 0.1)
+        endpoint.finish(True, 0.3)
+        assert endpoint.ewma == pytest.approx(0.2)
+        endpoint.finish(None, 5.0)  # cancelada: não conta
+        assert endpoint.ewma == pytest.approx(0.2)
+
+    def test_concurrency_cap_and_open_circuits(self):
+        registry = _registry(
+            {"name": "primary", "base_url": "http://primary/v1", "max_concurrency": 1},
+            {"name": "secondary", "base_url": "http://secondary/v1"},
+        )
+        primary, secondary = registry.endpoints
+        primary.start()
+        assert registry.choose(PRIORITY) is secondary
+
+        # Limite de concorrência não é circuito aberto: espera-se por vaga
+        with pytest.raises(EndpointSaturated):
+            registry.choose(PRIORITY, is_open=lambda endpoint: endpoint is secondary)
+        with pytest.raises(EndpointSaturated):
+            registry.choose(PRIORITY, exclude=[secondary])
+        with pytest.raises(NoEndpointAvailable):
+            registry.choose(PRIORITY, exclude=[primary, secondary])
+        with pytest.raises(CircuitOpenError):
+            registry.choose(PRIORITY, is_open=lambda endpoint: True)
+
+    @pytest.mark.asyncio
+    async def test_wait_for_capacity(self):
+        registry = _registry({**ENDPOINTS[0], "max_concurrency": 1})
+        (primary,) = registry.endpoints
+        primary.start()
+        assert await registry.wait_for_capacity(0.01) is False
+
+        waiting = asyncio.ensure_future(registry.wait_for_capacity(1.0))
+        await asyncio.sleep(0)
+        primary.finish(True, 0.01)
+        assert await waiting is True
+        assert registry.choose(PRIORITY) is primary
+
+    def test_failures_expire_after_cooldown(self):
+        registry = _registry()
+        primary = registry.endpoints[0]
+        primary.finish(False, 0.1)
+        assert registry.choose(PRIORITY).name == "secondary"
+
+        primary.failed_at -= registry.failure_cooldown
+        assert registry.choose(PRIORITY) is primary
+
+    def test_reconfigure_keeps_statistics(self):
+        registry = _registry()
+        registry.endpoints[0].finish(True, 0.1)
+        registry.configure(ENDPOINTS + [{"base_url": "http://local/v1"}])
+
+        assert [e.name for e in registry.endpoints] == [
+            "primary",
+            "secondary",
+            "endpoint2",
+        ]
+        assert registry.endpoints[0].ewma == pytest.approx(0.1)
+
+
+class TestProviderRouting:
+    @pytest.mark.asyncio
+    async def test_failover_to_secondary_on_errors(self, routed_settings):
+        routed_settings()
+        primary, secondary = _fake(error_rate=1.0), _fake()
+        provider = _provider(primary, secondary)
+        provider.retry_policy.max_attempts = 1
+
+        result = await provider.classify("Preciso de suporte no sistema")
+
+        assert result["meta"]["fallback"] is False
+        assert primary.state.stats["errors"] == 1
+        assert secondary.state.stats["requests"] == 1
+        assert provider.metrics()["endpoints"]["failovers"] == 1
+
+        # O primário com falha recente passa para o fim da fila
+        await provider.classify("Erro no acesso ao sistema")
+        assert primary.state.stats["requests"] == 1
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_latency_policy_prefers_faster_endpoint(self, routed_settings):
+        routed_settings(provider="latency")
+        primary = _fake(latency_ms=30)
+        secondary = _fake(latency_ms=1)
+        provider = _provider(primary, secondary)
+
+        for i in range(8):
+            await provider.classify(f"Preciso de suporte no sistema {i}")
+
+        assert primary.state.stats["requests"] == 1  # só a exploração inicial
+        assert secondary.state.stats["requests"] == 7
+        stats = provider.metrics()["endpoints"]
+        assert stats["policy"] == LATENCY
+        assert stats["endpoints"]["secondary"]["ewma_ms"] < 30
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_per_endpoint_concurrency_cap(self, routed_settings):
+        routed_settings(
+            endpoints=[
+                {**ENDPOINTS[0], "max_concurrency": 2},
+                ENDPOINTS[1],
+            ]
+        )
+        primary, secondary = _fake(latency_ms=30), _fake(latency_ms=30)
+        provider = _provider(primary, secondary)
+
+        await asyncio.gather(
+            *(provider.classify(f"Preciso de suporte {i}") for i in range(6))
+        )
+
+        assert primary.state.stats["max_in_flight"] == 2
+        assert secondary.state.stats["requests"] == 4
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_primary_recovers_after_cooldown(self, routed_settings):
+        routed_settings()
+        calls = {"primary": 0, "secondary": 0}
+
+        def handler(request):
+            calls[request.url.host] += 1
+            if request.url.host == "primary" and calls["primary"] == 1:
+                return httpx.Response(503, json={"error": {"message": "down"}})
+            return httpx.Response(
+                200,
+                json={
+                    "choices": [
+                        {
+                            "message": {
+                                "content": '{"category": "Produtivo", '
+                                '"rationale": "Pedido de suporte"}'
+                            }
+                        }
+                    ]
+                },
+            )
+
+        provider = AIProvider(transport=httpx.MockTransport(handler))
+        provider.endpoints.failure_cooldown = 0.05
+        await provider.classify("Preciso de suporte no sistema")
+        await provider.classify("Erro no acesso ao sistema")
+        assert calls == {"primary": 1, "secondary": 2}
+
+        await asyncio.sleep(0.06)
+        for i in range(5):
+            await provider.classify(f"Preciso de suporte {i}")
+        assert calls == {"primary": 6, "secondary": 2}
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_saturated_endpoint_queues_instead_of_falling_back(
+        self, routed_settings
+    ):
+        routed_settings(endpoints=[{**ENDPOINTS[0], "max_concurrency": 1}])
+        primary = _fake(latency_ms=20)
+        provider = _provider(primary, _fake())
+
+        results = await asyncio.gather(
+            *(provider.classify(f"Preciso de suporte {i}") for i in range(3))
+        )
+
+        assert all(result["meta"]["fallback"] is False for result in results)
+        assert primary.state.stats["max_in_flight"] == 1
+        assert primary.state.stats["requests"] == 3
+        assert provider.metrics()["endpoints"]["saturated_waits"] >= 2
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_saturation_past_deadline_is_rejected(self, routed_settings):
+        routed_settings(endpoints=[{**ENDPOINTS[0], "max_concurrency": 1}])
+        provider = _provider(_fake(), _fake())
+        provider.endpoints.configure([{**ENDPOINTS[0], "max_concurrency": 1}])
+        provider.endpoints.endpoints[0].start()
+
+        with pytest.raises(AdmissionRejected):
+            await provider._route([], time.monotonic() + 0.01)
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_skips_endpoint(self, routed_settings):
+        routed_settings()
+        primary, secondary = _fake(), _fake()
+        provider = _provider(primary, secondary)
+        provider._breaker("http://primary/v1/chat/completions")._trip()
+
+        result = await provider.classify("Preciso de suporte no sistema")
+
+        assert result["meta"]["fallback"] is False
+        assert primary.state.stats["requests"] == 0
+        assert secondary.state.stats["requests"] == 1
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_streaming_fails_over(self, routed_settings):
+        routed_settings()
+        primary, secondary = _fake(error_rate=1.0), _fake(stream_chunk_ms=0)
+        provider = _provider(primary, secondary)
+        provider.retry_policy.max_attempts = 1
+
+        chunks = [
+            chunk
+            async for chunk in provider.stream_reply(
+                "Obrigado pela ajuda", "Improdutivo", "amigavel"
+            )
+        ]
+
+        assert len(chunks) > 1
+        assert secondary.state.stats["requests"] == 1
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("stream", [False, True])
+    async def test_client_errors_are_not_endpoint_failures(
+        self, routed_settings, stream
+    ):
+        routed_settings()
+
+        def handler(request):
+            return httpx.Response(400, json={"error": {"message": "bad request"}})
+
+        provider = AIProvider(transport=httpx.MockTransport(handler))
+        if stream:
+            async for _ in provider.stream_reply("Texto", "Produtivo", "formal"):
+                pass
+        else:
+            await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        # Requisição malformada não derruba um endpoint saudável
+        primary = provider.endpoints.endpoints[0]
+        assert primary.requests == 1
+        assert primary.failures == 0
+        assert not primary.recently_failed(provider.endpoints.failure_cooldown)
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_endpoint_key_and_model_override(self, routed_settings):
+        routed_settings(
+            endpoints=[
+                {
+                    "name": "local",
+                    "base_url": "http://local/v1",
+                    "api_key": "local-key",
+                    "model": "llama-3-8b",
+                }
+            ]
+        )
+        seen = []
+
+        def handler(request):
+            seen.append(request)
+            return httpx.Response(
+                200, json={"choices": [{"message": {"content": "Ok"}}]}
+            )
+
+        provider = AIProvider(transport=httpx.MockTransport(handler))
+        await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert seen[0].url == "http://local/v1/chat/completions"
+        assert seen[0].headers["Authorization"] == "Bearer local-key"
+        assert b'"llama-3-8b"' in seen[0].content
+        await provider.aclose()
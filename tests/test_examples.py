@@ -0,0 +1,113 @@
+"""
+Testes do banco de exemplos few-shot (seleção por similaridade)
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from app.services.examples import ExampleBank, load_example_bank, render_example
+from app.services.features import fold, hashed_counts, ngrams
+from app.services.prompt_templates import PromptOptimizer, PromptTemplates
+from app.services.tokens import estimate_tokens
+
+EMAILS = [
+    "Não consigo acessar o sistema, aparece erro 403 no login desde ontem",
+    "A fatura deste mês veio com cobrança duplicada, preciso do estorno",
+    "Qual o prazo para o chamado 4821? Ainda sem retorno da equipe",
+    "Muito obrigado pelo suporte de hoje, ficou tudo resolvido",
+    "Feliz natal e boas festas a toda a equipe!",
+]
+
+
+@pytest.fixture(scope="module")
+def bank():
+    return load_example_bank()
+
+
+class TestFeatures:
+    def test_fold_and_ngrams(self):
+        assert fold("Ação URGENTE") == "acao urgente"
+        terms = ngrams("Acessar o sistema")
+        assert {"acessar", "sistema", "~acess", "acessar o", "o sistema"} <= set(terms)
+
+    def test_hashing_is_stable(self):
+        first = hashed_counts("Preciso de suporte no sistema")
+        second = hashed_counts("preciso   de SUPORTE no sistema")
+        assert np.array_equal(first[0], second[0])
+        assert np.array_equal(first[1], second[1])
+        assert hashed_counts("")[0].size == 0
+
+
+class TestExampleBank:
+    def test_loads_bundled_bank(self, bank):
+        assert len(bank) >= 40
+        assert {e.category for e in bank.examples} == {"Produtivo", "Improdutivo"}
+        assert all(
+            e.tokens == estimate_tokens(render_example(e)) for e in bank.examples
+        )
+
+    def test_most_similar_first(self, bank):
+        target = bank.examples[7]
+        index, score = bank.search(target.text, 3)[0]
+        assert bank.examples[index] is target
+        assert score == pytest.approx(1.0, abs=1e-5)
+
+        index, _ = bank.search(EMAILS[0], 1)[0]
+        assert "acessar" in bank.examples[index].text
+
+    def test_select_respects_k_budget_and_threshold(self, bank):
+        assert len(bank.select(EMAILS[2], k=2, token_budget=1000)) == 2
+
+        small = bank.select(EMAILS[2], k=4, token_budget=40)
+        assert sum(e.tokens for e in small) <= 40
+
+        assert bank.select("zzz qqq", k=4, token_budget=1000, min_similarity=0.05) == []
+
+    def test_selection_is_sub_millisecond(self, bank):
+        text = " ".join(EMAILS)
+        bank.select(text, 4, 300)
+        started = time.perf_counter()
+        for _ in range(200):
+            bank.select(text, 4, 300)
+        assert (time.perf_counter() - started) / 200 < 0.001
+
+    def test_missing_bank_file(self, tmp_path):
+        assert load_example_bank(str(tmp_path / "nao_existe.jsonl")) is None
+
+    def test_empty_texts_do_not_break_the_index(self):
+        bank = ExampleBank([{"text": "!!!", "category": "Produtivo"}])
+        assert bank.search("Preciso de ajuda", 1)[0][1] == 0.0
+
+
+class TestDynamicFewShotPrompt:
+    def test_prompt_embeds_similar_examples(self, bank):
+        optimizer = PromptOptimizer(example_bank=bank)
+        prompt = optimizer.build_classification_prompt(EMAILS[0], 1200, 150)
+
+        assert prompt.template == "few_shot_dynamic"
+        assert 1 <= prompt.examples <= 4
+        assert prompt.token_meta()["examples"] == prompt.examples
+        assert "Não consigo acessar minha conta" in prompt.text
+        assert "EXEMPLOS SEMELHANTES" in prompt.text
+
+    def test_unrelated_email_uses_simple_prompt(self, bank):
+        optimizer = PromptOptimizer(example_bank=bank)
+        prompt = optimizer.build_classification_prompt("xpto qwerty", 1200, 150)
+        assert prompt.template == "simple"
+
+    def test_prompts_are_shorter_than_fixed_few_shot(self, bank):
+        optimizer = PromptOptimizer(example_bank=bank)
+        dynamic = [
+            optimizer.build_classification_prompt(text, 1200, 150).input_tokens
+            for text in EMAILS
+        ]
+        fixed = [
+            estimate_tokens(PromptTemplates.get_classification_prompt_with_examples(t))
+            for t in EMAILS
+        ]
+        assert sum(dynamic) < sum(fixed)
+
+    def test_bank_changes_prompt_version(self, bank):
+        assert PromptOptimizer(example_bank=bank).version != PromptOptimizer().version
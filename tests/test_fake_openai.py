@@ -0,0 +1,122 @@
+"""
+Testes ponta a ponta do AIProvider contra o servidor OpenAI fake local
+(pool, retries, streaming e base URL configurável, sem rede)
+"""
+
+import json
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from app.services.ai import AIProvider, configured_endpoints
+from app.services.endpoints import EndpointRegistry
+from app.testing.fake_openai import (
+    FakeOpenAIConfig,
+    create_fake_openai_app,
+    fake_completion,
+)
+
+FAKE_BASE_URL = "http://fake-openai/v1"
+
+
+@pytest.fixture
+def fake_settings():
+    with (
+        patch("app.services.ai.settings.provider", "OpenAI"),
+        patch("app.services.ai.settings.openai_api_key", "test-key"),
+        patch("app.services.ai.settings.openai_base_url", FAKE_BASE_URL),
+    ):
+        yield
+
+
+def _provider(**config):
+    fake = create_fake_openai_app(FakeOpenAIConfig(latency_ms=0, seed=7, **config))
+    return AIProvider(transport=httpx.ASGITransport(app=fake)), fake
+
+
+class TestFakeServer:
+    def test_latency_distributions(self):
+        constant = FakeOpenAIConfig(latency="constant", latency_ms=40)
+        assert constant.sample_latency() == pytest.approx(0.04)
+
+        lognormal = FakeOpenAIConfig(latency="lognormal", latency_ms=40, seed=1)
+        samples = sorted(lognormal.sample_latency() for _ in range(2000))
+        assert samples[1000] == pytest.approx(0.04, rel=0.1)  # mediana
+        assert samples[-20] > 2 * samples[1000]  # cauda longa
+
+        slow = FakeOpenAIConfig(latency_ms=10, slow_rate=1.0, slow_ms=900)
+        assert slow.sample_latency() == pytest.approx(0.9)
+
+        with pytest.raises(ValueError):
+            FakeOpenAIConfig(latency="pareto")
+
+    def test_deterministic_classification_json(self):
+        prompt = 'Classifique:\nEmail: """Preciso de suporte, sistema com erro"""\n{"category": ...}'
+        first = json.loads(fake_completion(prompt))
+        assert first == json.loads(fake_completion(prompt))
+        assert first["category"] == "Produtivo"
+
+        combined = json.loads(fake_completion(prompt + ' "reply"'))
+        assert set(combined) == {"category", "rationale", "reply"}
+
+    def test_chat_url_follows_base_url(self, fake_settings):
+        registry = EndpointRegistry()
+        registry.configure(configured_endpoints())
+        assert [endpoint.url for endpoint in registry.endpoints] == [
+            f"{FAKE_BASE_URL}/chat/completions"
+        ]
+
+
+class TestProviderAgainstFakeServer:
+    @pytest.mark.asyncio
+    async def test_classify_and_reply_end_to_end(self, fake_settings):
+        provider, fake = _provider()
+
+        classification, reply = await provider.classify_and_reply(
+            "Preciso de suporte urgente, o sistema está com erro", "formal"
+        )
+
+        assert classification["category"] == "Produtivo"
+        assert classification["meta"]["fallback"] is False
+        assert reply.startswith("Prezado(a)")
+        assert fake.state.stats["requests"] == 2
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_injected_429_is_retried(self, fake_settings):
+        provider, fake = _provider(rate_limit_rate=1.0, retry_after=0.5)
+
+        with patch("app.services.ai.asyncio.sleep", new_callable=AsyncMock) as sleep:
+            result = await provider.classify("Preciso de suporte no sistema")
+
+        assert result["meta"]["fallback"] is True
+        assert fake.state.stats["rate_limited"] == 3
+        sleep.assert_awaited_with(0.5)
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_injected_errors_fall_back(self, fake_settings):
+        provider, fake = _provider(error_rate=1.0)
+        provider.retry_policy.max_attempts = 1
+
+        reply = await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert reply == provider._generate_reply_fallback("Produtivo", "formal")
+        assert fake.state.stats["errors"] == 1
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_streaming(self, fake_settings):
+        provider, fake = _provider(stream_chunk_ms=0)
+
+        chunks = [
+            chunk
+            async for chunk in provider.stream_reply(
+                "Obrigado pela ajuda, parabéns à equipe", "Improdutivo", "amigavel"
+            )
+        ]
+
+        assert len(chunks) > 1
+        assert "".join(chunks).startswith("Olá!")
+        await provider.aclose()
@@ -0,0 +1,296 @@
+"""
+Testes do feedback de usuários e do aprendizado online do modelo local
+"""
+
+import asyncio
+import threading
+from contextlib import ExitStack
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.ai import AIProvider
+from app.services.feedback import FeedbackLearner, LocalShareTracker
+from app.services.local_model import (
+    DEFAULT_CORPUS_PATHS,
+    NaiveBayesModel,
+    header_file,
+    read_corpus,
+)
+from main import app
+
+client = TestClient(app)
+
+# O corpus não cobre relatórios informativos: o modelo começa errando
+REPORT = "Segue o relatório semanal de indicadores para conhecimento"
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return read_corpus(*DEFAULT_CORPUS_PATHS)
+
+
+@pytest.fixture
+def model(corpus):
+    return NaiveBayesModel.train(*corpus)
+
+
+@pytest.fixture
+def feedback_settings(tmp_path):
+    with ExitStack() as stack:
+        for name, value in {
+            "local_model_path": str(tmp_path / "nb"),
+            "feedback_log_path": str(tmp_path / "feedback.jsonl"),
+            "feedback_snapshot_every": 2,
+        }.items():
+            stack.enter_context(patch(f"app.services.ai.settings.{name}", value))
+        yield tmp_path
+
+
+class TestOnlineUpdates:
+    def test_partial_fit_matches_batch_training(self, corpus):
+        texts, labels = corpus
+        online = NaiveBayesModel.train(texts[:-5], labels[:-5]).copy()
+        online.partial_fit(texts[-5:], labels[-5:])
+        batch = NaiveBayesModel.train(texts, labels)
+
+        assert np.array_equal(online.feature_counts, batch.feature_counts)
+        assert np.array_equal(online.class_counts, batch.class_counts)
+        assert online.fingerprint() == batch.fingerprint()
+
+    def test_memory_mapped_model_is_read_only(self, model, tmp_path):
+        model.save(tmp_path / "nb")
+        loaded = NaiveBayesModel.load(tmp_path / "nb")
+        with pytest.raises(ValueError):
+            loaded.partial_fit([REPORT], ["Improdutivo"])
+
+    def test_save_replaces_snapshot_atomically(self, model, tmp_path):
+        first = model.save(tmp_path / "nb")
+        updated = model.copy()
+        updated.partial_fit([REPORT], ["Improdutivo"])
+        updated.version = updated.fingerprint()
+        second = updated.save(tmp_path / "nb")
+
+        assert first != second and not first.exists()
+        assert [p.name for p in tmp_path.glob("nb-*.npy")] == [second.name]
+        assert not list(tmp_path.glob(".*.tmp"))
+        assert NaiveBayesModel.load(tmp_path / "nb").version == updated.version
+        assert header_file(tmp_path / "nb").exists()
+
+
+class TestFeedbackLearner:
+    @pytest.mark.asyncio
+    async def test_snapshots_are_published_by_swap(self, model, tmp_path):
+        learner = FeedbackLearner(
+            model, tmp_path / "nb", tmp_path / "feedback.jsonl", snapshot_every=3
+        )
+        assert model.predict([REPORT]) == ["Produtivo"]
+
+        due = [
+            await learner.record(
+                REPORT, "Improdutivo", predicted="Produtivo", user="ana"
+            )
+            for _ in range(3)
+        ]
+        # Leitores continuam no snapshot publicado até o próximo swap
+        assert due == [False, False, True]
+        assert learner.published is model
+
+        snapshot = await learner.publish()
+        assert learner.published is snapshot is not model
+        assert snapshot.predict([REPORT]) == ["Improdutivo"]
+        assert model.predict([REPORT]) == ["Produtivo"]
+        assert NaiveBayesModel.load(tmp_path / "nb").version == snapshot.version
+        assert learner.stats()["disagreements"] == 3
+        assert learner.stats()["pending"] == 0
+
+    @pytest.mark.asyncio
+    async def test_log_is_a_training_corpus(self, model, tmp_path):
+        learner = FeedbackLearner(model, log_path=tmp_path / "feedback.jsonl")
+        await learner.record(REPORT, "Improdutivo", user="ana")
+
+        assert read_corpus(tmp_path / "feedback.jsonl") == (
+            [REPORT],
+            ["Improdutivo"],
+        )
+
+    @pytest.mark.asyncio
+    async def test_rejects_unknown_category(self, model):
+        with pytest.raises(ValueError):
+            await FeedbackLearner(model).record(REPORT, "Spam")
+
+    @pytest.mark.asyncio
+    async def test_log_is_written_off_the_event_loop(self, model, tmp_path):
+        learner = FeedbackLearner(model, log_path=tmp_path / "feedback.jsonl")
+        loop_thread = threading.get_ident()
+        writers = []
+        append_log = learner._append_log
+
+        def spy(entry):
+            writers.append(threading.get_ident())
+            append_log(entry)
+
+        with patch.object(learner, "_append_log", spy):
+            await asyncio.gather(
+                *(learner.record(REPORT, "Improdutivo") for _ in range(5))
+            )
+        # Gravação em thread, sem bloquear o loop, e nenhuma linha perdida
+        assert writers and loop_thread not in writers
+        assert len(read_corpus(tmp_path / "feedback.jsonl")[0]) == 5
+
+
+class TestLocalShare:
+    def test_share_per_bucket(self):
+        tracker = LocalShareTracker(bucket_seconds=60, buckets=2)
+        for tier, now in [("llm", 0), ("llm", 10), ("local", 70), ("cache", 75)]:
+            tracker.record(tier, now)
+        tracker.record("heuristic", 130)
+
+        stats = tracker.stats()
+        assert stats["share"] == 0.5
+        assert [bucket["share"] for bucket in stats["series"]] == [1.0, 1.0]
+        assert [bucket["requests"] for bucket in stats["series"]] == [1, 1]
+
+
+class TestProviderFeedback:
+    @pytest.mark.asyncio
+    async def test_feedback_moves_traffic_to_local_tier(self, model, feedback_settings):
+        with (
+            patch("app.services.ai.settings.cascade_enabled", True),
+            patch("app.services.ai.settings.local_model_cascade_enabled", True),
+            patch("app.services.ai.settings.local_model_min_documents", 0),
+            patch("app.services.ai.settings.classification_cache_enabled", False),
+        ):
+            provider = AIProvider()
+            provider.local_model = model
+            before = await provider.classify(REPORT)
+
+            for _ in range(4):
+                await provider.record_feedback(REPORT, "Improdutivo", "Produtivo")
+            after = await provider.classify(REPORT)
+
+        assert before["category"] == "Produtivo"
+        assert after["category"] == "Improdutivo"
+        assert after["meta"]["tier"] == "local"
+        assert provider.local_model is provider.feedback.published
+        metrics = provider.metrics()
+        assert metrics["feedback"]["snapshots"] == 2
+        assert metrics["local_share"]["local"] == 2
+        assert (feedback_settings / "feedback.jsonl").exists()
+
+    @pytest.mark.asyncio
+    async def test_published_snapshot_retires_cached_answers(
+        self, model, feedback_settings
+    ):
+        with (
+            patch("app.services.ai.settings.provider", "local"),
+            patch("app.services.ai.settings.classification_cache_enabled", True),
+        ):
+            provider = AIProvider()
+            provider.local_model = model
+            before = await provider.classify(REPORT)
+            assert (await provider.classify(REPORT))["meta"]["cached"] is True
+
+            for _ in range(4):
+                await provider.record_feedback(REPORT, "Improdutivo", "Produtivo")
+            after = await provider.classify(REPORT)
+
+        assert before["category"] == "Produtivo"
+        assert after["category"] == "Improdutivo"
+        assert not after["meta"].get("cached")
+
+    @pytest.mark.asyncio
+    async def test_feedback_keeps_cached_llm_answers(
+        self, model, feedback_settings, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(
+            '{"category": "Produtivo", "rationale": "Relatório"}'
+        )
+        # Só o LLM responde: um snapshot novo não muda as respostas em cache
+        with (
+            patch("app.services.ai.settings.cascade_enabled", False),
+            patch("app.services.ai.settings.local_model_cascade_enabled", False),
+            patch("app.services.ai.settings.classification_cache_enabled", True),
+        ):
+            provider = AIProvider(transport=transport)
+            provider.local_model = model
+            await provider.classify(REPORT)
+            for _ in range(2):
+                await provider.record_feedback(REPORT, "Improdutivo", "Produtivo")
+            after = await provider.classify(REPORT)
+            await provider.aclose()
+
+        assert provider.feedback.snapshots == 1
+        assert after["meta"]["cached"] is True
+        assert len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_cascade_waits_for_enough_documents(self, model):
+        with (
+            patch("app.services.ai.settings.cascade_enabled", True),
+            patch("app.services.ai.settings.local_model_cascade_enabled", True),
+            patch("app.services.ai.settings.local_model_min_documents", 10_000),
+        ):
+            provider = AIProvider()
+            provider.local_model = model
+            assert provider._cascade_local_model(REPORT) is None
+
+
+class TestFeedbackEndpoint:
+    def test_stores_correction(self, model, feedback_settings, auth_headers):
+        provider = AIProvider()
+        provider.local_model = model
+        with patch("app.web.routes.ai_provider", provider):
+            response = client.post(
+                "/api/feedback",
+                json={"text": REPORT, "category": "Improdutivo"},
+                headers=auth_headers(["classify:read"]),
+            )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["stored"] is True
+        assert (body["corrections"], body["pending"]) == (1, 1)
+        assert body["model_version"] == model.version
+
+    def test_long_email_is_compressed_before_learning(self, auth_headers):
+        provider = AIProvider()
+        long_text = " ".join(f"{REPORT} número {i}." for i in range(200))
+        assert len(long_text) > 5000
+        with (
+            patch("app.web.routes.ai_provider", provider),
+            patch.object(
+                provider,
+                "record_feedback",
+                return_value={
+                    "stored": True,
+                    "model_version": "v",
+                    "corrections": 1,
+                    "pending": 1,
+                },
+            ) as record,
+        ):
+            response = client.post(
+                "/api/feedback",
+                json={"text": long_text, "category": "Improdutivo"},
+                headers=auth_headers(["classify:read"]),
+            )
+
+        assert response.status_code == 200
+        assert len(record.call_args.args[0]) <= 5000
+
+    def test_rejects_invalid_category(self, auth_headers):
+        response = client.post(
+            "/api/feedback",
+            json={"text": REPORT, "category": "Spam"},
+            headers=auth_headers(["classify:read"]),
+        )
+        assert response.status_code == 400
+
+    def test_requires_authentication(self):
+        response = client.post(
+            "/api/feedback", json={"text": REPORT, "category": "Improdutivo"}
+        )
+        assert response.status_code in (401, 403)
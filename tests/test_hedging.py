@@ -0,0 +1,173 @@
+"""
+Testes de hedging (requisição duplicada após o percentil de latência)
+"""
+
+import asyncio
+import itertools
+import time
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.services.ai import AIProvider
+from app.services.hedging import HedgePolicy, LatencyTracker
+
+OK = {"choices": [{"message": {"content": "Resposta gerada"}}]}
+
+FAST = 0.005
+SLOW = 0.3
+
+
+def _latency(slow_every=20):
+    """Resposta do servidor falso: a cada `slow_every` chamadas, uma fica lenta"""
+    served = itertools.count(1)
+
+    async def respond(request):
+        await asyncio.sleep(SLOW if next(served) % slow_every == 0 else FAST)
+        return OK
+
+    return respond
+
+
+def _p99(samples):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+
+
+async def _run(provider, count):
+    latencies = []
+    for i in range(count):
+        started = time.monotonic()
+        await provider.generate_reply(f"Texto {i}", "Produtivo", "formal")
+        latencies.append(time.monotonic() - started)
+    return latencies
+
+
+class TestLatencyTracker:
+    def test_percentile_nearest_rank(self):
+        tracker = LatencyTracker()
+        for value in range(1, 11):
+            tracker.record(value / 10)
+        assert tracker.percentile(0.9) == pytest.approx(0.9)
+        assert tracker.percentile(0.5) == pytest.approx(0.5)
+        assert LatencyTracker().percentile(0.9) is None
+
+    def test_rolling_window(self):
+        tracker = LatencyTracker(size=3)
+        for value in (10.0, 1.0, 2.0, 3.0):
+            tracker.record(value)
+        assert len(tracker) == 3
+        assert tracker.percentile(1.0) == 3.0
+
+
+class TestHedgePolicy:
+    def test_no_hedge_until_warm(self):
+        policy = HedgePolicy(min_samples=5, min_delay=0.0)
+        for _ in range(4):
+            policy.tracker.record(0.1)
+        assert policy.hedge_delay() is None
+        policy.tracker.record(0.1)
+        assert policy.hedge_delay() == pytest.approx(0.1)
+
+    def test_min_delay_floor(self):
+        policy = HedgePolicy(min_samples=1, min_delay=0.05)
+        policy.tracker.record(0.001)
+        assert policy.hedge_delay() == 0.05
+
+    def test_budget_caps_hedge_ratio(self):
+        policy = HedgePolicy(max_ratio=0.1)
+        granted = 0
+        for _ in range(100):
+            policy.record_primary()
+            granted += policy.try_acquire()
+        assert granted == 10
+        assert policy.stats()["budget_denied"] == 90
+
+    @pytest.mark.asyncio
+    async def test_budget_holds_under_concurrent_hedges(self):
+        policy = HedgePolicy(max_ratio=0.1)
+        for _ in range(100):
+            policy.record_primary()
+
+        async def hedge():
+            await asyncio.sleep(0)
+            return policy.try_acquire()
+
+        # Primárias lentas ao mesmo tempo: cada hedge conta no orçamento
+        granted = await asyncio.gather(*(hedge() for _ in range(30)))
+        assert sum(granted) == 10
+        assert policy.stats()["budget_denied"] == 20
+
+    def test_budget_window_slides(self):
+        policy = HedgePolicy(max_ratio=0.1, budget_window=20)
+        for _ in range(20):
+            policy.record_primary()
+        assert [policy.try_acquire() for _ in range(3)] == [True, True, False]
+        for _ in range(20):
+            policy.record_primary()
+        assert policy.try_acquire()
+
+
+class TestProviderHedging:
+    @pytest.mark.asyncio
+    async def test_hedging_cuts_tail_latency(self, openai_settings, mock_upstream):
+        async def measure(enabled):
+            transport, calls = mock_upstream(_latency())
+            provider = AIProvider(transport=transport)
+            provider.hedging = HedgePolicy(
+                min_samples=20, min_delay=0.02, max_ratio=0.5
+            )
+            with patch("app.services.ai.settings.hedging_enabled", enabled):
+                await _run(provider, 20)  # aquece o rastreador de latência
+                latencies = await _run(provider, 60)
+            stats = provider.metrics()["hedging"]
+            await provider.aclose()
+            return latencies, stats, len(calls)
+
+        plain, _, plain_calls = await measure(False)
+        hedged, stats, hedged_calls = await measure(True)
+
+        assert _p99(plain) >= SLOW
+        assert _p99(hedged) < SLOW / 2
+        assert stats["hedges"] >= 1
+        assert stats["hedge_wins"] >= 1
+        # Só as requisições lentas são duplicadas
+        assert hedged_calls - 80 == stats["hedges"] < 10
+        assert plain_calls == 80
+
+    @pytest.mark.asyncio
+    async def test_disabled_by_default(self, openai_settings, mock_upstream):
+        transport, calls = mock_upstream(_latency(slow_every=1))
+        provider = AIProvider(transport=transport)
+        for _ in range(25):
+            provider.hedging.tracker.record(FAST)
+
+        await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert len(calls) == 1
+        assert provider.metrics()["hedging"]["hedges"] == 0
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_failed_hedge_falls_back_to_primary(
+        self, openai_settings, mock_upstream
+    ):
+        async def slow_ok(request):
+            await asyncio.sleep(0.1)
+            return OK
+
+        transport, calls = mock_upstream(
+            slow_ok, httpx.Response(400, json={"error": {"message": "bad"}})
+        )
+        provider = AIProvider(transport=transport)
+        provider.hedging = HedgePolicy(min_samples=1, min_delay=0.01, max_ratio=1.0)
+        provider.hedging.tracker.record(0.01)
+
+        with patch("app.services.ai.settings.hedging_enabled", True):
+            reply = await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert reply == "Resposta gerada"
+        assert len(calls) == 2
+        assert provider.hedging.hedge_wins == 0
+        await provider.aclose()
@@ -330,7 +330,8 @@ class TestErrorHandlingIntegration:
 
     def test_character_limit_integration(self):
         """Testa limite de caracteres"""
-        long_text = "a" * 6000  # Excede limite de 5000
+        # Acima de max_input_chars o texto é comprimido; só o teto é rejeitado
+        long_text = "a" * 100_001  # Excede MAX_COMPRESSIBLE_CHARS
 
         response = client.post("/classify", data={"text": long_text, "tone": "neutro"})
 
@@ -0,0 +1,64 @@
+"""
+Testes do matcher de palavras-chave compartilhado
+"""
+
+from app.services.heuristics import classify_heuristic
+from app.services.keywords import (
+    HEURISTIC_IMPRODUTIVE,
+    HEURISTIC_PRODUCTIVE,
+    PORTUGUESE,
+    PRODUCTIVE,
+    KeywordMatcher,
+    keyword_matcher,
+)
+from app.services.nlp import detect_language, extract_keywords
+
+
+class TestKeywordMatcher:
+    def test_whole_words_only(self):
+        hits = keyword_matcher.match("Registrei uma queixa sobre o sistema")
+        assert "que" not in hits.terms(PORTUGUESE)
+        assert hits.terms(PORTUGUESE) == ["uma"]
+
+    def test_accents_case_and_plurals(self):
+        hits = keyword_matcher.match("ERROS na Configuracao e SITUAÇÕES de cobranca")
+        assert hits.terms(PRODUCTIVE) == ["erro", "cobrança", "configuração"]
+        assert "situação" in hits.terms(HEURISTIC_PRODUCTIVE)
+
+    def test_phrases_and_weights(self):
+        hits = keyword_matcher.match("Parabéns, bom trabalho! Preciso do protocolo.")
+        assert hits.terms(HEURISTIC_IMPRODUTIVE) == ["parabéns", "bom trabalho"]
+        assert hits.weight(HEURISTIC_IMPRODUTIVE) == 4
+        # protocolo (3) + preciso (1)
+        assert hits.weight(HEURISTIC_PRODUCTIVE) == 4
+        assert not keyword_matcher.match("bom dia, trabalho feito").any(
+            HEURISTIC_IMPRODUTIVE
+        )
+
+    def test_each_term_counts_once(self):
+        matcher = KeywordMatcher({"x": {"erro": 2, "falha": 1}})
+        hits = matcher.match("erro, erros, erro e falhas")
+        assert hits.terms("x") == ["erro", "falha"]
+        assert hits.weight("x") == 3
+        assert hits.count("missing") == 0 and not hits.any("missing")
+
+    def test_words_are_matched_as_folded(self):
+        matcher = KeywordMatcher({"x": {"Crítico": 1}})
+        assert matcher.match_words(["criticos"]).terms("x") == ["Crítico"]
+        assert matcher.match("") == matcher.match_words([])
+
+
+class TestCallers:
+    def test_substrings_no_longer_count(self):
+        # "que" em "queixa" e "com" em "computador" não indicam português
+        assert detect_language("queixa computador") == "unknown"
+        assert detect_language("Preciso de ajuda com o acesso para hoje") == "pt"
+
+    def test_extract_keywords_keeps_lexicon_order(self):
+        text = "Dúvida sobre a fatura: o suporte abriu um chamado"
+        assert extract_keywords(text) == ["suporte", "chamado", "fatura", "dúvida"]
+
+    def test_heuristic_scores_use_weights(self):
+        category, _, rationale = classify_heuristic("Obrigada! Ótimo, excelente.")
+        assert category == "Improdutivo"
+        assert rationale.startswith("Contém 6 termos")
@@ -0,0 +1,138 @@
+"""
+Testes do classificador local (naive Bayes sobre n-gramas com hashing)
+"""
+
+import json
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.services.ai import AIProvider
+from app.services.features import hashed_terms
+from app.services.local_model import (
+    DEFAULT_CORPUS_PATHS,
+    NaiveBayesModel,
+    header_file,
+    load_local_model,
+    read_corpus,
+)
+
+HELD_OUT = [
+    (
+        "Não consigo acessar o sistema, aparece erro 403 no login desde ontem",
+        "Produtivo",
+    ),
+    ("A fatura deste mês veio com cobrança duplicada, preciso do estorno", "Produtivo"),
+    ("Qual o prazo para o chamado 4821? Ainda sem retorno da equipe", "Produtivo"),
+    ("Could you reset my password? I am locked out of the portal", "Produtivo"),
+    ("Muito obrigado pelo suporte de hoje, ficou tudo resolvido", "Improdutivo"),
+    ("Feliz natal e boas festas a toda a equipe!", "Improdutivo"),
+    ("Thanks a lot for the great presentation yesterday!", "Improdutivo"),
+]
+
+
+@pytest.fixture(scope="module")
+def model():
+    return NaiveBayesModel.train(*read_corpus(*DEFAULT_CORPUS_PATHS))
+
+
+class TestNaiveBayesModel:
+    def test_hashed_terms_keep_repeats(self):
+        rows, buckets = hashed_terms(["erro erro", "", "ok"])
+        assert rows.tolist() == [0, 0, 0, 2]  # erro, erro, 'erro erro', ok
+        assert buckets[0] == buckets[1]
+
+    def test_classifies_unseen_emails(self, model):
+        texts, expected = zip(*HELD_OUT)
+        assert model.predict(list(texts)) == list(expected)
+
+    def test_single_email_result(self, model):
+        result = model.classify(HELD_OUT[0][0])
+
+        assert result["category"] == "Produtivo"
+        assert 0.5 < result["confidence"] <= 0.99
+        assert result["rationale"].startswith("Modelo local")
+
+    def test_probabilities_are_normalized(self, model):
+        probabilities = model.predict_proba(["", "xpto", HELD_OUT[5][0]])
+        assert probabilities.shape == (3, 2)
+        assert np.allclose(probabilities.sum(axis=1), 1.0)
+        assert model.predict([]) == []
+
+    def test_batch_throughput(self, model):
+        batch = [text * 8 for text, _ in HELD_OUT] * 300
+        model.predict(batch[:10])
+        started = time.perf_counter()
+        model.predict(batch)
+        rate = len(batch) / (time.perf_counter() - started)
+        assert rate > 1000  # e-mails de ~500 caracteres por segundo
+
+
+class TestPersistence:
+    def test_save_and_memory_mapped_load(self, model, tmp_path):
+        path = tmp_path / "nb"
+        model.save(path)
+        loaded = NaiveBayesModel.load(path)
+
+        assert isinstance(loaded.feature_counts, np.memmap)
+        assert loaded.version == model.version
+        texts = [text for text, _ in HELD_OUT]
+        assert np.allclose(loaded.predict_proba(texts), model.predict_proba(texts))
+
+    def test_rejects_unknown_format(self, model, tmp_path):
+        path = tmp_path / "nb"
+        model.save(path)
+        header_path = header_file(path)
+        header = json.loads(header_path.read_text())
+        header["format"] = 99
+        header_path.write_text(json.dumps(header))
+
+        with pytest.raises(ValueError):
+            NaiveBayesModel.load(path)
+
+    def test_missing_file_trains_on_bundled_corpus(self, model, tmp_path):
+        fallback = load_local_model(str(tmp_path / "nao_existe"))
+        assert fallback is not None
+        assert fallback.version == model.version
+
+
+class TestLocalProvider:
+    @pytest.mark.asyncio
+    async def test_provider_local_classifies_offline(self, model):
+        with patch("app.services.ai.settings.provider", "local"):
+            provider = AIProvider()
+            provider.local_model = model
+            result = await provider.classify(HELD_OUT[1][0])
+            reply = await provider.generate_reply(HELD_OUT[1][0], "Produtivo", "formal")
+
+        assert result["category"] == "Produtivo"
+        assert result["meta"]["model"] == "local_nb"
+        assert result["meta"]["tier"] == "local"
+        assert result["meta"]["cost"] == 0.0
+        assert provider.metrics()["tiers"]["local"] == 1
+        assert reply == provider._generate_reply_fallback("Produtivo", "formal")
+
+    @pytest.mark.asyncio
+    async def test_hf_provider_uses_local_model(self, model):
+        with patch("app.services.ai.settings.provider", "HF"):
+            provider = AIProvider()
+            provider.local_model = model
+            result = await provider.classify(HELD_OUT[5][0])
+
+        assert result["category"] == "Improdutivo"
+        assert result["meta"]["model"] == "local_nb"
+
+    @pytest.mark.asyncio
+    async def test_model_loaded_at_startup(self, model, tmp_path):
+        model.save(tmp_path / "nb")
+        with (
+            patch("app.services.ai.settings.provider", "local"),
+            patch("app.services.ai.settings.local_model_path", str(tmp_path / "nb")),
+        ):
+            provider = AIProvider()
+            await provider.startup()
+            await provider.aclose()
+
+        assert isinstance(provider.local_model.feature_counts, np.memmap)
@@ -0,0 +1,154 @@
+"""
+Testes do índice de quase-duplicatas (MinHash + LSH em bandas)
+"""
+
+import time
+from unittest.mock import patch
+
+import httpx
+import numpy as np
+import pytest
+
+from app.services.ai import AIProvider
+from app.services.near_duplicates import NearDuplicateIndex, minhash
+
+TEMPLATE = (
+    "Olá {name}, seu chamado {ticket} foi atualizado em {date}. Status: em "
+    "análise pela equipe de suporte. Prazo estimado de resposta: 2 dias úteis. "
+    "Não responda este e-mail."
+)
+FIRST = TEMPLATE.format(name="João", ticket=4821, date="12/03/2025")
+SECOND = TEMPLATE.format(name="Maria", ticket=9930, date="15/04/2025")
+UNRELATED = (
+    "Parabéns a toda a equipe pelo excelente trabalho neste ano, "
+    "desejo boas festas e um próspero ano novo a todos!"
+)
+RESULT = {"category": "Produtivo", "confidence": 0.9, "rationale": "Chamado"}
+
+
+class TestMinHash:
+    def test_numbers_are_masked(self):
+        same_name = TEMPLATE.format(name="João", ticket=1, date="01/01/2024")
+        assert np.array_equal(minhash(FIRST)[0], minhash(same_name)[0])
+
+    def test_signature_shape_and_empty_text(self):
+        signature, terms = minhash(FIRST)
+        assert signature.shape == (64,)
+        assert terms > 20
+        assert minhash("!!! ...")[1] == 0
+
+
+class TestNearDuplicateIndex:
+    def test_templated_variant_reuses_result(self):
+        index = NearDuplicateIndex(min_similarity=0.8)
+        index.add("c0ffee", FIRST, RESULT, "v1")
+
+        value, provenance = index.lookup(SECOND, "v1")
+
+        assert value == RESULT
+        assert provenance["source"] == "c0ffee"
+        assert 0.8 <= provenance["similarity"] < 1.0
+        assert index.lookup(UNRELATED, "v1") is None
+        assert index.stats()["hits"] == 1
+
+    def test_version_and_threshold_are_respected(self):
+        index = NearDuplicateIndex(min_similarity=0.99)
+        index.add("k", FIRST, RESULT, "v1")
+
+        assert index.lookup(SECOND, "v1") is None
+        assert index.lookup(FIRST, "v2") is None
+        assert index.lookup(FIRST, "v1") is not None
+
+    def test_short_texts_are_not_indexed(self):
+        index = NearDuplicateIndex(min_terms=8)
+        index.add("k", "Obrigado!", RESULT, "v1")
+        assert len(index) == 0
+
+    def test_memory_is_bounded_by_eviction(self):
+        index = NearDuplicateIndex(max_entries=3)
+        for ticket in range(5):
+            name = "abcdefghij"[ticket] * 5
+            index.add(
+                str(ticket), TEMPLATE.format(name=name, ticket=1, date=1), {}, "v"
+            )
+
+        assert len(index) == 3
+        assert index.stats()["evictions"] == 2
+        keys = set().union(
+            *(keys for table in index._tables for keys in table.values())
+        )
+        assert keys == {"2", "3", "4"}
+
+    def test_expired_entries_are_dropped(self):
+        index = NearDuplicateIndex(ttl_seconds=0)
+        index.add("k", FIRST, RESULT, "v1")
+
+        assert index.lookup(SECOND, "v1") is None
+        assert len(index) == 0
+        assert index.stats()["expirations"] == 1
+
+    def test_lookup_is_sub_millisecond(self):
+        index = NearDuplicateIndex()
+        rng = np.random.default_rng(0)
+        vocabulary = [
+            f"termo{chr(97 + i % 26)}{chr(97 + i // 26 % 26)}" for i in range(600)
+        ]
+        for key in range(2000):
+            words = rng.choice(vocabulary, size=40)
+            index.add(str(key), " ".join(words), RESULT, "v")
+        email = " ".join(rng.choice(vocabulary, size=700))[:5000]
+
+        index.lookup(email, "v")
+        started = time.perf_counter()
+        for _ in range(50):
+            index.lookup(email, "v")
+        assert (time.perf_counter() - started) / 50 < 0.001
+
+
+class TestProviderNearDuplicates:
+    @pytest.fixture
+    def upstream(self):
+        calls = []
+
+        def handler(request):
+            calls.append(request)
+            content = '{"category": "Produtivo", "rationale": "Atualização de chamado"}'
+            return httpx.Response(
+                200, json={"choices": [{"message": {"content": content}}]}
+            )
+
+        with (
+            patch("app.services.ai.settings.provider", "OpenAI"),
+            patch("app.services.ai.settings.openai_api_key", "test-key"),
+        ):
+            yield httpx.MockTransport(handler), calls
+
+    @pytest.mark.asyncio
+    async def test_templated_email_skips_upstream(self, upstream):
+        transport, calls = upstream
+        provider = AIProvider(transport=transport)
+
+        first = await provider.classify(FIRST)
+        second = await provider.classify(SECOND)
+
+        assert len(calls) == 1
+        assert first["meta"]["tier"] == "llm"
+        assert second["meta"]["tier"] == "near_duplicate"
+        assert second["meta"]["near_duplicate"]["similarity"] >= 0.8
+        assert second["category"] == first["category"]
+        assert provider.metrics()["tiers"]["near_duplicate"] == 1
+        assert provider.metrics()["near_duplicates"]["entries"] == 1
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_disabled(self, upstream):
+        transport, calls = upstream
+        provider = AIProvider(transport=transport)
+
+        with patch("app.services.ai.settings.near_duplicate_enabled", False):
+            await provider.classify(FIRST)
+            await provider.classify(SECOND)
+
+        assert len(calls) == 2
+        assert len(provider.near_duplicates) == 0
+        await provider.aclose()
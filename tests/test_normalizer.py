@@ -0,0 +1,67 @@
+"""
+Testes de regressão do normalizador de texto (clean_text/normalize_text)
+
+tests/data/normalizer_golden.jsonl guarda a saída da implementação
+anterior (regex por linha e múltiplos re.sub) para e-mails do corpus
+embrulhados em cabeçalhos, assinaturas, rodapés, símbolos e espaços
+Unicode; a implementação de passada única deve reproduzi-la exatamente.
+preprocess_text aplica ainda a remoção de respostas citadas, testada em
+test_thread_extraction.py.
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from app.services.nlp import clean_text, normalize_text, preprocess_text
+
+GOLDEN = Path(__file__).parent / "data" / "normalizer_golden.jsonl"
+
+
+@pytest.fixture(scope="module")
+def golden():
+    with open(GOLDEN, encoding="utf-8") as handle:
+        return [json.loads(line) for line in handle]
+
+
+def test_golden_corpus_is_substantial(golden):
+    assert len(golden) >= 400
+    assert any(
+        "\nDe:" in case["text"] or case["text"].startswith("De:") for case in golden
+    )
+    assert any("Enviado do meu" in case["text"] for case in golden)
+
+
+def test_clean_text_matches_golden(golden):
+    mismatches = [
+        case["text"] for case in golden if clean_text(case["text"]) != case["clean"]
+    ]
+    assert mismatches == []
+
+
+def test_normalize_text_matches_golden(golden):
+    mismatches = [
+        case["text"]
+        for case in golden
+        if normalize_text(case["text"]) != case["preprocess"]
+    ]
+    assert mismatches == []
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Olá\n  De: ana@x.com\nTudo certo?", "Olá Tudo certo?"),
+        ("Corpo\n-- \nAssinatura", "Corpo"),
+        ("Corpo\n-- Ana\nfim", "Corpo -- Ana fim"),
+        ("Texto Enviado do\nmeu iPhone", "Texto"),
+        ("a  b\x1fc", "a b c"),
+    ],
+)
+def test_clean_text_edge_cases(text, expected):
+    assert clean_text(text) == expected
+
+
+def test_preprocess_filters_symbols_and_collapses_spaces():
+    assert preprocess_text("a @ b, R$ 10! _x_ ½ 😀 ok?") == "a b, R 10! _x_ ½ ok?"
@@ -0,0 +1,189 @@
+"""
+Testes do controle de sobrecarga (modos de degradação com histerese)
+"""
+
+import asyncio
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.ai import AIProvider
+from app.services.overload import (
+    CLASSIFY_ONLY,
+    FULL,
+    HEURISTIC,
+    SHED,
+    LoopLagMonitor,
+    OverloadController,
+)
+from main import app
+
+client = TestClient(app)
+
+CLASSIFICATION = {
+    "choices": [
+        {
+            "message": {
+                "content": '{"category": "Produtivo", "rationale": "Pedido de suporte"}'
+            }
+        }
+    ],
+    "usage": {"prompt_tokens": 10, "completion_tokens": 5},
+}
+
+
+@pytest.fixture
+def controller():
+    """Controlador isolado, usado pelo provedor e pelas rotas"""
+    fresh = OverloadController(cooldown_seconds=0.0)
+    with (
+        patch("app.services.ai.overload_controller", fresh),
+        patch("app.web.routes.overload_controller", fresh),
+    ):
+        yield fresh
+
+
+class TestOverloadController:
+    def test_escalates_immediately_on_any_signal(self, clock):
+        controller = OverloadController(clock=clock)
+        assert controller.evaluate(loop_lag_ms=0, in_flight=0, queue_ms=0) == FULL
+        assert controller.evaluate(loop_lag_ms=120, in_flight=0, queue_ms=0) == (
+            CLASSIFY_ONLY
+        )
+        assert controller.evaluate(loop_lag_ms=0, in_flight=0, queue_ms=3000) == (
+            HEURISTIC
+        )
+        assert controller.evaluate(loop_lag_ms=0, in_flight=300, queue_ms=0) == SHED
+
+    def test_hysteresis_and_cooldown(self, clock):
+        controller = OverloadController(
+            loop_lag_ms=(100, 250, 500),
+            recover_ratio=0.7,
+            cooldown_seconds=10,
+            clock=clock,
+        )
+        controller.evaluate(loop_lag_ms=150, in_flight=0, queue_ms=0)
+        clock.now += 60
+
+        # Abaixo do limiar, mas acima de 70% dele: não volta
+        assert controller.evaluate(loop_lag_ms=90, in_flight=0, queue_ms=0) == (
+            CLASSIFY_ONLY
+        )
+        assert controller.evaluate(loop_lag_ms=50, in_flight=0, queue_ms=0) == FULL
+
+    def test_recovers_one_mode_per_cooldown(self, clock):
+        controller = OverloadController(cooldown_seconds=10, clock=clock)
+        controller.evaluate(loop_lag_ms=600, in_flight=0, queue_ms=0)
+        assert controller.mode == SHED
+
+        quiet = {"loop_lag_ms": 0, "in_flight": 0, "queue_ms": 0}
+        assert controller.evaluate(**quiet) == SHED  # cooldown ainda não passou
+        modes = []
+        for _ in range(3):
+            clock.now += 10
+            modes.append(controller.evaluate(**quiet))
+        assert modes == [HEURISTIC, CLASSIFY_ONLY, FULL]
+        assert controller.stats()["transitions"] == 4
+
+    def test_disabled_controller_stays_full(self):
+        controller = OverloadController(enabled=False)
+        assert controller.evaluate(loop_lag_ms=10_000, in_flight=0, queue_ms=0) == FULL
+
+    def test_in_flight_and_queue_sources(self):
+        controller = OverloadController(in_flight=(2, 4, 8))
+        controller.queue_time_source = lambda: 0.0
+        for _ in range(3):
+            controller.request_started()
+        assert controller.evaluate() == CLASSIFY_ONLY
+        controller.queue_time_source = lambda: 5000.0
+        assert controller.evaluate() == SHED
+
+
+class TestLoopLagMonitor:
+    @pytest.mark.asyncio
+    async def test_detects_blocked_event_loop(self):
+        monitor = LoopLagMonitor(interval=0.01)
+        ticks = []
+        monitor.start(lambda: ticks.append(monitor.lag_ms))
+        await asyncio.sleep(0.005)
+        time.sleep(0.1)  # bloqueia o loop de propósito
+        await asyncio.sleep(0.03)
+        await monitor.stop()
+
+        assert ticks
+        assert monitor.lag_ms >= 50
+
+
+class TestDegradedProvider:
+    @pytest.mark.asyncio
+    async def test_classify_only_uses_template_replies(
+        self, controller, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(CLASSIFICATION)
+        provider = AIProvider(transport=transport)
+        controller.evaluate(loop_lag_ms=150, in_flight=0, queue_ms=0)
+
+        classification, reply = await provider.classify_and_reply(
+            "Preciso de suporte no sistema", "formal"
+        )
+
+        assert len(calls) == 1  # só a classificação foi ao LLM
+        assert classification["meta"]["service_mode"] == CLASSIFY_ONLY
+        assert reply == provider._generate_reply_fallback("Produtivo", "formal")
+        assert await provider.refine_reply("Texto original", "formal") == (
+            "Texto original"
+        )
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_heuristic_mode_skips_the_llm(
+        self, controller, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(CLASSIFICATION)
+        provider = AIProvider(transport=transport)
+        controller.evaluate(loop_lag_ms=300, in_flight=0, queue_ms=0)
+
+        result = await provider.classify("Preciso de suporte no sistema")
+
+        assert calls == []
+        assert result["meta"]["model"] == "heuristic_fallback"
+        assert result["meta"]["service_mode"] == HEURISTIC
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_full_mode_is_stamped_in_meta(
+        self, controller, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(CLASSIFICATION)
+        provider = AIProvider(transport=transport)
+
+        result = await provider.classify("Preciso de suporte no sistema")
+
+        assert len(calls) == 1
+        assert result["meta"]["service_mode"] == FULL
+        await provider.aclose()
+
+
+class TestSheddingRoutes:
+    def test_shed_mode_returns_503_with_retry_after(self, controller):
+        controller.evaluate(loop_lag_ms=1000, in_flight=0, queue_ms=0)
+        controller.cooldown_seconds = 3600
+
+        response = client.post("/classify", data={"text": "Preciso de suporte"})
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
+        assert controller.stats()["shed"] == 1
+
+        health = client.get("/health").json()
+        assert health["mode"] == SHED
+        assert health["status"] == "degraded"
+
+    def test_requests_are_counted_in_flight(self, controller):
+        response = client.post("/classify", data={"text": "Preciso de suporte"})
+
+        assert response.status_code == 200
+        assert response.json()["meta"]["service_mode"] == FULL
+        assert controller.in_flight == 0
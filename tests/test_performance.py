@@ -239,8 +239,8 @@ class TestRobustness:
         # Pode dar 200 ou 400, mas não deve quebrar
         assert response.status_code in [200, 400]
 
-        # Texto 1 char acima do limite
-        over_limit_text = "a" * 5001
+        # Texto 1 char acima do limite de compressão
+        over_limit_text = "a" * 100_001
         response = client.post(  # unused
             "/classify", data={"text": over_limit_text, "tone": "neutro"}
         )
@@ -0,0 +1,175 @@
+"""
+Testes da política de retry (backoff exponencial, jitter e Retry-After)
+"""
+
+import json
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+
+from app.services.ai import AIProvider
+from app.services.retry import RetryPolicy, parse_duration, parse_retry_after
+
+OK = {"choices": [{"message": {"content": "Resposta gerada"}}]}
+
+
+@pytest.fixture
+def no_sleep():
+    with patch("app.services.ai.asyncio.sleep", new_callable=AsyncMock) as sleep:
+        yield sleep
+
+
+class TestHeaderParsing:
+    @pytest.mark.parametrize(
+        "value, expected",
+        [("20ms", 0.02), ("1s", 1.0), ("6m0s", 360.0), ("1h2m3.5s", 3723.5)],
+    )
+    def test_parse_duration(self, value, expected):
+        assert parse_duration(value) == pytest.approx(expected)
+
+    @pytest.mark.parametrize("value", ["", "abc", "10", "5x"])
+    def test_parse_duration_invalid(self, value):
+        assert parse_duration(value) is None
+
+    def test_parse_retry_after_seconds_and_date(self):
+        assert parse_retry_after("3") == 3.0
+        date = "Wed, 21 Oct 2015 07:28:10 GMT"
+        now = 1445412480.0  # 10s antes
+        assert parse_retry_after(date, now=now) == pytest.approx(10.0)
+        assert parse_retry_after("soon") is None
+
+
+class TestRetryPolicy:
+    def test_full_jitter_is_capped(self):
+        policy = RetryPolicy(base_delay=0.5, max_delay=2.0, rand=lambda lo, hi: hi)
+        assert [policy.backoff(a) for a in (1, 2, 3, 4)] == [0.5, 1.0, 2.0, 2.0]
+
+    def test_retry_after_wins_over_backoff(self):
+        policy = RetryPolicy(rand=lambda lo, hi: hi)
+        assert policy.delay_for_response(1, 503, {"retry-after": "7"}) == 7.0
+
+    def test_ratelimit_reset_used_for_429(self):
+        policy = RetryPolicy(rand=lambda lo, hi: hi)
+        headers = {
+            "x-ratelimit-remaining-requests": "5",
+            "x-ratelimit-remaining-tokens": "0",
+            "x-ratelimit-reset-tokens": "1.5s",
+        }
+        assert policy.delay_for_response(1, 429, headers) == 1.5
+
+    def test_never_sleeps_past_the_deadline(self):
+        policy = RetryPolicy(max_attempts=5)
+        assert policy.can_retry(1, 0.5, remaining=1.0)
+        assert not policy.can_retry(1, 2.0, remaining=1.0)
+        assert not policy.can_retry(5, 0.1, remaining=10.0)
+
+
+class TestProviderRetries:
+    @pytest.mark.asyncio
+    async def test_transient_503_is_retried(
+        self, openai_settings, no_sleep, mock_upstream
+    ):
+        transport, calls = mock_upstream(
+            httpx.Response(503), httpx.Response(200, json=OK)
+        )
+        provider = AIProvider(transport=transport)
+
+        reply = await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert reply == "Resposta gerada"
+        assert len(calls) == 2
+        stats = provider.metrics()["retries"]
+        assert stats["attempts"] == 2
+        assert stats["retries_by_reason"] == {"503": 1}
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_retry_after_header_is_honored(
+        self, openai_settings, no_sleep, mock_upstream
+    ):
+        transport, calls = mock_upstream(
+            httpx.Response(429, headers={"retry-after": "2"}),
+            httpx.Response(200, json=OK),
+        )
+        provider = AIProvider(transport=transport)
+
+        await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        no_sleep.assert_awaited_once_with(2.0)
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_retry_after_beyond_budget_gives_up(
+        self, openai_settings, no_sleep, mock_upstream
+    ):
+        transport, calls = mock_upstream(
+            httpx.Response(429, headers={"retry-after": "120"})
+        )
+        provider = AIProvider(transport=transport)
+
+        with patch("app.services.ai.settings.retry_budget_seconds", 5.0):
+            reply = await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert len(calls) == 1
+        assert reply == provider._generate_reply_fallback("Produtivo", "formal")
+        assert provider.metrics()["retries"]["exhausted"] == 1
+        no_sleep.assert_not_awaited()
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_attempts_are_bounded(self, openai_settings, no_sleep, mock_upstream):
+        transport, calls = mock_upstream(httpx.Response(502))
+        provider = AIProvider(transport=transport)
+
+        await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert len(calls) == 3
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_client_errors_are_not_retried(
+        self, openai_settings, no_sleep, mock_upstream
+    ):
+        transport, calls = mock_upstream(
+            httpx.Response(400, json={"error": {"message": "bad"}})
+        )
+        provider = AIProvider(transport=transport)
+
+        await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert len(calls) == 1
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_transport_errors_are_retried(
+        self, openai_settings, no_sleep, mock_upstream
+    ):
+        transport, calls = mock_upstream(
+            httpx.ConnectError("connection reset"), httpx.Response(200, json=OK)
+        )
+        provider = AIProvider(transport=transport)
+
+        reply = await provider.generate_reply("Texto", "Produtivo", "formal")
+
+        assert reply == "Resposta gerada"
+        assert provider.metrics()["retries"]["retries_by_reason"] == {"ConnectError": 1}
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_stream_open_is_retried(
+        self, openai_settings, no_sleep, mock_upstream
+    ):
+        chunk = {"choices": [{"delta": {"content": "Olá"}}]}
+        body = f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n"
+        transport, calls = mock_upstream(
+            httpx.Response(503), httpx.Response(200, text=body)
+        )
+        provider = AIProvider(transport=transport)
+
+        chunks = [c async for c in provider.stream_reply("Oi", "Produtivo", "neutro")]
+
+        assert chunks == ["Olá"]
+        assert len(calls) == 2
+        assert provider.pool_stats()["requests_in_flight"] == 0
+        await provider.aclose()
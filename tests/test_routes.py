@@ -31,7 +31,7 @@ async def test_classify_empty_text(client):
 @pytest.mark.anyio
 async def test_classify_too_long_text(client):
     """Teste classificação com texto muito longo"""
-    long_text = "a" * 6000  # Excede limite de 5000 chars
+    long_text = "a" * 100_001  # Excede MAX_COMPRESSIBLE_CHARS
     response = await client.post(
         "/classify", data={"text": long_text, "tone": "neutro"}
     )
@@ -0,0 +1,153 @@
+"""
+Testes do single-flight (coalescência de chamadas idênticas concorrentes)
+"""
+
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.services.ai import AIProvider
+from app.services.singleflight import SingleFlight
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_execution(self):
+        flight = SingleFlight()
+        executions = 0
+
+        async def work():
+            nonlocal executions
+            executions += 1
+            await asyncio.sleep(0.01)
+            return "resultado"
+
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(10)))
+
+        assert results == ["resultado"] * 10
+        assert executions == 1
+        assert flight.stats() == {
+            "calls": 10,
+            "executions": 1,
+            "coalesced": 9,
+            "in_flight": 0,
+        }
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_shared_call(self):
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return 42
+
+        first = asyncio.ensure_future(flight.do("k", work))
+        second = asyncio.ensure_future(flight.do("k", work))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await second == 42
+        assert first.cancelled()
+
+    @pytest.mark.asyncio
+    async def test_errors_propagate_to_all_waiters(self):
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0)
+            raise RuntimeError("upstream down")
+
+        results = await asyncio.gather(
+            flight.do("k", work), flight.do("k", work), return_exceptions=True
+        )
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert flight.stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_sequential_calls_are_not_coalesced(self):
+        flight = SingleFlight()
+
+        async def work():
+            return 1
+
+        await flight.do("k", work)
+        await flight.do("k", work)
+
+        assert flight.stats()["executions"] == 2
+
+
+class TestAIProviderSingleFlight:
+    @pytest.fixture
+    def slow_upstream(self):
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            await asyncio.sleep(0.02)
+            content = '{"category": "Produtivo", "rationale": "Pedido de suporte"}'
+            return httpx.Response(
+                200, json={"choices": [{"message": {"content": content}}]}
+            )
+
+        with (
+            patch("app.services.ai.settings.provider", "OpenAI"),
+            patch("app.services.ai.settings.openai_api_key", "test-key"),
+            patch("app.services.ai.settings.classification_cache_enabled", False),
+        ):
+            yield httpx.MockTransport(handler), calls
+
+    @pytest.mark.asyncio
+    async def test_identical_classifications_make_one_upstream_call(
+        self, slow_upstream
+    ):
+        transport, calls = slow_upstream
+        provider = AIProvider(transport=transport)
+
+        results = await asyncio.gather(
+            *(provider.classify("Preciso de suporte no sistema") for _ in range(20))
+        )
+
+        assert len(calls) == 1
+        assert all(r["category"] == "Produtivo" for r in results)
+        # Each caller receives an independent copy
+        results[0]["user"] = "alguem"
+        assert "user" not in results[1]
+        assert provider.metrics()["singleflight"]["coalesced"] == 19
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_replies_coalesced_per_category_and_tone(self, slow_upstream):
+        transport, calls = slow_upstream
+        provider = AIProvider(transport=transport)
+
+        await asyncio.gather(
+            provider.generate_reply("Texto", "Produtivo", "formal"),
+            provider.generate_reply("Texto", "Produtivo", "formal"),
+            provider.generate_reply("Texto", "Produtivo", "amigavel"),
+            provider.refine_reply("Resposta", "formal"),
+            provider.refine_reply("Resposta", "formal"),
+        )
+
+        assert len(calls) == 3
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_disabled_setting_bypasses_coalescing(self, slow_upstream):
+        transport, calls = slow_upstream
+        provider = AIProvider(transport=transport)
+
+        with patch("app.services.ai.settings.singleflight_enabled", False):
+            await asyncio.gather(
+                provider.classify("Preciso de suporte"),
+                provider.classify("Preciso de suporte"),
+            )
+
+        assert len(calls) == 2
+        await provider.aclose()
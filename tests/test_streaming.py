@@ -0,0 +1,186 @@
+"""
+Testes do streaming SSE de classificação + resposta
+Usa o servidor OpenAI fake local (app.testing.fake_openai)
+"""
+
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.ai import AIProvider, ai_provider
+from app.services.overload import overload_controller
+from app.testing.fake_openai import (
+    FakeOpenAIConfig,
+    create_fake_openai_app,
+    fake_completion,
+)
+from main import app
+
+client = TestClient(app)
+
+
+REPLY_TOKENS = ["Prezado(a),", " recebemos", " sua solicitação", " e retornaremos."]
+
+
+def _fake_server(**config):
+    """Servidor OpenAI fake compartilhado, sem latência"""
+    return create_fake_openai_app(
+        FakeOpenAIConfig(latency_ms=0, stream_chunk_ms=0, seed=7, **config)
+    )
+
+
+def _parse_sse(body: str):
+    events = []
+    for message in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in message.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+class TestStreamReply:
+    @pytest.mark.asyncio
+    async def test_tokens_streamed_from_upstream(self, openai_settings):
+        fake = _fake_server()
+        provider = AIProvider(transport=httpx.ASGITransport(app=fake))
+
+        chunks = [
+            chunk
+            async for chunk in provider.stream_reply(
+                "Preciso de ajuda", "Produtivo", "formal"
+            )
+        ]
+
+        # Uma palavra por chunk, na ordem do servidor
+        assert len(chunks) > 1
+        assert "".join(chunks) == fake_completion("Preciso de ajuda")
+        assert fake.state.stats["requests"] == 1
+        assert provider.pool_stats()["requests_in_flight"] == 0
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_upstream_error_before_first_token_uses_fallback(
+        self, openai_settings
+    ):
+        fake = _fake_server(error_rate=1.0)
+        provider = AIProvider(transport=httpx.ASGITransport(app=fake))
+
+        chunks = [
+            chunk
+            async for chunk in provider.stream_reply(
+                "Obrigado!", "Improdutivo", "neutro"
+            )
+        ]
+
+        assert chunks == [provider._generate_reply_fallback("Improdutivo", "neutro")]
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_stream_broken_after_first_token_is_not_replayed(
+        self, openai_settings
+    ):
+        calls = []
+
+        class BrokenStream(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                payload = {"choices": [{"delta": {"content": "Hello "}}]}
+                yield f"data: {json.dumps(payload)}\n\n".encode()
+                raise httpx.ReadError("connection reset")
+
+        def handler(request):
+            calls.append(request)
+            return httpx.Response(200, stream=BrokenStream())
+
+        provider = AIProvider(transport=httpx.MockTransport(handler))
+        chunks = []
+        with pytest.raises(httpx.ReadError):
+            async for chunk in provider._stream_chat_completion("x", 0.3, 50):
+                chunks.append(chunk)
+
+        assert chunks == ["Hello "]
+        assert len(calls) == 1
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_without_api_key_streams_template_reply(self):
+        with patch("app.services.ai.settings.openai_api_key", None):
+            provider = AIProvider()
+            chunks = [
+                c async for c in provider.stream_reply("x", "Produtivo", "formal")
+            ]
+
+        assert len(chunks) == 1
+        assert "Prezado(a)" in chunks[0]
+
+
+class TestClassifyStreamEndpoint:
+    def test_stream_counts_as_in_flight_while_body_streams(self):
+        seen = []
+
+        async def fake_stream(text, category, tone):
+            seen.append(overload_controller.in_flight)
+            yield "Ok"
+
+        classification = {
+            "category": "Produtivo",
+            "confidence": 0.9,
+            "rationale": "Pedido de suporte",
+            "meta": {"model": "test", "cost": 0.0, "fallback": False},
+        }
+        before = overload_controller.in_flight
+        with (
+            patch.object(ai_provider, "classify", return_value=classification),
+            patch.object(ai_provider, "stream_reply", fake_stream),
+        ):
+            response = client.post(
+                "/classify/stream",
+                data={"text": "Preciso de suporte no sistema", "tone": "formal"},
+            )
+
+        assert response.status_code == 200
+        assert seen == [before + 1]
+        assert overload_controller.in_flight == before
+
+    def test_emits_classification_tokens_and_done(self):
+        async def fake_stream(text, category, tone):
+            for token in REPLY_TOKENS:
+                yield token
+
+        classification = {
+            "category": "Produtivo",
+            "confidence": 0.9,
+            "rationale": "Pedido de suporte",
+            "meta": {"model": "test", "cost": 0.0, "fallback": False},
+        }
+        with (
+            patch.object(ai_provider, "classify", return_value=classification),
+            patch.object(ai_provider, "stream_reply", fake_stream),
+        ):
+            response = client.post(
+                "/classify/stream",
+                data={"text": "Preciso de suporte no sistema", "tone": "formal"},
+            )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = _parse_sse(response.text)
+        names = [name for name, _ in events]
+        assert names == ["classification"] + ["token"] * len(REPLY_TOKENS) + ["done"]
+        assert events[0][1]["category"] == "Produtivo"
+
+        done = events[-1][1]
+        assert done["reply"] == "".join(REPLY_TOKENS)
+        assert set(done["timings"]) == {
+            "classification_ms",
+            "first_token_ms",
+            "total_ms",
+        }
+
+    def test_invalid_input_rejected_before_streaming(self):
+        response = client.post(
+            "/classify/stream", data={"text": "oi", "tone": "neutro"}
+        )
+        assert response.status_code == 400
@@ -0,0 +1,225 @@
+"""
+Testes da remoção de respostas citadas e rodapés antes da classificação
+"""
+
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.ai import AIProvider
+from app.services.nlp import (
+    PreprocessingStats,
+    extract_latest_message,
+    normalize_text,
+    preprocess_document,
+    preprocess_text,
+)
+from main import app
+
+client = TestClient(app)
+
+GOLDEN = Path(__file__).parent / "data" / "normalizer_golden.jsonl"
+
+NEW = "Bom dia, o sistema continua fora do ar. Podem verificar?\nObrigado,\nAna"
+OLD = "Olá Ana, vamos verificar o chamado 123.\nAtt, Suporte"
+
+
+def _assert_accounted(message):
+    assert message.quoted_chars + message.boilerplate_chars == message.saved_chars
+    assert message.stats()["kept_chars"] == len(message.text)
+
+
+@pytest.mark.parametrize(
+    "marker",
+    [
+        "Em seg., 3 de jun. de 2024 às 10:12, Suporte <suporte@x.com> escreveu:",
+        "Em 03/06/2024 10:12, Suporte <suporte@x.com>\nescreveu:",
+        "On Mon, Jun 3, 2024 at 10:12 AM Support <support@x.com> wrote:",
+        "-----Mensagem original-----\nDe: suporte@x.com\nEnviado: segunda-feira",
+        "-----Original Message-----\nFrom: support@x.com",
+        "________________________________\nDe: Suporte\nEnviado: segunda-feira",
+        "De: Suporte <suporte@x.com>\nEnviado em: segunda-feira\nPara: Ana",
+    ],
+)
+def test_cuts_reply_chain_at_marker(marker):
+    message = extract_latest_message(f"{NEW}\n\n{marker}\n{OLD}")
+    assert message.text.strip() == NEW
+    assert message.quoted_chars == message.saved_chars > len(OLD)
+    _assert_accounted(message)
+
+
+def test_drops_quoted_lines():
+    text = (
+        "Segue minha resposta abaixo.\n> Olá Ana, tudo bem?\n> linha citada\nAté logo"
+    )
+    message = extract_latest_message(text)
+    assert message.text == "Segue minha resposta abaixo.\nAté logo"
+    assert message.quoted_chars == message.saved_chars
+    _assert_accounted(message)
+
+
+@pytest.mark.parametrize(
+    "footer",
+    [
+        "Enviado do meu iPhone",
+        "Sent from my Android",
+        "Obter o Outlook para Android",
+        "--\nAna Souza | Financeiro\n(11) 5555-0000",
+        "AVISO LEGAL: o conteúdo desta mensagem é restrito.",
+        "Esta mensagem pode conter informação confidencial e privilegiada.",
+        "Antes de imprimir, pense no meio ambiente.",
+    ],
+)
+def test_cuts_boilerplate(footer):
+    message = extract_latest_message(f"{NEW}\n\n{footer}")
+    assert message.text.strip() == NEW
+    assert message.boilerplate_chars == message.saved_chars > 0
+    _assert_accounted(message)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Olá,\nEste pedido precisa chegar ao destinatário até amanhã, o sistema "
+        "está com erro no chamado 123.\nAguardo retorno urgente.",
+        "Bom dia,\nEsta informação é confidencial e precisa de correção.\nAguardo.",
+        # Redação de aviso legal no meio do corpo, sem linha em branco antes
+        "Bom dia,\nEsta mensagem é confidencial: o sistema caiu.\nAguardo.",
+        "Bom dia,\n\nEsta mensagem é confidencial.\n"
+        + "\n".join(f"Item {i} da fatura com erro" for i in range(10)),
+    ],
+)
+def test_body_mentioning_confidentiality_is_kept(text):
+    message = extract_latest_message(text)
+    assert message.text == text
+    assert message.saved_chars == 0
+
+
+def test_multiline_disclaimer_is_cut():
+    disclaimer = (
+        "Esta mensagem pode conter informação confidencial e privilegiada.\n"
+        "Se você não for o destinatário, apague-a."
+    )
+    message = extract_latest_message(f"{NEW}\n\n{disclaimer}")
+    assert message.text.strip() == NEW
+    assert message.boilerplate_chars == len(disclaimer) + 1
+
+
+def test_signature_above_thread_is_split_by_reason():
+    signature = "Enviado do meu iPhone\n"
+    quote = "Em 03/06/2024, Suporte escreveu:\n" + OLD
+    message = extract_latest_message(f"{NEW}\n{signature}{quote}")
+    assert message.text == NEW
+    assert message.boilerplate_chars == len(signature)
+    assert message.quoted_chars == len(quote) + 1
+    _assert_accounted(message)
+
+
+def test_forward_without_comment_keeps_forwarded_message():
+    text = (
+        "---------- Forwarded message ---------\n"
+        "De: Cliente <cliente@x.com>\n"
+        "Date: seg., 3 de jun. de 2024\n"
+        "Subject: Erro no login\n"
+        "To: suporte@x.com\n"
+        "\n"
+        f"{NEW}"
+    )
+    message = extract_latest_message(text)
+    assert message.text.strip() == NEW
+    _assert_accounted(message)
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        "De: Cliente <cliente@x.com>\nData: 03/06/2024 10:12\nAssunto: Erro no login",
+        "From: Client <client@x.com>\nDate: Mon, 3 Jun 2024\nSubject: Login error",
+    ],
+)
+def test_header_block_at_top_is_not_quoted_thread(header):
+    # Cabeçalho copiado/encaminhado no topo, sem separador: faz parte do e-mail
+    text = f"{header}\n\n{NEW}"
+    message = extract_latest_message(text)
+    assert message.text == text
+    assert message.quoted_chars == message.saved_chars == 0
+
+
+def test_marker_before_any_content_is_not_a_cut():
+    # Cabeçalhos copiados no topo não contam como conteúdo
+    text = f"Assunto: Re: chamado\n{NEW}\n\nOn Mon, Support wrote:\n{OLD}"
+    message = extract_latest_message(text)
+    assert message.text == f"Assunto: Re: chamado\n{NEW}\n"
+
+
+def test_only_quotes_falls_back_to_whole_text():
+    text = "> Olá Ana, tudo bem?\n> mais uma linha"
+    message = extract_latest_message(text)
+    assert message.text == text
+    assert message.saved_chars == 0
+
+
+def test_plain_email_is_untouched():
+    message = extract_latest_message(NEW)
+    assert message.text == NEW
+    assert message.stats() == {
+        "original_chars": len(NEW),
+        "kept_chars": len(NEW),
+        "saved_chars": 0,
+        "quoted_chars": 0,
+        "boilerplate_chars": 0,
+    }
+
+
+def test_stats_accumulate():
+    stats = PreprocessingStats()
+    stats.record(extract_latest_message(NEW))
+    stats.record(extract_latest_message(f"{NEW}\nOn Mon, Support wrote:\n{OLD}"))
+    summary = stats.stats()
+    assert (summary["requests"], summary["stripped_requests"]) == (2, 1)
+    assert summary["saved_chars"] == summary["quoted_chars"] > 0
+    assert 0 < summary["saved_ratio"] < 1
+
+
+def test_preprocess_document_carries_stats():
+    document = preprocess_document(f"{NEW}\nOn Mon, Support wrote:\n{OLD}")
+    assert document.text == normalize_text(NEW)
+    assert document.preprocessing["quoted_chars"] > 0
+
+
+def test_disabled_setting_keeps_previous_behaviour():
+    with open(GOLDEN, encoding="utf-8") as handle:
+        golden = [json.loads(line) for line in handle]
+    with patch("app.services.nlp.settings.thread_stripping_enabled", False):
+        assert preprocess_document(NEW).preprocessing is None
+        mismatches = [
+            case["text"]
+            for case in golden
+            if preprocess_text(case["text"]) != case["preprocess"]
+        ]
+    assert mismatches == []
+
+
+class TestRoutes:
+    def test_meta_and_metrics_report_savings(self, auth_headers):
+        provider = AIProvider()
+        text = f"{NEW}\n\nEm 03/06/2024, Suporte escreveu:\n{OLD}"
+        with (
+            patch("app.web.routes.ai_provider", provider),
+            patch("app.services.ai.settings.classification_cache_enabled", False),
+        ):
+            response = client.post(
+                "/api/classify/text",
+                json={"text": text},
+                headers=auth_headers(["classify:read"]),
+            )
+            metrics = client.get("/api/admin/metrics", headers=auth_headers(["admin"]))
+
+        assert response.status_code == 200
+        preprocessing = response.json()["meta"]["preprocessing"]
+        assert preprocessing["original_chars"] == len(text)
+        assert preprocessing["quoted_chars"] == preprocessing["saved_chars"] > 0
+        assert metrics.json()["preprocessing"]["saved_chars"] > 0
@@ -0,0 +1,142 @@
+"""
+Testes da estimativa offline de tokens e do orçamento de prompts
+"""
+
+import json
+from unittest.mock import patch
+
+import pytest
+
+from app.services.ai import AIProvider, _estimate_request_tokens
+from app.services.prompt_templates import PromptOptimizer, PromptTemplates
+from app.services.tokens import estimate_tokens, trim_to_tokens
+
+LONG_EMAIL = (
+    "Preciso de suporte urgente no protocolo 4821? O ticket segue aberto? " * 80
+)
+
+
+@pytest.fixture
+def openai_settings(openai_settings):
+    with patch("app.services.ai.settings.classification_cache_enabled", False):
+        yield
+
+
+class TestEstimator:
+    def test_counts_words_digits_and_symbols(self):
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("ok") == 1
+        assert estimate_tokens("Olá, tudo bem?") == 5
+        assert estimate_tokens("protocolo 123456") == estimate_tokens("protocolo") + 2
+        assert estimate_tokens("Obrigado! 😊") == 5  # palavra longa + "!" + emoji
+
+    def test_scales_with_text(self):
+        short = estimate_tokens("Preciso de suporte no sistema.")
+        assert estimate_tokens("Preciso de suporte no sistema. " * 10) == 10 * short
+
+    def test_trim_keeps_longest_fitting_prefix(self):
+        trimmed = trim_to_tokens(LONG_EMAIL, 50)
+
+        assert LONG_EMAIL.startswith(trimmed)
+        assert estimate_tokens(trimmed) <= 50
+        assert estimate_tokens(trimmed) >= 45
+        assert trim_to_tokens("curto", 50) == "curto"
+        assert trim_to_tokens("qualquer texto", 0) == ""
+
+    def test_request_estimate_includes_output_cap(self):
+        payload = {
+            "messages": [{"role": "user", "content": "Preciso de suporte"}],
+            "max_tokens": 150,
+        }
+        assert _estimate_request_tokens(payload) == 155
+
+
+class TestPromptBudget:
+    def test_few_shot_prompt_when_it_fits(self):
+        text = "Urgente: qual o status do protocolo 123? E do ticket 456?"
+        prompt = PromptOptimizer().build_classification_prompt(text, 1200, 150)
+
+        assert prompt.template == "few_shot"
+        assert prompt.text == PromptTemplates.get_classification_prompt_with_examples(
+            text
+        )
+        assert prompt.input_tokens == estimate_tokens(prompt.text)
+        assert prompt.trimmed_chars == 0
+
+    def test_smaller_template_before_trimming(self):
+        text = "Urgente: qual o status do protocolo 123? E do ticket 456? " * 10
+        prompt = PromptOptimizer().build_classification_prompt(text, 400, 150)
+
+        assert prompt.template == "simple"
+        assert prompt.trimmed_chars == 0
+        assert prompt.input_tokens <= 400
+
+    def test_email_is_trimmed_to_fit(self):
+        prompt = PromptOptimizer().build_reply_prompt(
+            LONG_EMAIL, "Produtivo", "formal", 800, 300
+        )
+
+        assert prompt.trimmed_chars > 0
+        assert prompt.input_tokens <= 800
+        assert prompt.token_meta()["max_output"] == 300
+
+
+class TestProviderTokenMeta:
+    @pytest.mark.asyncio
+    async def test_estimates_drive_cost_without_usage(
+        self, openai_settings, mock_upstream
+    ):
+        transport, calls = mock_upstream(
+            '{"category": "Produtivo", "rationale": "Suporte"}'
+        )
+        provider = AIProvider(transport=transport)
+
+        with patch("app.services.ai.settings.classify_input_token_budget", 300):
+            result = await provider.classify(LONG_EMAIL)
+
+        tokens = result["meta"]["tokens"]
+        assert tokens["estimated"] is True
+        assert tokens["input"] == tokens["input_estimate"] <= 300
+        assert tokens["trimmed_chars"] > 0
+        assert result["meta"]["cost"] > 0
+        assert json.loads(calls[0].content)["max_tokens"] == 150
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_upstream_usage_wins(self, openai_settings, mock_upstream):
+        body = {
+            "choices": [
+                {
+                    "message": {
+                        "content": '{"category": "Produtivo", "rationale": "Suporte"}'
+                    }
+                }
+            ],
+            "usage": {"prompt_tokens": 1000, "completion_tokens": 20},
+        }
+        transport, _ = mock_upstream(body)
+        provider = AIProvider(transport=transport)
+
+        result = await provider.classify("Preciso de suporte no sistema")
+
+        tokens = result["meta"]["tokens"]
+        assert tokens["estimated"] is False
+        assert (tokens["input"], tokens["output"]) == (1000, 20)
+        assert result["meta"]["cost"] == provider._estimate_cost(body["usage"])
+        await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_output_budget_caps_reply(self, openai_settings, mock_upstream):
+        transport, calls = mock_upstream("Resposta")
+        provider = AIProvider(transport=transport)
+
+        with patch("app.services.ai.settings.reply_max_output_tokens", 120):
+            await provider.generate_reply(LONG_EMAIL, "Produtivo", "formal")
+
+        payload = json.loads(calls[0].content)
+        assert payload["max_tokens"] == 120
+        assert estimate_tokens(payload["messages"][0]["content"]) <= 1500
+        await provider.aclose()
+
+    def test_cost_without_usage_or_text_is_zero(self):
+        assert AIProvider()._estimate_cost({}) == 0.0
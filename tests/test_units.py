@@ -4,7 +4,7 @@ Testa componentes individuais: NLP, AI, utils, heuristics
 """
 
 import json
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
 
 import pytest
 
@@ -172,9 +172,8 @@ class TestAIProviderUnits:
                 "usage": {"prompt_tokens": 50, "completion_tokens": 20},
             }
 
-            mock_client.return_value.__aenter__.return_value.post.return_value = (
-                mock_response
-            )
+            mock_client.return_value.is_closed = False
+            mock_client.return_value.post = AsyncMock(return_value=mock_response)
 
             _ = AIProvider()  # unused
             result = await self.ai_provider._classify_openai("Preciso de ajuda")
@@ -191,9 +190,8 @@ class TestAIProviderUnits:
             mock_response = Mock()
             mock_response.status_code = 500
 
-            mock_client.return_value.__aenter__.return_value.post.return_value = (
-                mock_response
-            )
+            mock_client.return_value.is_closed = False
+            mock_client.return_value.post = AsyncMock(return_value=mock_response)
 
             _ = AIProvider()  # unused
 
@@ -215,9 +213,8 @@ class TestAIProviderUnits:
                 "choices": [{"message": {"content": "Resposta inválida não JSON"}}]
             }
 
-            mock_client.return_value.__aenter__.return_value.post.return_value = (
-                mock_response
-            )
+            mock_client.return_value.is_closed = False
+            mock_client.return_value.post = AsyncMock(return_value=mock_response)
 
             _ = AIProvider()  # unused
             result = await self.ai_provider._classify_openai("Teste")
@@ -244,9 +241,8 @@ class TestAIProviderUnits:
                 ]
             }
 
-            mock_client.return_value.__aenter__.return_value.post.return_value = (
-                mock_response
-            )
+            mock_client.return_value.is_closed = False
+            mock_client.return_value.post = AsyncMock(return_value=mock_response)
 
             _ = AIProvider()  # unused
             reply = await self.ai_provider._generate_reply_openai(
@@ -0,0 +1,105 @@
+"""
+Testes da camada de comunicação com o upstream (OpenAI)
+Usa transportes httpx locais, sem acesso à rede
+"""
+
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from app.services.ai import AIProvider
+
+
+class TestPooledClient:
+    """Cliente HTTP único e reutilizado pelo AIProvider"""
+
+    @pytest.mark.asyncio
+    async def test_client_reused_across_calls(self, openai_settings, mock_upstream):
+        transport, calls = mock_upstream('{"category": "Produtivo", "rationale": "ok"}')
+        provider = AIProvider(transport=transport)
+        await provider.startup()
+        client = provider._client
+
+        await provider.classify("Preciso de suporte com o sistema")
+        await provider.generate_reply("Preciso de suporte", "Produtivo", "formal")
+        await provider.refine_reply("Resposta original", "formal")
+
+        assert provider._client is client
+        assert len(calls) == 3
+        assert provider.pool_stats()["requests_total"] == 3
+        assert provider.pool_stats()["requests_in_flight"] == 0
+
+        await provider.aclose()
+        assert client.is_closed
+        assert provider.pool_stats()["active"] is False
+
+    @pytest.mark.asyncio
+    async def test_client_created_lazily_without_lifespan(
+        self, openai_settings, mock_upstream
+    ):
+        transport, _ = mock_upstream("Resposta")
+        provider = AIProvider(transport=transport)
+        assert provider.pool_stats()["active"] is False
+
+        reply = await provider.generate_reply("Teste", "Produtivo", "neutro")
+
+        assert reply == "Resposta"
+        assert provider.pool_stats()["active"] is True
+        await provider.aclose()
+
+    def test_loop_change_closes_previous_client(self, openai_settings, mock_upstream):
+        transport, calls = mock_upstream("Resposta")
+        provider = AIProvider(transport=transport)
+
+        async def reply():
+            await provider.generate_reply("Teste", "Produtivo", "neutro")
+            return provider._client
+
+        # Cada asyncio.run usa um loop novo, como o TestClient por requisição
+        first = asyncio.run(reply())
+        second = asyncio.run(reply())
+
+        assert second is not first
+        assert first.is_closed
+        assert len(calls) == 2
+        asyncio.run(provider.aclose())
+
+    @pytest.mark.asyncio
+    async def test_pool_limits_from_settings(self):
+        with (
+            patch("app.services.ai.settings.http_max_connections", 7),
+            patch("app.services.ai.settings.http_max_keepalive_connections", 3),
+        ):
+            provider = AIProvider()
+            await provider.startup()
+            pool = provider._client._transport._pool
+
+            assert pool._max_connections == 7
+            assert pool._max_keepalive_connections == 3
+            assert provider.pool_stats()["max_connections"] == 7
+            await provider.aclose()
+
+    @pytest.mark.asyncio
+    async def test_http2_falls_back_without_h2(self):
+        with (
+            patch("app.services.ai.settings.http2_enabled", True),
+            patch("app.services.ai.importlib.util.find_spec", return_value=None),
+        ):
+            provider = AIProvider()
+            await provider.startup()
+            assert provider._client._transport._pool._http2 is False
+            await provider.aclose()
+
+
+class TestHealthPoolStats:
+    def test_health_reports_upstream_pool(self):
+        from fastapi.testclient import TestClient
+
+        from main import app
+
+        with TestClient(app) as client:
+            data = client.get("/health").json()
+
+        assert data["status"] == "ok"
+        assert "requests_in_flight" in data["upstream_pool"]